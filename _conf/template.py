@@ -17,6 +17,29 @@ PAGE_SIZE_MAX = 10000
 # Database config
 DATABASE_PATH = {{YOUR_DB_LOCATION}}
 
+# Times the queries run by each request, reported in a Server-Timing header and at /_debug/queries. Queries taking at
+# least SLOW_QUERY_MS milliseconds are written to SLOW_QUERY_LOGFILE (if set) with their query plans.
+SQL_INSTRUMENTATION = False
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOGFILE = APP_DIR + '/slow_queries.log'
+
+# Collects request, database and serialisation metrics for Prometheus at /metrics. Off by default, as collecting them
+# times every query. When the app is run in several processes (i.e. by gunicorn), set METRICS_DIR to a directory they
+# share, and empty it whenever the app is restarted. /metrics is only served to requests with an
+# "Authorization: Bearer <METRICS_TOKEN>" header, so METRICS_TOKEN must be set to a secret for it to be served at all.
+METRICS = False
+METRICS_DIR = None
+METRICS_TOKEN = None
+
+# Memory budget in bytes for caching the JSON, JSON-LD and Turtle views of licences and registers. 0 disables the cache
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# External list of organisations offered as parties when creating a licence. It is kept for EXTERNAL_PARTIES_TTL
+# seconds before being refreshed in the background, and fetching it gives up after EXTERNAL_PARTIES_TIMEOUT seconds.
+EXTERNAL_PARTIES_URL = 'http://catalogue.linked.data.gov.au/org/json'
+EXTERNAL_PARTIES_TTL = 60 * 60
+EXTERNAL_PARTIES_TIMEOUT = 2
+
 # The base uri for all uris minted by this application
 BASE_URI = {{YOUR_URI}}
 # The base uri for building the permalinks in this application
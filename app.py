@@ -1,12 +1,25 @@
 import logging
 import _conf as conf
 from flask import Flask, g, session
-from controller import routes
+from flask.json.provider import DefaultJSONProvider
+from controller import routes, connection_pool, mail_queue, metrics, query_log
 from uuid import uuid4
 from flask_login import LoginManager
+from model.record import Record
 from model.user import User
 
+
+class JSONProvider(DefaultJSONProvider):
+    # Writes the records returned by db_access (see model/record.py) as JSON objects, i.e. in jsonify() and tojson
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__, template_folder=conf.TEMPLATES_DIR, static_folder=conf.STATIC_DIR)
+app.json = JSONProvider(app)
 app.secret_key = conf.SECRET_KEY
 app.register_blueprint(routes.routes)
 
@@ -24,12 +37,43 @@ def load_user(user_id):
     return User(user_id)
 
 
-# Closes connection to database when exiting application. See db_access.py for details.
+# Sends any emails left in the outbox, i.e. from before a restart. See mail_queue.py for details.
+if mail_queue.is_configured():
+    mail_queue.start_worker(app)
+
+
+# Reports the queries run by each request when SQL instrumentation is turned on. See query_log.py for details.
+if conf.SQL_INSTRUMENTATION and conf.SLOW_QUERY_LOGFILE:
+    query_log.open_log(conf.SLOW_QUERY_LOGFILE)
+
+
+@app.after_request
+def add_server_timing(response):
+    return query_log.add_server_timing(response)
+
+
+# Records request latency and response sizes for /metrics. See metrics.py for details.
+@app.before_request
+def start_metrics():
+    metrics.start_request()
+
+
+@app.after_request
+def observe_response(response):
+    return metrics.observe_response(response)
+
+
+@app.teardown_request
+def finish_query_log(exception):
+    query_log.finish_request()
+
+
+# Returns the connection to the database to the pool at the end of each request. See db_access.py for details.
 @app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None:
-        db.close()
+        connection_pool.release(db)
 
 
 # Generate token for Cross-Site Request Forgery protection
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+from unittest import mock
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import _conf
+import create_database
+from controller import db_access, functions
+from controller.offline_db_access import get_db
+
+'''
+Renders the HTML Action Register against catalogues of increasing size and reports how many database queries and how
+much time each render takes. The query count should stay the same however many licences there are.
+
+Uses a separate database (benchmarks/benchmark.db) so the real database is left alone.
+Usage: python benchmarks/action_register.py [number of licences ...]
+'''
+
+ACTION_LABELS = ['Read', 'Distribute', 'Reproduce', 'Derive', 'Attribution', 'Notice', 'Share Alike', 'Commercial Use']
+
+
+@mock.patch('controller.db_access.get_db', side_effect=get_db)
+def add_licences(count, mock):
+    for i in range(count):
+        functions.create_policy(_conf.BASE_URI + 'licence/' + str(uuid4()), {'label': 'Licence ' + str(i)}, [
+            {'TYPE_LABEL': 'Permission', 'ACTIONS': ACTION_LABELS[i % 4:i % 4 + 3]},
+            {'TYPE_LABEL': 'Duty', 'ACTIONS': ACTION_LABELS[4 + i % 4:5 + i % 4]}
+        ])
+
+
+def benchmark(sizes):
+    from app import app
+    client = app.test_client()
+    created = 0
+    print('{:>10} {:>10} {:>12}'.format('licences', 'queries', 'render (ms)'))
+    for size in sizes:
+        add_licences(size - created)
+        created = size
+        with mock.patch('controller.db_access.query_db', side_effect=db_access.query_db) as query_mock:
+            start = time.perf_counter()
+            client.get('/action/')
+            elapsed = time.perf_counter() - start
+        print('{:>10} {:>10} {:>12.1f}'.format(size, query_mock.call_count, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    _conf.DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark.db')
+    create_database.teardown()
+    create_database.rebuild()
+    benchmark([int(size) for size in sys.argv[1:]] or [10, 100, 1000])
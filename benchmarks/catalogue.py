@@ -0,0 +1,125 @@
+import argparse
+import os
+import random
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import _conf
+import create_database
+from controller import db_access, functions
+from controller.offline_db_access import get_db
+
+'''
+Generates a synthetic catalogue of a given size for benchmarking, in a separate database (benchmarks/benchmark.db by
+default) so the real database is left alone. The same seed always generates the same catalogue.
+
+Licences look like the seeded ones: most Rules are Permissions, then Duties, then a few Prohibitions, and the Actions
+of each Rule are drawn from a skewed distribution where a handful of common Actions (Read, Distribute, Attribution...)
+are used by most licences and the rest only occasionally. Each Rule is given a few of the Parties as assignors and
+assignees.
+Usage: python benchmarks/catalogue.py [--licences N] [--rules M] [--parties K] [--seed S] [--database PATH]
+'''
+
+BENCHMARK_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark.db')
+
+# Relative frequencies of the Rule types
+RULE_TYPE_WEIGHTS = {'Permission': 6, 'Duty': 3, 'Prohibition': 1}
+
+# Actions used by most licences, most common first. Every other Action gets the weight of the least common of these.
+COMMON_ACTIONS = ['Read', 'Distribute', 'Reproduce', 'Attribution', 'Derive', 'Notice', 'Share Alike', 'Commercial Use',
+                  'Distribution', 'Reproduction', 'Derivative Works', 'Modify']
+
+
+def action_weights(actions):
+    # Weights each Action label following Zipf's law over COMMON_ACTIONS, with a long tail of rarely used Actions
+    weights = {label: 1 / (rank + 1) for rank, label in enumerate(COMMON_ACTIONS)}
+    tail_weight = 1 / (len(COMMON_ACTIONS) + 1)
+    return [weights.get(action['LABEL'], tail_weight) for action in actions]
+
+
+def generate(licences, rules, parties, seed=0):
+    """
+    Generates licences in the form taken by functions.create_policies_bulk(). Must be run against a rebuilt database,
+    as the Rule types and Actions are read from it.
+
+    :param licences: The number of licences
+    :param rules: The total number of Rules, shared out randomly between the licences. Every licence gets at least one.
+    :param parties: The number of Parties the Rules' assignors and assignees are drawn from
+    :param seed: The seed for the random number generator
+    :return: A List of licences
+    """
+    if rules < licences:
+        raise ValueError('There must be at least as many Rules as licences.')
+    generator = random.Random(seed)
+    actions = db_access.get_all_actions()
+    weights = action_weights(actions)
+    party_list = [{'URI': _conf.BASE_URI + 'party/benchmark-{}'.format(i), 'LABEL': 'Party {}'.format(i),
+                   'COMMENT': 'A synthetic party for benchmarking.'} for i in range(parties)]
+    rule_counts = [1] * licences
+    for _ in range(rules - licences):
+        rule_counts[generator.randrange(licences)] += 1
+
+    generated = []
+    for i, rule_count in enumerate(rule_counts):
+        licence_rules = []
+        for _ in range(rule_count):
+            rule_type = generator.choices(list(RULE_TYPE_WEIGHTS), list(RULE_TYPE_WEIGHTS.values()))[0]
+            # Most Rules have one to three Actions, a few have more
+            action_count = min(int(generator.expovariate(0.6)) + 1, 8)
+            rule_actions = {action['LABEL'] for action in generator.choices(actions, weights, k=action_count)}
+            rule = {'TYPE_LABEL': rule_type, 'ACTIONS': sorted(rule_actions)}
+            if party_list:
+                rule['ASSIGNORS'] = generator.sample(party_list, min(generator.randint(0, 2), parties))
+                rule['ASSIGNEES'] = generator.sample(party_list, min(generator.randint(0, 2), parties))
+            licence_rules.append(rule)
+        generated.append({
+            'URI': _conf.BASE_URI + 'licence/benchmark-{}'.format(i),
+            'ATTRIBUTES': {
+                'type': 'http://creativecommons.org/ns#License',
+                'label': 'Benchmark Licence {}'.format(i),
+                'comment': 'A synthetic licence for benchmarking, with {} rules.'.format(rule_count)
+            },
+            'RULES': licence_rules
+        })
+    return generated
+
+
+def build(licences, rules, parties, seed=0, database=BENCHMARK_DATABASE):
+    """
+    Rebuilds the database at the given path and fills it with a generated catalogue. The rest of the process uses that
+    database afterwards.
+
+    :return: A Dictionary of the numbers of LICENCES, RULES, PARTIES and ACTIONS used in the catalogue
+    """
+    _conf.DATABASE_PATH = database
+    create_database.teardown()
+    with mock.patch('controller.db_access.get_db', side_effect=get_db):
+        create_database.rebuild()
+        errors = functions.create_policies_bulk(generate(licences, rules, parties, seed))
+        if errors:
+            raise ValueError('Could not create licences: ' + str(errors))
+        return {
+            'LICENCES': len(db_access.get_all_policies()),
+            'RULES': len(db_access.get_all_rules()),
+            'PARTIES': len(db_access.get_all_parties()),
+            'ACTIONS': len({row['ACTION_URI'] for row in db_access.get_all_policy_actions()})
+        }
+
+
+def add_arguments(parser):
+    # Arguments describing the catalogue to generate, shared with suite.py
+    parser.add_argument('--licences', type=int, default=1000, help='Number of licences')
+    parser.add_argument('--rules', type=int, help='Total number of Rules, three per licence by default')
+    parser.add_argument('--parties', type=int, default=50, help='Number of Parties')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the random number generator')
+    parser.add_argument('--database', default=BENCHMARK_DATABASE, help='Path of the database to (re)build')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic catalogue for benchmarking')
+    add_arguments(parser)
+    args = parser.parse_args()
+    sizes = build(args.licences, args.rules or args.licences * 3, args.parties, args.seed, args.database)
+    print('{LICENCES} licences, {RULES} rules, {PARTIES} parties and {ACTIONS} actions in use'.format(**sizes))
@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from unittest import mock
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import _conf
+import create_database
+from controller import connection_pool, db_access, functions
+from controller.offline_db_access import get_db
+
+'''
+Runs reader and writer threads against the database at the same time and reports how many operations each managed, to
+show how the connection pool's settings (see connection_pool.py) cope with concurrent access.
+Readers load random licences in full, writers create new licences.
+
+Uses a separate database (benchmarks/benchmark.db) so the real database is left alone.
+Usage: python benchmarks/concurrency.py [--readers N] [--writers N] [--seconds N] [--journal-mode DELETE|WAL]
+'''
+
+ACTION_LABELS = ['Read', 'Distribute', 'Reproduce', 'Derive', 'Attribution', 'Notice', 'Share Alike', 'Commercial Use']
+
+
+def create_licence():
+    functions.create_policy(_conf.BASE_URI + 'licence/' + str(uuid4()), {'label': 'Licence'}, [
+        {'TYPE_LABEL': 'Permission', 'ACTIONS': random.sample(ACTION_LABELS[:4], 2)},
+        {'TYPE_LABEL': 'Duty', 'ACTIONS': random.sample(ACTION_LABELS[4:], 1)}
+    ])
+
+
+def run(worker, stop, counts, errors):
+    while not stop.is_set():
+        try:
+            worker()
+            counts.append(1)
+        except sqlite3.OperationalError:
+            # i.e. 'database is locked' when a writer holds up a reader for longer than the busy timeout
+            errors.append(1)
+            db_access.rollback_db()
+
+
+def benchmark(readers, writers, seconds):
+    policy_uris = db_access.get_all_policies()
+    stop = threading.Event()
+    results = {'read': ([], []), 'write': ([], [])}
+
+    def read():
+        db_access.get_policies_full(random.sample(policy_uris, 10))
+
+    threads = [threading.Thread(target=run, args=(read, stop) + results['read']) for _ in range(readers)]
+    threads += [threading.Thread(target=run, args=(create_licence, stop) + results['write']) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print('journal mode {mode}, {readers} readers, {writers} writers, {seconds}s'.format(
+        mode=connection_pool.JOURNAL_MODE, readers=readers, writers=writers, seconds=seconds))
+    for operation, (counts, errors) in results.items():
+        print('{:>6}: {:>8.1f} per second, {:>4} errors'.format(operation, len(counts) / seconds, len(errors)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent read/write benchmark')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--licences', type=int, default=200, help='Number of licences to start with')
+    parser.add_argument('--journal-mode', default=connection_pool.JOURNAL_MODE)
+    args = parser.parse_args()
+    _conf.DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark.db')
+    create_database.teardown()
+    connection_pool.JOURNAL_MODE = args.journal_mode
+    with mock.patch('controller.db_access.get_db', side_effect=get_db):
+        create_database.rebuild()
+        for _ in range(args.licences):
+            create_licence()
+        benchmark(args.readers, args.writers, args.seconds)
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import _conf
+import catalogue
+from controller import db_access, functions, response_cache
+
+'''
+Times the main operations of the catalogue against a synthetic catalogue (see catalogue.py) and writes the results out
+as JSON, so that runs from different commits can be compared:
+    filter_policies     searches matching one common Action, one rare Action and several Rules
+    similar_policies    suggesting similar licences for the same Rules
+    get_policy/get_rule loading single licences and Rules
+    routes              every register (and a single licence) in every media type, with the response cache emptied
+                        before each request (cold) and kept (warm)
+    create_policy       creating licences one at a time, run last as it changes the catalogue
+
+Each result gives the number of runs and the min, median, mean, 95th percentile and max in milliseconds.
+Usage: python benchmarks/suite.py [--licences N] [--rules M] [--parties K] [--seed S] [--repeat R] [--output FILE]
+                                  [--compare FILE]
+'''
+
+MEDIA_TYPES = ['text/html', 'application/json', 'application/ld+json', 'text/turtle', 'application/n-triples']
+
+# Routes by name, as a path and GET variables
+REGISTERS = {'licence_register': ('/licence/', {}), 'action_register': ('/action/', {}),
+             'party_register': ('/party/', {})}
+
+
+def measure(function, repeat, setup=None):
+    """
+    Times a function
+
+    :param function: The function to time, called without arguments
+    :param repeat: The number of times to run it, after one untimed warm-up run
+    :param setup: An optional function called before each run, which isn't timed
+    :return: A Dictionary of statistics in milliseconds
+    """
+    if setup:
+        setup()
+    function()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'runs': repeat,
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p95_ms': round(timings[min(int(repeat * 0.95), repeat - 1)], 3),
+        'max_ms': round(timings[-1], 3)
+    }
+
+
+def cycle(items):
+    # Returns a function returning the next item each time it's called, so each run of a benchmark uses a different one
+    position = [0]
+
+    def next_item():
+        item = items[position[0] % len(items)]
+        position[0] += 1
+        return item
+    return next_item
+
+
+def searches():
+    # Desired Rules for filter_policies(), from the most to the least selective
+    action_uris = {action['LABEL']: action['URI'] for action in db_access.get_all_actions()}
+    rule_types = {rule_type['LABEL']: rule_type['URI'] for rule_type in db_access.get_permitted_rule_types()}
+    return {
+        'common_action': [{'TYPE_URI': rule_types['Permission'], 'ACTIONS': [{'URI': action_uris['Read']}]}],
+        'rare_action': [{'TYPE_URI': rule_types['Permission'], 'ACTIONS': [{'URI': action_uris['Watermark']}]}],
+        'several_rules': [
+            {'TYPE_URI': rule_types['Permission'],
+             'ACTIONS': [{'URI': action_uris['Read']}, {'URI': action_uris['Distribute']}]},
+            {'TYPE_URI': rule_types['Duty'], 'ACTIONS': [{'URI': action_uris['Attribution']}]}
+        ]
+    }
+
+
+def benchmark_queries(app, repeat, generator):
+    results = {}
+    with app.test_request_context():
+        for name, desired_rules in searches().items():
+            results['filter_policies.' + name] = measure(lambda: functions.filter_policies(desired_rules), repeat)
+            results['similar_policies.' + name] = measure(lambda: functions.similar_policies(desired_rules), repeat)
+        policy_uris = generator.sample(db_access.get_all_policies(), min(repeat, 100))
+        rule_uris = generator.sample(db_access.get_all_rules(), min(repeat, 100))
+        next_policy = cycle(policy_uris)
+        next_rule = cycle(rule_uris)
+        results['get_policy'] = measure(lambda: db_access.get_policy(next_policy()), repeat)
+        results['get_rule'] = measure(lambda: db_access.get_rule(next_rule()), repeat)
+    return results
+
+
+def benchmark_routes(app, repeat, generator):
+    results = {}
+    client = app.test_client()
+    with app.app_context():
+        licence_uri = generator.choice(db_access.get_all_policies())
+    routes = dict(REGISTERS, view_licence=('/licence/', {'uri': licence_uri}))
+
+    def get(route, media_type):
+        path, variables = route
+        response = client.get(path, query_string=dict(variables, _format=media_type))
+        if response.status_code != 200:
+            raise ValueError('{} as {} returned {}'.format(path, media_type, response.status_code))
+        response.get_data()
+
+    for name, route in routes.items():
+        for media_type in MEDIA_TYPES:
+            key = 'routes.{}.{}'.format(name, media_type)
+            if media_type == 'text/html':
+                # HTML views aren't cached
+                results[key] = measure(lambda: get(route, media_type), repeat)
+            else:
+                results[key + '.cold'] = measure(lambda: get(route, media_type), repeat, response_cache.cache.clear)
+                results[key + '.warm'] = measure(lambda: get(route, media_type), repeat)
+    return results
+
+
+def benchmark_create_policy(app, repeat, generator):
+    rules = [
+        {'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read', 'Distribute', 'Reproduce']},
+        {'TYPE_LABEL': 'Duty', 'ACTIONS': ['Attribution']},
+        {'TYPE_LABEL': 'Prohibition', 'ACTIONS': ['Commercial Use']}
+    ]
+    party = {'URI': _conf.BASE_URI + 'party/benchmark-0', 'LABEL': 'Party 0', 'COMMENT': None}
+    rules[0]['ASSIGNORS'] = [party]
+
+    def create():
+        functions.create_policy(_conf.BASE_URI + 'licence/' + str(uuid4()), {'label': 'New Licence'}, rules)
+    with app.test_request_context():
+        return {'create_policy': measure(create, repeat)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    # Prints the change in the median of each benchmark since a previous run
+    print('{:<60} {:>12} {:>12} {:>8}'.format('benchmark', 'before (ms)', 'after (ms)', 'change'), file=sys.stderr)
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before:
+            change = (result['median_ms'] - before['median_ms']) / before['median_ms'] if before['median_ms'] else 0
+            print('{:<60} {:>12.3f} {:>12.3f} {:>+7.0%}'.format(name, before['median_ms'], result['median_ms'], change),
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the catalogue against a synthetic catalogue')
+    catalogue.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed runs of each benchmark')
+    parser.add_argument('--output', help='File to write the results to, otherwise they are written to standard output')
+    parser.add_argument('--compare', help='Results of a previous run to compare against')
+    args = parser.parse_args()
+    rules = args.rules or args.licences * 3
+    sizes = catalogue.build(args.licences, rules, args.parties, args.seed, args.database)
+    # The app is only imported once the benchmark database is in place
+    from app import app
+    generator = random.Random(args.seed)
+
+    results = {}
+    results.update(benchmark_queries(app, args.repeat, generator))
+    results.update(benchmark_routes(app, args.repeat, generator))
+    results.update(benchmark_create_policy(app, args.repeat, generator))
+    output = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'catalogue': sizes
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            compare(output, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
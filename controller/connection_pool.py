@@ -0,0 +1,130 @@
+import os
+import queue
+import sqlite3
+import threading
+import _conf
+
+"""
+CONNECTION_POOL
+
+Keeps open SQLite connections which are reused across requests, instead of opening and closing a connection for every
+request. A thread keeps the connection it acquires until it releases it (at the end of each request, see app.py) or
+ends, and the connection then goes back to the pool for the next thread to use. At most POOL_SIZE idle connections are
+kept for each database file, so a server starting a new thread for every request doesn't open a new connection every
+time. Both db_access.py and offline_db_access.py get their connections from here so they behave the same way.
+
+Connections use a write-ahead log (WAL) so that a request writing to the database (like creating a licence) doesn't
+block other requests from reading it.
+"""
+
+JOURNAL_MODE = 'WAL'
+SYNCHRONOUS = 'NORMAL'  # Safe with WAL - a power loss may lose the latest commits but won't corrupt the database
+MMAP_SIZE = 256 * 1024 * 1024  # Bytes of the database file to memory map
+CACHE_SIZE = -16 * 1024  # Negative values are in KiB, so this is a 16MiB page cache per connection
+STATEMENT_CACHE_SIZE = 256  # Number of prepared statements kept by each connection, reused when the same SQL is run
+POOL_SIZE = 8  # Idle connections kept for each database file. Any more are closed when they're released.
+
+_local = threading.local()
+_lock = threading.Lock()
+# The connections held by threads, as (thread, database path, connection) tuples, and a Queue of idle connections for
+# each database path
+_connections = []
+_idle = {}
+_generation = 0
+
+
+def connect(database_path):
+    """
+    Opens a new connection to the database, configured for use by this application.
+
+    :param database_path: Location of the database file. Its directory is created if it doesn't exist.
+    :return: A sqlite3 Connection
+    """
+    os.makedirs(os.path.dirname(database_path), exist_ok=True)
+    # Connections are only used by one thread at a time, but are passed between threads through the pool
+    conn = sqlite3.connect(database_path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    conn.execute('PRAGMA foreign_keys = 1')
+    conn.execute('PRAGMA journal_mode = {mode}'.format(mode=JOURNAL_MODE))
+    conn.execute('PRAGMA synchronous = {synchronous}'.format(synchronous=SYNCHRONOUS))
+    conn.execute('PRAGMA mmap_size = {size:d}'.format(size=MMAP_SIZE))
+    conn.execute('PRAGMA cache_size = {size:d}'.format(size=CACHE_SIZE))
+    conn.row_factory = sqlite3.Row  # Allows for accessing query results like a dictionary which is more readable
+    return conn
+
+
+def acquire(database_path=None):
+    """
+    Returns the current thread's connection to the database. If the thread doesn't have one yet, it is given an idle
+    connection from the pool, or a new one if there are none.
+
+    :param database_path: Location of the database file. Defaults to the DATABASE_PATH in _conf.
+    :return: A sqlite3 Connection
+    """
+    database_path = database_path or _conf.DATABASE_PATH
+    if getattr(_local, 'generation', None) != _generation:
+        _local.connections = {}
+        _local.generation = _generation
+    conn = _local.connections.get(database_path)
+    if conn is None:
+        with _lock:
+            idle = _idle.setdefault(database_path, queue.Queue(POOL_SIZE))
+            if idle.empty():
+                reclaim()
+            try:
+                conn = idle.get_nowait()
+            except queue.Empty:
+                conn = connect(database_path)
+            _connections.append((threading.current_thread(), database_path, conn))
+        _local.connections[database_path] = conn
+    return conn
+
+
+def release(conn):
+    # Returns a connection to the pool once a request is finished with it. Anything which wasn't committed is rolled
+    # back so that the next request using the connection starts afresh.
+    if conn.in_transaction:
+        conn.rollback()
+    connections = getattr(_local, 'connections', {})
+    for database_path, held in list(connections.items()):
+        if held is conn:
+            del connections[database_path]
+    with _lock:
+        for held in _connections:
+            if held[2] is conn:
+                _connections.remove(held)
+                put_idle(held[1], conn)
+                break
+
+
+def reclaim():
+    # Returns the connections of threads which have ended without releasing them to the pool, the same way metrics.py
+    # folds in the metrics of ended threads. Must be called holding _lock.
+    for held in [held for held in _connections if not held[0].is_alive()]:
+        _connections.remove(held)
+        if held[2].in_transaction:
+            held[2].rollback()
+        put_idle(held[1], held[2])
+
+
+def put_idle(database_path, conn):
+    # Adds a connection to the idle connections for its database, closing it if there are already POOL_SIZE of them.
+    # Must be called holding _lock.
+    try:
+        _idle.setdefault(database_path, queue.Queue(POOL_SIZE)).put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def close_all():
+    # Closes every pooled connection, idle or held by any thread, i.e. before the database file is deleted.
+    # Threads will open new connections the next time they call acquire().
+    global _generation
+    with _lock:
+        for thread, database_path, conn in _connections:
+            conn.close()
+        _connections.clear()
+        for idle in _idle.values():
+            while not idle.empty():
+                idle.get_nowait().close()
+        _idle.clear()
+        _generation += 1
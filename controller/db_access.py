@@ -1,25 +1,52 @@
 import sqlite3
-import _conf as conf
+from controller import connection_pool, query_log
 from flask import g
-import os
+from model.action import Action
+from model.party import Party
+from model.policy import Policy
+from model.rule import Rule
 
 """
 DB_ACCESS
 
 A layer providing functions for interacting with the database.
-Database connection is stored in a Flask global variable otherwise Flask complains about threads.
+Database connection is stored in a Flask global variable otherwise Flask complains about threads. The connection is
+taken from the pool in connection_pool.py and returned to it when the request ends (see app.py).
 For database access while Flask is not running, use offline_db_access.py
+Policies, Rules, Actions and Parties are returned as immutable records (see model/record.py) which can be read like
+Dictionaries. Actions and Parties are interned, so each is only held in memory once however many Rules use it.
+Queries run through query_db(), update_db() and update_db_many() can be timed and logged, see query_log.py.
 commit_db() or rollback_db() MUST be called when all changes are done or database will be locked to future changes.
 """
 
+# SQLite limits the number of variables in a single query (999 in older versions) so lists of URIs used in 'IN' clauses
+# are split into batches of this size
+MAX_QUERY_VARIABLES = 500
+
+# Columns of the POLICY table, in the order of the fields of a Policy
+POLICY_COLUMNS = ', '.join(Policy.FIELDS[:-1])
+
+# Attributes of a Policy which can be set, see set_policy_attribute()
+POLICY_ATTRIBUTES = ['TYPE', 'LABEL', 'JURISDICTION', 'LEGAL_CODE', 'HAS_VERSION', 'LANGUAGE', 'SEE_ALSO', 'SAME_AS',
+                     'COMMENT', 'LOGO', 'STATUS', 'CREATOR']
+
+# Orders registers can be paged through in (see get_page()), each a List of the expressions rows are sorted by. The
+# last is always the rowid, so that every row has a different key. Rows without a label are sorted by their URI.
+PAGE_ORDERS = {
+    'rowid': ['rowid'],
+    'label': ['COALESCE(LABEL, URI) COLLATE NOCASE', 'rowid']
+}
+
+# Weights of full-text search matches, see get_policies_by_text(). A match in a label counts for LABEL times as much as
+# one in a comment or definition, and matches in a Policy itself count for more than matches in the Actions and Parties
+# its Rules use.
+TEXT_SEARCH_WEIGHTS = {'LABEL': 4.0, 'POLICY': 1.0, 'PARTY': 0.5, 'ACTION': 0.25}
+
 
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        os.makedirs(os.path.dirname(conf.DATABASE_PATH), exist_ok=True)
-        db = g._database = sqlite3.connect(conf.DATABASE_PATH)
-        db.execute('PRAGMA foreign_keys = 1')
-        db.row_factory = sqlite3.Row  # Allows for accessing query results like a dictionary which is more readable
+        db = g._database = connection_pool.acquire()
     return db
 
 
@@ -32,10 +59,25 @@ def update_db(query_str, args=()):
     :return: The most recent rowid
     """
     cursor = get_db().cursor()
-    cursor.execute(query_str, args)
+    with query_log.timed(cursor.connection, query_str, args):
+        cursor.execute(query_str, args)
     return cursor.lastrowid
 
 
+def update_db_many(query_str, args_list):
+    """
+    Submits the same query to update or insert something in the database once for every set of variables, using a
+    single statement.
+
+    :param query_str: The query as a string. Use args_list for including variables to prevent SQL Injection
+    :param args_list: A List of variables for each time the query is run
+    """
+    conn = get_db()
+    # Only the first set of variables is used if the statement is explained in the slow query log
+    with query_log.timed(conn, query_str, args_list[0] if args_list else ()):
+        conn.executemany(query_str, args_list)
+
+
 def query_db(query_str, args=(), one=False):
     """
     Queries the database
@@ -46,25 +88,178 @@ def query_db(query_str, args=(), one=False):
     :return: The results of the query
     """
     cursor = get_db().cursor()
-    cursor.execute(query_str, args)
-    results = cursor.fetchall()
+    with query_log.timed(cursor.connection, query_str, args):
+        cursor.execute(query_str, args)
+        results = cursor.fetchall()
     if one:
         return results[0] if results else None
     else:
         return results
 
 
-def commit_db():
+def query_db_in(query_str, uris, args=()):
+    """
+    Queries the database for a List of URIs. The query should contain an 'IN ({uris})' clause, which is filled with one
+    placeholder per URI. Large Lists are split into batches so that the number of queries stays fixed for a given size.
+
+    :param query_str: The query as a string, containing a {uris} placeholder.
+    :param uris: The List of URIs to substitute into the 'IN' clause
+    :param args: Any other variables, which come before the URIs in the query
+    :return: The results of all the batches
+    """
+    uris = list(uris)
+    results = []
+    for start in range(0, len(uris), MAX_QUERY_VARIABLES):
+        batch = uris[start:start + MAX_QUERY_VARIABLES]
+        batch_query_str = query_str.format(uris=', '.join('?' * len(batch)))
+        results.extend(query_db(batch_query_str, tuple(args) + tuple(batch)))
+    return results
+
+
+def commit_db(catalogue_changed=True):
+    # Any changes being committed also increase the catalogue version, which tells caches their contents are out of
+    # date. Changes which aren't to the catalogue itself (i.e. to the OUTBOX) leave the version alone.
     conn = get_db()
+    if catalogue_changed and conn.in_transaction:
+        conn.execute('UPDATE CATALOGUE_VERSION SET VERSION = VERSION + 1, MODIFIED = CURRENT_TIMESTAMP')
     conn.commit()
 
 
+def get_catalogue_version():
+    """
+    Returns the current version of the catalogue. The version is increased every time changes are committed with
+    commit_db(), so anything derived from the catalogue can be cached for as long as the version stays the same.
+
+    :return: A Dictionary containing a VERSION (int) and MODIFIED (string) - when the version last changed
+    """
+    return dict(query_db('SELECT VERSION, MODIFIED FROM CATALOGUE_VERSION', one=True))
+
+
+def get_vocabulary_version():
+    # Returns the version of the Rule types and Actions, which is increased whenever either table changes
+    return query_db('SELECT VERSION FROM VOCABULARY_VERSION', one=True)[0]
+
+
+def page_condition(order, operator='>', key=None):
+    """
+    A condition comparing rows' keys in one of the PAGE_ORDERS with a key, i.e.
+    "(COALESCE(LABEL, URI) COLLATE NOCASE, rowid) > (?, ?)" selects the rows after a key.
+
+    :param order: The name of one of the PAGE_ORDERS
+    :param operator: The comparison operator
+    :param key: A subquery selecting the key. Otherwise the key is given as arguments by page_key_args(), and the first
+                expression is also compared on its own so SQLite can look the key up in an index rather than scanning.
+    :return: The condition as a string
+    """
+    expressions = PAGE_ORDERS[order]
+    if key:
+        return '({}) {} ({})'.format(', '.join(expressions), operator, key)
+    condition = '({}) {} ({})'.format(', '.join(expressions), operator, ', '.join('?' * len(expressions)))
+    return condition if len(expressions) == 1 else '{} {}= ? AND {}'.format(expressions[0], operator, condition)
+
+
+def page_key_args(after):
+    # The arguments of a key for a query using page_condition(). A rowid on its own is a key of one value.
+    after = tuple(after) if isinstance(after, (list, tuple)) else (after,)
+    return after if len(after) == 1 else after[:1] + after
+
+
+def get_page(table, after=0, limit=-1, order='rowid'):
+    """
+    Retrieve rows of a table in one of the PAGE_ORDERS, starting after a given key. Used for keyset pagination, see
+    pagination.py
+
+    :param table: POLICY, ACTION or PARTY
+    :param after: Only rows with a greater key are returned. For the rowid order, a rowid. For the label order, a
+                  (label, rowid) tuple
+    :param limit: The maximum number of rows to return, or -1 for no limit
+    :param order: The name of one of the PAGE_ORDERS. Defaults to the order the rows were added.
+    :return: A List of Dictionaries containing the columns of each row and its ROWID
+    """
+    query_str = 'SELECT rowid AS ROWID, * FROM {table} WHERE {condition} ORDER BY {order} LIMIT ?'.format(
+        table=table, condition=page_condition(order), order=', '.join(PAGE_ORDERS[order]))
+    return [dict(result) for result in query_db(query_str, page_key_args(after) + (limit,))]
+
+
+def get_page_ends(table, per_page, order='rowid'):
+    """
+    Retrieve the key of the last row of every full page of a table, in the same order as get_page()
+
+    :param table: POLICY, ACTION or PARTY
+    :param per_page: The number of rows on each page
+    :param order: The name of one of the PAGE_ORDERS
+    :return: A List of keys - rowids for the rowid order, (label, rowid) tuples for the label order
+    """
+    columns = ['{} AS KEY_{}'.format(expression, i) for i, expression in enumerate(PAGE_ORDERS[order])]
+    query_str = '''
+        SELECT * FROM (SELECT {columns}, ROW_NUMBER() OVER (ORDER BY {order}) AS POSITION FROM {table})
+        WHERE POSITION % ? = 0
+    '''.format(columns=', '.join(columns), order=', '.join(PAGE_ORDERS[order]), table=table)
+    return [tuple(result)[:-1] if len(columns) > 1 else result[0] for result in query_db(query_str, (per_page,))]
+
+
+def get_key_after(table, after, skip, order='rowid'):
+    """
+    Retrieve the key of the row a number of rows after a given key, in the same order as get_page()
+
+    :param table: POLICY, ACTION or PARTY
+    :param after: The key to count from, as for get_page()
+    :param skip: The number of rows to count, at least 1
+    :param order: The name of one of the PAGE_ORDERS
+    :return: A rowid for the rowid order or a (label, rowid) tuple for the label order, or None if there aren't that
+             many rows after the key
+    """
+    expressions = PAGE_ORDERS[order]
+    query_str = 'SELECT {columns} FROM {table} WHERE {condition} ORDER BY {order} LIMIT 1 OFFSET ?'.format(
+        columns=', '.join(expressions), table=table, condition=page_condition(order), order=', '.join(expressions))
+    result = query_db(query_str, page_key_args(after) + (skip - 1,), one=True)
+    if result is None:
+        return None
+    return tuple(result) if len(expressions) > 1 else result[0]
+
+
+def get_position(table, uri, order='rowid'):
+    """
+    Finds where a row is in the order of get_page()
+
+    :param table: POLICY, ACTION or PARTY
+    :param uri: The URI of the row
+    :param order: The name of one of the PAGE_ORDERS
+    :return: The position of the row, starting at 1, or 0 if there is no row with that URI
+    """
+    subquery = 'SELECT {columns} FROM {table} WHERE URI = ?'.format(columns=', '.join(PAGE_ORDERS[order]), table=table)
+    query_str = 'SELECT COUNT(1) FROM {table} WHERE {condition}'.format(
+        table=table, condition=page_condition(order, '<=', subquery))
+    return query_db(query_str, (uri,), one=True)[0]
+
+
 def rollback_db():
     conn = get_db()
     conn.rollback()
     conn.commit()
 
 
+def create_savepoint(name):
+    # Marks a point in the current transaction which later changes can be rolled back to, keeping earlier ones
+    conn = get_db()
+    if not conn.in_transaction:
+        # Otherwise releasing the savepoint would commit everything
+        conn.execute('BEGIN')
+    conn.execute('SAVEPOINT ' + name)
+
+
+def release_savepoint(name):
+    # Keeps the changes made since the savepoint as part of the current transaction
+    get_db().execute('RELEASE SAVEPOINT ' + name)
+
+
+def rollback_to_savepoint(name):
+    # Undoes the changes made since the savepoint, leaving the rest of the transaction alone
+    conn = get_db()
+    conn.execute('ROLLBACK TO SAVEPOINT ' + name)
+    conn.execute('RELEASE SAVEPOINT ' + name)
+
+
 def create_policy(policy_uri):
     # Creates a new Policy with the given URI
     if policy_exists(policy_uri):
@@ -87,6 +282,51 @@ def policy_exists(policy_uri):
     return query_db('SELECT COUNT(1) FROM POLICY WHERE URI = ?', (policy_uri,), one=True)[0]
 
 
+def get_existing_policies(policy_uris):
+    # Returns the Set of URIs from the given List which already belong to a Policy
+    return {result['URI'] for result in query_db_in('SELECT URI FROM POLICY WHERE URI IN ({uris})', policy_uris)}
+
+
+def get_policy_types():
+    # Returns a List of the URIs of all the types a Policy is permitted to have
+    return [result['TYPE'] for result in query_db('SELECT TYPE FROM POLICY_TYPE')]
+
+
+def create_policies_full(policies, parties=()):
+    """
+    Creates many entire Policies at once using a fixed number of statements, unlike calling create_policy(),
+    set_policy_attribute(), create_rule() etc. for each. Nothing is checked beforehand, so the Policies, Rules and
+    Parties must not already exist and their Rule types and Actions must, otherwise sqlite3.IntegrityError is raised.
+    See functions.create_policies_bulk()
+
+    :param policies: A List of Policies. Each Policy is a Dictionary containing a URI, any of POLICY_ATTRIBUTES, an
+                     optional CREATED date (defaults to now) and RULES, a List of Rules. Each Rule is a Dictionary
+                     containing a URI, TYPE_URI, ACTIONS (a List of URIs), ASSIGNORS (a List of URIs) and ASSIGNEES
+                     (a List of URIs).
+    :param parties: A List of new Parties used by the Policies. Each Party is a Dictionary containing a URI, LABEL and
+                    COMMENT.
+    """
+    rules = [(policy['URI'], rule) for policy in policies for rule in policy['RULES']]
+    update_db_many(
+        'INSERT INTO POLICY (URI, CREATED, {attrs}) VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), {values})'.format(
+            attrs=', '.join(POLICY_ATTRIBUTES), values=', '.join('?' * len(POLICY_ATTRIBUTES))),
+        [(policy['URI'], policy.get('CREATED')) + tuple(policy.get(attr) for attr in POLICY_ATTRIBUTES)
+         for policy in policies]
+    )
+    update_db_many('INSERT INTO PARTY (URI, LABEL, COMMENT) VALUES (?, ?, ?)',
+                   [(party['URI'], party['LABEL'], party['COMMENT']) for party in parties])
+    update_db_many('INSERT INTO RULE (URI, TYPE, LABEL) VALUES (?, ?, ?)',
+                   [(rule['URI'], rule['TYPE_URI'], rule.get('LABEL')) for policy_uri, rule in rules])
+    update_db_many('INSERT INTO RULE_HAS_ACTION (RULE_URI, ACTION_URI) VALUES (?, ?)',
+                   [(rule['URI'], action_uri) for policy_uri, rule in rules for action_uri in rule['ACTIONS']])
+    update_db_many('INSERT INTO ASSIGNOR (PARTY_URI, RULE_URI) VALUES (?, ?)',
+                   [(party_uri, rule['URI']) for policy_uri, rule in rules for party_uri in rule['ASSIGNORS']])
+    update_db_many('INSERT INTO ASSIGNEE (PARTY_URI, RULE_URI) VALUES (?, ?)',
+                   [(party_uri, rule['URI']) for policy_uri, rule in rules for party_uri in rule['ASSIGNEES']])
+    update_db_many('INSERT INTO POLICY_HAS_RULE (POLICY_URI, RULE_URI) VALUES (?, ?)',
+                   [(policy_uri, rule['URI']) for policy_uri, rule in rules])
+
+
 def set_policy_attribute(policy_uri, attr, value):
     """
     For a given Policy, set an attribute to the given value
@@ -96,10 +336,8 @@ def set_policy_attribute(policy_uri, attr, value):
                                         COMMENT, LOGO, STATUS, CREATOR
     :param value:
     """
-    permitted_attributes = ['TYPE', 'LABEL', 'JURISDICTION', 'LEGAL_CODE', 'HAS_VERSION', 'LANGUAGE', 'SEE_ALSO',
-                            'SAME_AS', 'COMMENT', 'LOGO', 'STATUS', 'CREATOR']
     attr = attr.upper()
-    if attr not in permitted_attributes:
+    if attr not in POLICY_ATTRIBUTES:
         raise ValueError('Attribute \'' + attr + '\' is not permitted.')
     if not policy_exists(policy_uri):
         raise ValueError('Policy with URI ' + policy_uri + ' does not exist.')
@@ -111,7 +349,7 @@ def get_policy(policy_uri):
     """
     Retrieve all the relevant information about a Policy, including its attributes and its Rules.
 
-    :return: A Dictionary containing the following elements:
+    :return: A Policy containing the following elements:
         URI - string
         TYPE - string
         LABEL - string
@@ -126,14 +364,12 @@ def get_policy(policy_uri):
         CREATED - string
         STATUS - string
         CREATOR - string
-        RULES - List of URIs (string)
+        RULES - Tuple of URIs (string)
     """
-    policy_result = query_db('SELECT * FROM POLICY WHERE URI = ?', (policy_uri,), one=True)
+    policy_result = query_db('SELECT ' + POLICY_COLUMNS + ' FROM POLICY WHERE URI = ?', (policy_uri,), one=True)
     if policy_result is None:
         raise ValueError('Policy with URI ' + policy_uri + ' does not exist.')
-    policy = dict(policy_result)
-    policy['RULES'] = get_rules_for_policy(policy_uri)
-    return policy
+    return Policy.make((*policy_result, tuple(get_rules_for_policy(policy_uri))))
 
 
 def get_all_policies():
@@ -145,6 +381,127 @@ def get_all_policies():
     return [result['URI'] for result in query_db('SELECT URI FROM POLICY')]
 
 
+def get_policies_full(policy_uris=None, expand_parties=False):
+    """
+    Retrieve all the relevant information about many Policies at once, including their Rules. Uses a fixed number of
+    queries regardless of how many Policies or Rules there are, unlike calling get_policy() and get_rule() for each.
+
+    :param policy_uris: A List of Policy URIs. If None, all Policies are retrieved.
+    :param expand_parties: If True, Assignors and Assignees are Parties containing a URI, LABEL and COMMENT instead of
+                           URIs
+    :return: A List of Policies in the same order as policy_uris. Each Policy contains the same elements as
+             get_policy(), except RULES is a Tuple of Rules as returned by get_rules_full().
+    """
+    if policy_uris is None:
+        policy_results = query_db('SELECT ' + POLICY_COLUMNS + ' FROM POLICY')
+        policy_uris = [result['URI'] for result in policy_results]
+    else:
+        policy_uris = list(policy_uris)
+        policy_results = query_db_in('SELECT ' + POLICY_COLUMNS + ' FROM POLICY WHERE URI IN ({uris})', policy_uris)
+    policies = build_policies(policy_results, expand_parties)
+    for policy_uri in policy_uris:
+        if policy_uri not in policies:
+            raise ValueError('Policy with URI ' + policy_uri + ' does not exist.')
+    return [policies[policy_uri] for policy_uri in policy_uris]
+
+
+def iter_policies_full(batch_size=500, expand_parties=False):
+    """
+    Retrieve every Policy in full, the same as get_policies_full(), but a batch at a time from a single cursor so that
+    only one batch is held in memory. The cursor keeps the same snapshot of the database until every Policy has been
+    read, so changes made meanwhile by other connections are not included.
+
+    :param batch_size: The number of Policies loaded at a time
+    :param expand_parties: The same as for get_policies_full()
+    :return: A generator of Policies, in the order they were created
+    """
+    cursor = get_db().cursor()
+    cursor.execute('SELECT ' + POLICY_COLUMNS + ' FROM POLICY ORDER BY rowid')
+    try:
+        while True:
+            policy_results = cursor.fetchmany(batch_size)
+            if not policy_results:
+                break
+            yield from build_policies(policy_results, expand_parties).values()
+    finally:
+        cursor.close()
+
+
+def build_policies(policy_results, expand_parties=False):
+    # Makes Policies from rows of the POLICY_COLUMNS of the POLICY table, with their Rules as returned by
+    # get_rules_full(). Returns a Dictionary of URI to Policy, in the same order as the rows.
+    policy_rules = {result['URI']: [] for result in policy_results}
+    rule_results = query_db_in('SELECT POLICY_URI, RULE_URI FROM POLICY_HAS_RULE WHERE POLICY_URI IN ({uris})',
+                               policy_rules.keys())
+    rule_uris = list(dict.fromkeys(result['RULE_URI'] for result in rule_results))
+    rules = {rule['URI']: rule for rule in get_rules_full(rule_uris, expand_parties)}
+    for result in rule_results:
+        policy_rules[result['POLICY_URI']].append(rules[result['RULE_URI']])
+    return {result['URI']: Policy.make((*result, tuple(policy_rules[result['URI']]))) for result in policy_results}
+
+
+def get_all_policy_actions():
+    """
+    Retrieve every Action of every Rule of every Policy along with the type of the Rule it belongs to.
+    Used for building the search index, see policy_index.py
+
+    :return: A List of rows, each containing POLICY_URI, TYPE_URI and ACTION_URI
+    """
+    query_str = '''
+        SELECT P_R.POLICY_URI, R.TYPE AS TYPE_URI, R_A.ACTION_URI
+        FROM POLICY_HAS_RULE P_R, RULE R, RULE_HAS_ACTION R_A
+        WHERE P_R.RULE_URI = R.URI AND R.URI = R_A.RULE_URI
+    '''
+    return query_db(query_str)
+
+
+def set_policies_json_ld(policies_json_ld):
+    """
+    Stores the JSON-LD of many Policies at once, see json_ld.py
+
+    :param policies_json_ld: A List of (Policy URI, nodes JSON, register entry JSON) tuples. The nodes are the Policy
+                             and its Rules, see json_ld.policy_nodes(). The register entry is the Policy's entry in the
+                             licence register, see json_ld.policy_register_entry().
+    """
+    query_str = 'INSERT OR REPLACE INTO POLICY_JSON_LD (POLICY_URI, NODES, REGISTER_ENTRY) VALUES (?, ?, ?)'
+    update_db_many(query_str, policies_json_ld)
+
+
+def get_policy_json_ld(policy_uri):
+    """
+    Retrieve the stored JSON-LD of a Policy, see json_ld.py
+
+    :return: A Dictionary containing NODES and the Policy's CREATED date. NODES is None if no JSON-LD is stored.
+             None if the Policy does not exist.
+    """
+    query_str = '''
+        SELECT J.NODES, P.CREATED
+        FROM POLICY P LEFT JOIN POLICY_JSON_LD J ON J.POLICY_URI = P.URI
+        WHERE P.URI = ?
+    '''
+    result = query_db(query_str, (policy_uri,), one=True)
+    return dict(result) if result else None
+
+
+def get_policy_register_entries(after=0, limit=-1):
+    """
+    Retrieve the stored licence register entry of every Policy, see json_ld.py
+
+    :param after: Only Policies after this rowid are included, see get_page()
+    :param limit: The maximum number of Policies to include, or -1 for no limit
+    :return: A List of rows, each containing a ROWID, URI and REGISTER_ENTRY. REGISTER_ENTRY is None if no JSON-LD is
+             stored.
+    """
+    query_str = '''
+        SELECT P.rowid AS ROWID, P.URI, J.REGISTER_ENTRY
+        FROM POLICY P LEFT JOIN POLICY_JSON_LD J ON J.POLICY_URI = P.URI
+        WHERE P.rowid > ?
+        ORDER BY P.rowid
+        LIMIT ?
+    '''
+    return query_db(query_str, (after, limit))
+
+
 def policy_has_rule(policy_uri, rule_uri):
     # Checks if the given Policy includes the given Rule
     query_str = 'SELECT COUNT(1) FROM POLICY_HAS_RULE WHERE POLICY_URI = ? AND RULE_URI = ?'
@@ -163,7 +520,7 @@ def create_rule(rule_uri, rule_type, rule_label=None):
     """
     if rule_exists(rule_uri):
         raise ValueError('A Rule with that URI already exists.')
-    if not any(rule_type == permitted_type['URI'] for permitted_type in get_permitted_rule_types()):
+    if not query_db('SELECT COUNT(1) FROM RULE_TYPE WHERE URI = ?', (rule_type,), one=True)[0]:
         raise ValueError('Rule type ' + rule_type + ' is not permitted.')
     update_db('INSERT INTO RULE (URI, TYPE, LABEL) VALUES (?, ?, ?)', (rule_uri, rule_type, rule_label))
 
@@ -179,15 +536,15 @@ def get_rule(rule_uri):
     """
     Retrieve all the relevant information about a Rule, including its Actions, Assignors and Assignees.
 
-    :return: A Dictionary containing the following elements:
+    :return: A Rule containing the following elements:
         URI - string
         TYPE_URI - string
         TYPE_LABEL - string
         LABEL - string
-        ASSIGNORS - List of strings
-        ASSIGNEES - List of strings
-        ACTIONS - List of Actions
-            Each Action is a Dictionary containing the following elements:
+        ASSIGNORS - Tuple of strings
+        ASSIGNEES - Tuple of strings
+        ACTIONS - Tuple of Actions
+            Each Action contains the following elements:
             URI - string
             LABEL - string
             DEFINITION - string
@@ -199,11 +556,52 @@ def get_rule(rule_uri):
         FROM RULE R, RULE_TYPE RT
         WHERE R.TYPE = RT.URI AND R.URI = ?
     '''
-    rule = dict(query_db(query_str, (rule_uri,), one=True))
-    rule['ACTIONS'] = get_actions_for_rule(rule['URI'])
-    rule['ASSIGNORS'] = get_assignors_for_rule(rule['URI'])
-    rule['ASSIGNEES'] = get_assignees_for_rule(rule['URI'])
-    return rule
+    return Rule.make((*query_db(query_str, (rule_uri,), one=True), tuple(get_actions_for_rule(rule_uri)),
+                      tuple(get_assignors_for_rule(rule_uri)), tuple(get_assignees_for_rule(rule_uri))))
+
+
+def get_rules_full(rule_uris, expand_parties=False):
+    """
+    Retrieve all the relevant information about many Rules at once, including their Actions, Assignors and Assignees.
+    Uses a fixed number of queries regardless of how many Rules there are, unlike calling get_rule() for each.
+
+    :param rule_uris: A List of Rule URIs
+    :param expand_parties: If True, Assignors and Assignees are Parties containing a URI, LABEL and COMMENT instead of
+                           URIs
+    :return: A List of Rules in the same order as rule_uris. Each Rule contains the same elements as get_rule().
+    """
+    rule_uris = list(rule_uris)
+    query_str = '''
+        SELECT R.URI, R.LABEL, R.TYPE AS TYPE_URI, RT.LABEL AS TYPE_LABEL
+        FROM RULE R, RULE_TYPE RT
+        WHERE R.TYPE = RT.URI AND R.URI IN ({uris})
+    '''
+    rule_results = {result['URI']: result for result in query_db_in(query_str, rule_uris)}
+    for rule_uri in rule_uris:
+        if rule_uri not in rule_results:
+            raise ValueError('Rule with URI ' + rule_uri + ' does not exist.')
+    # The Actions, Assignors and Assignees of each Rule
+    lists = {key: {rule_uri: [] for rule_uri in rule_results} for key in ['ACTIONS', 'ASSIGNORS', 'ASSIGNEES']}
+    query_str = '''
+        SELECT R_A.RULE_URI, A.URI, A.LABEL, A.DEFINITION FROM ACTION A, RULE_HAS_ACTION R_A
+        WHERE R_A.ACTION_URI = A.URI AND R_A.RULE_URI IN ({uris})
+    '''
+    for result in query_db_in(query_str, rule_uris):
+        lists['ACTIONS'][result['RULE_URI']].append(Action.intern(result['URI'], result['LABEL'], result['DEFINITION']))
+    for table, key in [('ASSIGNOR', 'ASSIGNORS'), ('ASSIGNEE', 'ASSIGNEES')]:
+        if expand_parties:
+            query_str = '''
+                SELECT A.RULE_URI, P.URI, P.LABEL, P.COMMENT FROM {table} A, PARTY P
+                WHERE A.PARTY_URI = P.URI AND A.RULE_URI IN ({{uris}})
+            '''.format(table=table)
+            for result in query_db_in(query_str, rule_uris):
+                lists[key][result['RULE_URI']].append(Party.intern(result['URI'], result['LABEL'], result['COMMENT']))
+        else:
+            query_str = 'SELECT RULE_URI, PARTY_URI FROM {table} WHERE RULE_URI IN ({{uris}})'.format(table=table)
+            for result in query_db_in(query_str, rule_uris):
+                lists[key][result['RULE_URI']].append(result['PARTY_URI'])
+    return [Rule.make((*rule_results[rule_uri], *(tuple(values[rule_uri]) for values in lists.values())))
+            for rule_uri in rule_uris]
 
 
 def add_rule_to_policy(rule_uri, policy_uri):
@@ -323,17 +721,14 @@ def get_actions_for_rule(rule_uri):
     """
     Returns a list of all the Actions which are assigned to a given Rule
 
-    :return: A List of Actions. Each Action is a Dictionary containing the following elements: URI, LABEL, DEFINITION
+    :return: A List of Actions. Each Action contains the following elements: URI, LABEL, DEFINITION
     """
     query_str = '''
         SELECT A.URI, A.LABEL, A.DEFINITION FROM ACTION A, RULE_HAS_ACTION R_A 
         WHERE R_A.RULE_URI = ?
         AND R_A.ACTION_URI = A.URI
     '''
-    actions = list()
-    for result in query_db(query_str, (rule_uri,)):
-        actions.append(dict(result))
-    return actions
+    return [Action.intern(*result) for result in query_db(query_str, (rule_uri,))]
 
 
 def get_rules_using_action(action_uri):
@@ -359,7 +754,7 @@ def get_policies_using_action(action_uri):
     policies = list()
     query_str = '''
         SELECT DISTINCT P.URI, P.LABEL 
-        FROM POLICY P, ACTION A, POLICY_HAS_RULE P_R, RULE_HAS_ACTION R_A
+        FROM POLICY P, POLICY_HAS_RULE P_R, RULE_HAS_ACTION R_A
         WHERE P.URI = P_R.POLICY_URI AND P_R.RULE_URI = R_A.RULE_URI AND R_A.ACTION_URI = ?
     '''
     for result in query_db(query_str, (action_uri,)):
@@ -367,6 +762,67 @@ def get_policies_using_action(action_uri):
     return policies
 
 
+def get_policies_by_action(action_uris=None):
+    """
+    Returns the Policies which are currently using each Action, for many Actions at once.
+
+    :param action_uris: A List of Action URIs. If None, all Actions are included.
+    :return: A Dictionary of Action URI to a List of Policies. Each Policy is a Dictionary containing a URI and LABEL.
+             Actions which aren't used by any Policy are not included.
+    """
+    policies_by_action = dict()
+    query_str = '''
+        SELECT DISTINCT R_A.ACTION_URI, P.URI, P.LABEL
+        FROM POLICY P, POLICY_HAS_RULE P_R, RULE_HAS_ACTION R_A
+        WHERE P.URI = P_R.POLICY_URI AND P_R.RULE_URI = R_A.RULE_URI
+    '''
+    if action_uris is None:
+        results = query_db(query_str)
+    else:
+        results = query_db_in(query_str + ' AND R_A.ACTION_URI IN ({uris})', action_uris)
+    for result in results:
+        policies_by_action.setdefault(result['ACTION_URI'], []).append({'URI': result['URI'], 'LABEL': result['LABEL']})
+    return policies_by_action
+
+
+def get_policies_by_text(text_query, limit=-1):
+    """
+    Full-text search of the catalogue (see create_database.create_search_table()). Policies are ranked by how well their
+    own label and comment match, plus how well the Actions and Parties used by their Rules match, weighted by
+    TEXT_SEARCH_WEIGHTS.
+
+    :param text_query: An SQLite FTS5 query
+    :param limit: The maximum number of Policies to return, -1 for all of them
+    :return: A List of Policy URIs, best match first. Policies which match equally well are in the order they were
+             created.
+    """
+    # Each match is joined to the Policies using it through the indexes on Actions and Parties, and the CROSS JOIN keeps
+    # SQLite from scanning every Policy to find the matched ones
+    query_str = '''
+        WITH MATCHES AS (
+            SELECT KIND, URI, bm25(SEARCH_TEXT, 0, 0, ?, 1.0) AS RANK FROM SEARCH_TEXT WHERE SEARCH_TEXT MATCH ?
+        ), POLICY_MATCHES AS (
+            SELECT URI AS POLICY_URI, RANK * ? AS SCORE FROM MATCHES WHERE KIND = 'POLICY'
+            UNION ALL
+            SELECT DISTINCT P_R.POLICY_URI, M.RANK * ? FROM MATCHES M, RULE_HAS_ACTION R_A, POLICY_HAS_RULE P_R
+            WHERE M.KIND = 'ACTION' AND R_A.ACTION_URI = M.URI AND P_R.RULE_URI = R_A.RULE_URI
+            UNION ALL
+            SELECT POLICY_URI, RANK * ? FROM (
+                SELECT P_R.POLICY_URI, M.URI, M.RANK FROM MATCHES M, ASSIGNOR A, POLICY_HAS_RULE P_R
+                WHERE M.KIND = 'PARTY' AND A.PARTY_URI = M.URI AND P_R.RULE_URI = A.RULE_URI
+                UNION
+                SELECT P_R.POLICY_URI, M.URI, M.RANK FROM MATCHES M, ASSIGNEE A, POLICY_HAS_RULE P_R
+                WHERE M.KIND = 'PARTY' AND A.PARTY_URI = M.URI AND P_R.RULE_URI = A.RULE_URI
+            )
+        )
+        SELECT M.POLICY_URI AS URI FROM POLICY_MATCHES M CROSS JOIN POLICY P ON P.URI = M.POLICY_URI
+        GROUP BY M.POLICY_URI ORDER BY SUM(M.SCORE), P.rowid LIMIT ?
+    '''
+    args = (TEXT_SEARCH_WEIGHTS['LABEL'], text_query, TEXT_SEARCH_WEIGHTS['POLICY'], TEXT_SEARCH_WEIGHTS['ACTION'],
+            TEXT_SEARCH_WEIGHTS['PARTY'], limit)
+    return [result['URI'] for result in query_db(query_str, args)]
+
+
 def rule_has_action(rule_uri, action_uri):
     # Checks if a Rule has an Action
     query_str = 'SELECT COUNT(1) FROM RULE_HAS_ACTION WHERE RULE_URI = ? AND ACTION_URI = ?'
@@ -378,15 +834,12 @@ def get_action(action_uri):
     result = query_db('SELECT URI, LABEL, DEFINITION FROM ACTION WHERE URI = ?', (action_uri,), one=True)
     if result is None:
         raise ValueError('Action with ID ' + action_uri + ' not found.')
-    return dict(result)
+    return Action.intern(*result)
 
 
 def get_all_actions():
-    # Returns a List of all Actions as URIs
-    actions = list()
-    for result in query_db('SELECT URI, LABEL, DEFINITION FROM ACTION'):
-        actions.append(dict(result))
-    return actions
+    # Returns a List of all Actions, each containing a URI, LABEL and DEFINITION
+    return [Action.intern(*result) for result in query_db('SELECT URI, LABEL, DEFINITION FROM ACTION')]
 
 
 def create_party(party_uri, label=None, comment=None):
@@ -410,6 +863,11 @@ def delete_party(party_uri):
         raise ValueError('Cannot delete a Party while it is assigned to a Rule.')
 
 
+def get_existing_parties(party_uris):
+    # Returns the Set of URIs from the given List which already belong to a Party
+    return {result['URI'] for result in query_db_in('SELECT URI FROM PARTY WHERE URI IN ({uris})', party_uris)}
+
+
 def party_exists(party_uri):
     """
     Checks if a Party with the given URI exists
@@ -421,12 +879,56 @@ def party_exists(party_uri):
 
 
 def get_rules_for_party(party_uri):
-    # Returns a list of all the Rules to which the Party is assigned.
+    # Returns a list of all the Rules to which the Party is assigned, either as an Assignor or as an Assignee.
     query_str = '''
-        SELECT DISTINCT R.URI FROM RULE R, ASSIGNOR A1, ASSIGNEE A2 
-        WHERE (R.URI = A1.RULE_URI AND A1.PARTY_URI = ?) OR (R.URI = A2.RULE_URI AND A2.PARTY_URI = ?)
+        SELECT RULE_URI FROM ASSIGNOR WHERE PARTY_URI = ?
+        UNION
+        SELECT RULE_URI FROM ASSIGNEE WHERE PARTY_URI = ?
     '''
-    return [result['URI'] for result in query_db(query_str, (party_uri, party_uri))]
+    return [result['RULE_URI'] for result in query_db(query_str, (party_uri, party_uri))]
+
+
+def get_party_licence_map(after=0, limit=-1, order='rowid'):
+    """
+    Returns every Party along with the Policies it is involved in, either as an Assignor or Assignee of any of their
+    Rules, using a single query.
+
+    :param after: Only Parties after this key are included, see get_page()
+    :param limit: The maximum number of Parties to include, or -1 for no limit
+    :param order: The name of one of the PAGE_ORDERS the Parties are returned in
+    :return: A List of Parties. Each Party is a Dictionary containing a ROWID, URI, LABEL, COMMENT and LICENCES.
+             LICENCES is a List of Policies, each a Dictionary containing a URI and LABEL, with each Policy listed only
+             once.
+    """
+    query_str = '''
+        SELECT DISTINCT PA.ROWID, PA.URI AS PARTY_URI, PA.LABEL AS PARTY_LABEL, PA.COMMENT AS PARTY_COMMENT, P.URI,
+            P.LABEL
+        FROM (
+            SELECT rowid AS ROWID, *, ROW_NUMBER() OVER (ORDER BY {order}) AS POSITION FROM PARTY
+            WHERE {condition} ORDER BY {order} LIMIT ?
+        ) PA
+        LEFT JOIN (
+            SELECT PARTY_URI, RULE_URI FROM ASSIGNOR
+            UNION
+            SELECT PARTY_URI, RULE_URI FROM ASSIGNEE
+        ) A ON A.PARTY_URI = PA.URI
+        LEFT JOIN POLICY_HAS_RULE P_R ON P_R.RULE_URI = A.RULE_URI
+        LEFT JOIN POLICY P ON P.URI = P_R.POLICY_URI
+        ORDER BY PA.POSITION
+    '''.format(order=', '.join(PAGE_ORDERS[order]), condition=page_condition(order))
+    parties = dict()
+    for result in query_db(query_str, page_key_args(after) + (limit,)):
+        if result['PARTY_URI'] not in parties:
+            parties[result['PARTY_URI']] = {
+                'ROWID': result['ROWID'],
+                'URI': result['PARTY_URI'],
+                'LABEL': result['PARTY_LABEL'],
+                'COMMENT': result['PARTY_COMMENT'],
+                'LICENCES': []
+            }
+        if result['URI'] is not None:
+            parties[result['PARTY_URI']]['LICENCES'].append({'URI': result['URI'], 'LABEL': result['LABEL']})
+    return list(parties.values())
 
 
 def add_assignor_to_rule(assignor_uri, rule_uri):
@@ -496,16 +998,100 @@ def get_assignees_for_rule(rule_uri):
 
 
 def get_all_parties():
-    # Returns a List of Parties. Each Party is a Dictionary containing the URI, Label and Comment
-    return [dict(result) for result in query_db('SELECT * FROM PARTY')]
+    # Returns a List of Parties. Each Party contains the URI, Label and Comment
+    return [Party.intern(*result) for result in query_db('SELECT URI, LABEL, COMMENT FROM PARTY')]
 
 
 def get_party(party_uri):
     """
     Returns information about the Party with the given URI
-    Returns a Dictionary with the following elements: URI, LABEL, COMMENT
+    Returns a Party with the following elements: URI, LABEL, COMMENT
     """
-    result = query_db('SELECT * FROM PARTY WHERE URI = ?', (party_uri,), one=True)
+    result = query_db('SELECT URI, LABEL, COMMENT FROM PARTY WHERE URI = ?', (party_uri,), one=True)
     if result is None:
         raise ValueError('Party with URI ' + party_uri + ' not found.')
-    return dict(result)
\ No newline at end of file
+    return Party.intern(*result)
+
+
+def create_staged_triples():
+    # Creates an empty temporary table for RDF triples being imported, see rdf_reader.py. Only this connection sees it.
+    conn = get_db()
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS STAGED_TRIPLE (SUBJECT TEXT, PREDICATE TEXT, OBJECT TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS temp.STAGED_TRIPLE_SUBJECT ON STAGED_TRIPLE (SUBJECT)')
+    conn.execute('DELETE FROM STAGED_TRIPLE')
+
+
+def drop_staged_triples():
+    get_db().execute('DROP TABLE IF EXISTS temp.STAGED_TRIPLE')
+
+
+def add_staged_triples(triples):
+    # Adds a List of (subject, predicate, object) tuples to the table created by create_staged_triples()
+    update_db_many('INSERT INTO STAGED_TRIPLE (SUBJECT, PREDICATE, OBJECT) VALUES (?, ?, ?)', triples)
+
+
+def get_staged_subjects(predicate, obj):
+    # Returns the subjects of the staged triples with the given predicate and object, in the order they were staged
+    query_str = 'SELECT DISTINCT SUBJECT FROM STAGED_TRIPLE WHERE PREDICATE = ? AND OBJECT = ? ORDER BY rowid'
+    return [result['SUBJECT'] for result in query_db(query_str, (predicate, obj))]
+
+
+def get_staged_triples(subjects):
+    """
+    Retrieve the staged triples about many subjects at once
+
+    :param subjects: A List of subjects
+    :return: A Dictionary of subject to a List of (predicate, object) tuples, in the order they were staged
+    """
+    query_str = 'SELECT * FROM STAGED_TRIPLE WHERE SUBJECT IN ({uris}) ORDER BY rowid'
+    triples = {subject: [] for subject in subjects}
+    for result in query_db_in(query_str, subjects):
+        triples[result['SUBJECT']].append((result['PREDICATE'], result['OBJECT']))
+    return triples
+
+
+def add_to_outbox(message_json):
+    # Queues an email to be sent as soon as possible, see mail_queue.py
+    update_db('INSERT INTO OUTBOX (MESSAGE, CREATED) VALUES (?, CURRENT_TIMESTAMP)', (message_json,))
+
+
+def claim_outbox(now, claimed_until, limit, max_attempts):
+    """
+    Claims the emails in the outbox which are due to be sent, by putting off their next attempt so that no other worker
+    sends them meanwhile. The attempt is counted straight away, so an email whose worker dies while sending it is still
+    given up on in the end.
+
+    :param now: The current Unix time
+    :param claimed_until: The Unix time to put the next attempt off until
+    :param limit: The maximum number of emails to claim
+    :param max_attempts: Emails which have been attempted this many times are given up on
+    :return: A List of emails, oldest first. Each is a row containing an ID, MESSAGE and ATTEMPTS, including this one.
+    """
+    query_str = '''
+        UPDATE OUTBOX SET NEXT_ATTEMPT = ?, ATTEMPTS = ATTEMPTS + 1
+        WHERE ID IN (
+            SELECT ID FROM OUTBOX WHERE NEXT_ATTEMPT <= ? AND ATTEMPTS < ? ORDER BY ID LIMIT ?
+        )
+        RETURNING ID, MESSAGE, ATTEMPTS
+    '''
+    return sorted(query_db(query_str, (claimed_until, now, max_attempts, limit)), key=lambda result: result['ID'])
+
+
+def delete_from_outbox(ids):
+    # Removes emails which have been sent from the outbox
+    query_db_in('DELETE FROM OUTBOX WHERE ID IN ({uris})', ids)
+
+
+def mark_outbox_failed(failures):
+    """
+    Records failed attempts to send emails in the outbox. The attempts were already counted by claim_outbox().
+
+    :param failures: A List of (ID, error message, Unix time of the next attempt) tuples
+    """
+    query_str = 'UPDATE OUTBOX SET LAST_ERROR = ?, NEXT_ATTEMPT = ? WHERE ID = ?'
+    update_db_many(query_str, [(error, next_attempt, outbox_id) for outbox_id, error, next_attempt in failures])
+
+
+def get_outbox():
+    # Returns every email in the outbox, as Dictionaries containing each column
+    return [dict(result) for result in query_db('SELECT * FROM OUTBOX ORDER BY ID')]
@@ -0,0 +1,47 @@
+import json
+import zlib
+from controller import db_access, rdf_writer
+from model.record import json_default
+
+"""
+DUMP
+
+Writes out the whole catalogue - every licence with its Rules, Actions and Parties - for the /dump route and
+dump_catalogue.py, either as N-Triples or as JSON Lines (one licence per line, in the same form as
+db_access.get_policies_full() with expanded parties).
+
+Licences are read from a single cursor a batch at a time (see db_access.iter_policies_full()) and written out as they
+are read, so memory use stays the same however big the catalogue is.
+"""
+
+# Number of licences read from the database at a time
+BATCH_SIZE = 500
+
+# Formats the catalogue can be dumped in, by media type
+MEDIA_TYPES = ['application/n-triples', 'application/x-ndjson']
+
+
+def write_dump(media_type):
+    """
+    Writes out every licence in the catalogue
+
+    :param media_type: One of MEDIA_TYPES
+    :return: A generator of chunks of text
+    """
+    policies = db_access.iter_policies_full(BATCH_SIZE, expand_parties=True)
+    if media_type == 'application/n-triples':
+        return rdf_writer.write_ntriples(rdf_writer.dump_statements(policies))
+    if media_type == 'application/x-ndjson':
+        return rdf_writer.chunked(json.dumps(policy, ensure_ascii=False, default=json_default) + '\n'
+                                  for policy in policies)
+    raise ValueError('Cannot dump the catalogue as ' + media_type)
+
+
+def gzip_chunks(chunks):
+    # Compresses chunks of text with gzip as they are written
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+import requests
+import _conf
+
+"""
+EXTERNAL_PARTIES
+
+Keeps the list of organisations from an external catalogue (EXTERNAL_PARTIES_URL in _conf), which are offered as
+Parties when creating a licence alongside those already in the database.
+
+The list is fetched once and kept for EXTERNAL_PARTIES_TTL seconds. After that it is refreshed in the background while
+the old list keeps being used (stale-while-revalidate), so pages are only held up by the external catalogue the very
+first time it is fetched, and then for no longer than EXTERNAL_PARTIES_TIMEOUT seconds.
+If fetching fails FAILURE_THRESHOLD times in a row, the catalogue is assumed to be down and isn't tried again for
+RETRY_AFTER seconds (a circuit breaker), during which the last list fetched (if any) is used.
+"""
+
+# Number of failed fetches in a row after which the external catalogue is left alone for a while
+FAILURE_THRESHOLD = 3
+# Seconds to wait before trying the external catalogue again after FAILURE_THRESHOLD failures
+RETRY_AFTER = 5 * 60
+
+
+class ExternalParties:
+    def __init__(self, url, ttl, timeout):
+        """
+        :param url: The URL of the external catalogue's JSON list of organisations
+        :param ttl: Seconds the list is kept for before it is refreshed
+        :param timeout: Seconds to wait for the external catalogue before giving up
+        """
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self._parties = None
+        self._fetched = None
+        self._refreshing = False
+        self._failures = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the external parties, refreshing them in the background if they are out of date. They are only fetched
+        while waiting if they haven't been fetched before.
+
+        :return: A Dictionary of URI to Party. Each Party is a Dictionary containing a URI, LABEL and COMMENT. Empty if
+                 the external catalogue couldn't be reached and nothing was fetched before.
+        """
+        with self._lock:
+            parties = self._parties
+            stale = self._fetched is None or time.monotonic() - self._fetched >= self.ttl
+            refresh = stale and not self._refreshing and time.monotonic() >= self._retry_at
+            if refresh:
+                self._refreshing = True
+        if refresh:
+            if parties is None:
+                self.refresh()
+                return self._parties or {}
+            threading.Thread(target=self.refresh, daemon=True).start()
+        return parties or {}
+
+    def refresh(self):
+        # Fetches the external parties, keeping the previous ones if that fails. Any other error is still counted as a
+        # failure and the refresh marked as finished before it is raised, so later calls can try again.
+        parties = None
+        try:
+            parties = self.fetch()
+        except (requests.RequestException, ValueError, KeyError, TypeError) as error:
+            logging.warning('Could not fetch external parties from %s: %s', self.url, error)
+        finally:
+            with self._lock:
+                if parties is None:
+                    self._failures += 1
+                    if self._failures >= FAILURE_THRESHOLD:
+                        self._retry_at = time.monotonic() + RETRY_AFTER
+                else:
+                    self._parties = parties
+                    self._fetched = time.monotonic()
+                    self._failures = 0
+                    self._retry_at = 0
+                self._refreshing = False
+
+    def fetch(self):
+        # Fetches the external parties, raising an exception if they can't be fetched
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        parties = {}
+        for external_party in response.json():
+            parties[external_party['view_taxonomy_term']] = {
+                'URI': external_party['view_taxonomy_term'],
+                'LABEL': external_party['name'],
+                'COMMENT': external_party['description__value']
+            }
+        return parties
+
+    def clear(self):
+        with self._lock:
+            self._parties = None
+            self._fetched = None
+            self._refreshing = False
+            self._failures = 0
+            self._retry_at = 0
+
+
+cache = ExternalParties(_conf.EXTERNAL_PARTIES_URL, _conf.EXTERNAL_PARTIES_TTL, _conf.EXTERNAL_PARTIES_TIMEOUT)
@@ -1,5 +1,5 @@
 import re
-from controller import db_access
+from controller import db_access, json_ld, policy_index, similarity, vocabulary
 from flask import url_for, jsonify
 import _conf
 from uuid import uuid4
@@ -38,7 +38,9 @@ def create_policy(policy_uri, attributes=None, rules=None):
     if not is_valid_uri(policy_uri):
         raise ValueError('Not a valid URI: ' + policy_uri)
 
-    permitted_rule_types = []
+    permitted = vocabulary.get_vocabulary()
+    # The (rule type, action) pairs of the policy, for adding it to the search index
+    pairs = []
 
     try:
         db_access.create_policy(policy_uri)
@@ -51,9 +53,7 @@ def create_policy(policy_uri, attributes=None, rules=None):
                 if 'TYPE_URI' in rule:
                     rule_type = rule['TYPE_URI']
                 elif 'TYPE_LABEL' in rule:
-                    if not permitted_rule_types:
-                        permitted_rule_types = db_access.get_permitted_rule_types()
-                    rule_type = get_rule_type_uri(rule['TYPE_LABEL'], permitted_rule_types)
+                    rule_type = permitted.rule_type_uris.get(rule['TYPE_LABEL'])
                     if not rule_type:
                         raise ValueError('Cannot create policy - Rule type ' + rule['TYPE_LABEL'] +
                                          ' is not permitted')
@@ -65,11 +65,11 @@ def create_policy(policy_uri, attributes=None, rules=None):
                         if is_valid_uri(action):
                             action_uri = action
                         else:
-                            permitted_actions = db_access.get_all_actions()
-                            action_uri = get_action_uri(action, permitted_actions)
+                            action_uri = permitted.action_uris.get(action)
                             if not action_uri:
                                 raise ValueError('Cannot create policy - Action ' + action + ' is not permitted')
                         db_access.add_action_to_rule(action_uri, rule_uri)
+                        pairs.append((rule_type, action_uri))
                 if 'ASSIGNORS' in rule:
                     for assignor in rule['ASSIGNORS']:
                         if not db_access.party_exists(assignor['URI']):
@@ -81,10 +81,158 @@ def create_policy(policy_uri, attributes=None, rules=None):
                             db_access.create_party(assignee['URI'], assignee['LABEL'], assignee['COMMENT'])
                         db_access.add_assignee_to_rule(assignee['URI'], rule_uri)
                 db_access.add_rule_to_policy(rule_uri, policy_uri)
+        store_policies_json_ld([policy_uri])
     except Exception as error:
         db_access.rollback_db()
         raise error
     db_access.commit_db()
+    policy_index.add_policy(policy_uri, pairs)
+    similarity.invalidate()
+
+
+def create_policies_bulk(policies):
+    """
+    Creates many entire policies at once, i.e. when importing a catalogue. Rule types, Actions and existing Parties are
+    looked up once for the whole batch and everything is inserted with a fixed number of statements in a single
+    transaction, rather than checked and inserted row by row as create_policy() does.
+    A policy which can't be created doesn't stop the others from being created. Its error is reported instead.
+
+    :param policies: List of policies. Each policy should be a Dictionary containing the following elements:
+        URI: string
+        ATTRIBUTES: Dictionary of optional attributes of the policy, the same as for create_policy()
+        RULES: List of Rules, the same as for create_policy()
+        CREATED: Optional date the policy was created, i.e. when imported from elsewhere. Defaults to now.
+    :return: A Dictionary of Policy URI to an error message for each policy which was not created
+    """
+    errors = {}
+    permitted_vocabulary = vocabulary.get_vocabulary()
+    permitted = {
+        'RULE_TYPES': permitted_vocabulary.rule_type_labels.keys(),
+        'RULE_TYPE_LABELS': permitted_vocabulary.rule_type_uris,
+        'ACTIONS': permitted_vocabulary.action_labels.keys(),
+        'ACTION_LABELS': permitted_vocabulary.action_uris,
+        'POLICY_TYPES': set(db_access.get_policy_types())
+    }
+    existing_policies = db_access.get_existing_policies(policy.get('URI') for policy in policies)
+    resolved = []
+    for policy in policies:
+        try:
+            if policy['URI'] in existing_policies:
+                raise ValueError('A Policy with that URI already exists.')
+            resolved.append(resolve_policy(policy, permitted))
+            existing_policies.add(policy['URI'])
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            errors[policy.get('URI')] = str(error)
+
+    party_uris = {party['URI'] for policy, parties in resolved for party in parties}
+    existing_parties = db_access.get_existing_parties(party_uris)
+    db_access.create_savepoint('CREATE_POLICIES')
+    try:
+        created = insert_resolved_policies(resolved, existing_parties)
+    except Exception:
+        # Something in the batch broke a constraint, so fall back to creating the policies one at a time to find out
+        # which. Only the policies which fail are left out.
+        db_access.rollback_to_savepoint('CREATE_POLICIES')
+        created = []
+        for policy, parties in resolved:
+            db_access.create_savepoint('CREATE_POLICY')
+            try:
+                created.extend(insert_resolved_policies([(policy, parties)], existing_parties))
+                db_access.release_savepoint('CREATE_POLICY')
+            except Exception as error:
+                db_access.rollback_to_savepoint('CREATE_POLICY')
+                errors[policy['URI']] = str(error)
+    else:
+        db_access.release_savepoint('CREATE_POLICIES')
+
+    try:
+        store_policies_json_ld([policy['URI'] for policy in created])
+    except Exception as error:
+        db_access.rollback_db()
+        raise error
+    db_access.commit_db()
+    policy_index.invalidate()
+    similarity.invalidate()
+    return errors
+
+
+def resolve_policy(policy, permitted):
+    """
+    Checks a policy for create_policies_bulk() and works out the URIs of its Rule types and Actions.
+
+    :param policy: A policy as given to create_policies_bulk()
+    :param permitted: A Dictionary of what is permitted - RULE_TYPES, ACTIONS and POLICY_TYPES are Sets of URIs,
+                      RULE_TYPE_LABELS and ACTION_LABELS are Dictionaries of label to URI
+    :return: A tuple of the policy in the form taken by db_access.create_policies_full(), and a List of the Parties it
+             uses, each a Dictionary containing a URI, LABEL and COMMENT
+    """
+    if not is_valid_uri(policy['URI']):
+        raise ValueError('Not a valid URI: ' + policy['URI'])
+    resolved = {'URI': policy['URI'], 'CREATED': policy.get('CREATED'), 'RULES': []}
+    for attr_name, attr_value in (policy.get('ATTRIBUTES') or {}).items():
+        attr = attr_name.upper()
+        if attr not in db_access.POLICY_ATTRIBUTES:
+            raise ValueError('Attribute \'' + attr + '\' is not permitted.')
+        resolved[attr] = attr_value
+    if resolved.get('TYPE') and resolved['TYPE'] not in permitted['POLICY_TYPES']:
+        raise ValueError('Cannot create policy - Policy type ' + resolved['TYPE'] + ' is not permitted')
+    parties = []
+    for rule in policy.get('RULES') or []:
+        if 'TYPE_URI' in rule:
+            rule_type = rule['TYPE_URI']
+            if rule_type not in permitted['RULE_TYPES']:
+                raise ValueError('Rule type ' + rule_type + ' is not permitted.')
+        elif 'TYPE_LABEL' in rule:
+            rule_type = permitted['RULE_TYPE_LABELS'].get(rule['TYPE_LABEL'])
+            if not rule_type:
+                raise ValueError('Cannot create policy - Rule type ' + rule['TYPE_LABEL'] + ' is not permitted')
+        else:
+            raise ValueError('Cannot create policy - no Rule type provided')
+        rule_uri = _conf.BASE_URI + 'rules/' + str(uuid4())
+        resolved_rule = {'URI': rule_uri, 'TYPE_URI': rule_type, 'ACTIONS': [], 'ASSIGNORS': [], 'ASSIGNEES': []}
+        for action in rule.get('ACTIONS', []):
+            if action:
+                if is_valid_uri(action):
+                    action_uri = action
+                    if action_uri not in permitted['ACTIONS']:
+                        raise ValueError('Action with URI ' + action_uri + ' is not permitted.')
+                else:
+                    action_uri = permitted['ACTION_LABELS'].get(action)
+                    if not action_uri:
+                        raise ValueError('Cannot create policy - Action ' + action + ' is not permitted')
+                if action_uri in resolved_rule['ACTIONS']:
+                    raise ValueError('Rule ' + rule_uri + ' already includes Action ' + action_uri + '.')
+                resolved_rule['ACTIONS'].append(action_uri)
+        for key, role in [('ASSIGNORS', 'an Assignor'), ('ASSIGNEES', 'an Assignee')]:
+            for party in rule.get(key, []):
+                if party['URI'] in resolved_rule[key]:
+                    raise ValueError('Rule ' + rule_uri + ' already has ' + role + ' with URI ' + party['URI'] + '.')
+                resolved_rule[key].append(party['URI'])
+                parties.append({'URI': party['URI'], 'LABEL': party['LABEL'], 'COMMENT': party['COMMENT']})
+        resolved['RULES'].append(resolved_rule)
+    return resolved, parties
+
+
+def insert_resolved_policies(resolved, existing_parties):
+    # Inserts policies resolved by resolve_policy(), creating the Parties they use which don't exist yet. Parties are
+    # added to existing_parties once inserted.
+    new_parties = {}
+    for policy, parties in resolved:
+        for party in parties:
+            if party['URI'] not in existing_parties:
+                new_parties.setdefault(party['URI'], party)
+    db_access.create_policies_full([policy for policy, parties in resolved], list(new_parties.values()))
+    existing_parties.update(new_parties)
+    return [policy for policy, parties in resolved]
+
+
+def store_policies_json_ld(policy_uris):
+    # Builds the JSON-LD of each Policy and stores it alongside the Policy, to be used by the JSON-LD views
+    db_access.set_policies_json_ld([(
+        policy['URI'],
+        json_ld.dumps(json_ld.policy_nodes(policy, policy['RULES'])),
+        json_ld.dumps(json_ld.policy_register_entry(policy))
+    ) for policy in db_access.get_policies_full(policy_uris)])
 
 
 def is_valid_uri(uri):
@@ -92,32 +240,31 @@ def is_valid_uri(uri):
     return True if re.match('\w+:(/?/?)[^\s]+', uri) else False
 
 
-def get_rule_type_uri(label, permitted_rule_types):
-    # Takes a ruletype Label tries to figure out the corresponding URI
-    for permitted_rule_type in permitted_rule_types:
-        if permitted_rule_type['LABEL'] == label:
-            return permitted_rule_type['URI']
-    return None
-
+def filter_policies(desired_rules, num_results=10, text=None, offset=0):
+    """
+    Filters through all available policies according to the rules supplied, see search_policies()
 
-def get_action_uri(label, permitted_actions):
-    # Takes an Action Label and tries to figure out the corresponding URI
-    for permitted_action in permitted_actions:
-        if permitted_action['LABEL'] == label:
-            return permitted_action['URI']
-    return None
+    :return: A List of Policies, as returned by search_policies()
+    """
+    return search_policies(desired_rules, num_results, text, offset)[0]
 
 
-def filter_policies(desired_rules, num_results=10):
+def search_policies(desired_rules, num_results=10, text=None, offset=0):
     """
     Filters through all available policies according to the rules supplied. Does not take assignors or assignees into
-    account at this time.
+    account at this time. Matching is done against the search index in policy_index.py, so only the returned policies
+    are loaded from the database.
+    If text is given, only policies matching it in a full-text search (see db_access.get_policies_by_text()) are
+    returned, best match first.
 
     :param desired_rules: A List of Rules. Each Rule is a Dictionary containing the following elements:
         TYPE_URI: string
         ACTIONS: A List of Actions. Each Action is a Dictionary containing a URI
     :param num_results: The maximum number of policies to return
-    :return: A List of Policies. Each Policy is a Dictionary containing the following elements:
+    :param text: Words to search for in the labels and comments of policies and the Actions and Parties they use
+    :param offset: The number of best matching policies to skip, for paging through the results
+    :return: A List of Policies, and the total number of matching policies. Each Policy is a Dictionary containing the
+             following elements:
         LABEL: string
         LINK: string
         DIFFERENCES: int
@@ -130,51 +277,67 @@ def filter_policies(desired_rules, num_results=10):
             ASSIGNEES: List of Assignees.  Each Assignee is a Dictionary containing a URI, LABEL and COMMENT.
             ACTIONS: List of Actions. Each Action is a Dictionary containing a URI, LABEL and DEFINITION.
     """
-    policy_uris = db_access.get_all_policies()
-    policies = []
-    for policy_uri in policy_uris:
-        policy = db_access.get_policy(policy_uri)
-        policy['RULES'] = [db_access.get_rule(rule_uri) for rule_uri in db_access.get_rules_for_policy(policy_uri)]
-        policies.append(policy)
-
+    index = policy_index.get_index()
+    text_query = get_text_query(text) if text else None
+    if text_query is None:
+        matches, total = index.match(desired_rules, num_results, offset)
+    else:
+        # Text matches are ranked by the full-text search. With no Rules to match, every (rule type, action) pair of a
+        # policy is a difference.
+        text_matches, desired_columns = index.includes(db_access.get_policies_by_text(text_query), desired_rules)
+        total = len(text_matches)
+        matches = [(policy_uri, index.differences(policy_uri, desired_columns))
+                   for policy_uri in text_matches[offset:offset + num_results]]
+    policies = db_access.get_policies_full([policy_uri for policy_uri, differences in matches], expand_parties=True)
     results = []
-    for policy in policies:
-        # Compare desired rules and policy rules
-        # If any policy rule isn't present in the desired rules, add it to the list of extra rules.
-        extra_rules = []
-        for rule in policy['RULES']:
-            for action in rule['ACTIONS']:
-                policy_rule_matches_a_desired_rule = False
-                for desired_rule in desired_rules:
-                    if rule['TYPE_URI'] == desired_rule['TYPE_URI']:
-                        for desired_action in desired_rule['ACTIONS']:
-                            if action['URI'] == desired_action['URI']:
-                                policy_rule_matches_a_desired_rule = True
-                if not policy_rule_matches_a_desired_rule:
-                    extra_rules.append(rule)
-        # If any desired rule isn't present in the policy's rules, skip to next policy
-        policy_has_missing_rules = False
-        for desired_rule in desired_rules:
-            desired_rule_matches_a_policy_rule = False
-            for rule in policy['RULES']:
-                if rule['TYPE_URI'] == desired_rule['TYPE_URI']:
-                    for action in rule['ACTIONS']:
-                        for desired_action in desired_rule['ACTIONS']:
-                            if action['URI'] == desired_action['URI']:
-                                desired_rule_matches_a_policy_rule = True
-            if not desired_rule_matches_a_policy_rule:
-                policy_has_missing_rules = True
-        if policy_has_missing_rules:
-            continue
+    for policy, (policy_uri, differences) in zip(policies, matches):
+        results.append({
+            'LABEL': policy['LABEL'],
+            'LINK': url_for('controller.licence_routes', uri=policy_uri),
+            'RULES': policy['RULES'],
+            'DIFFERENCES': differences
+        })
+    return results, total
+
 
+def similar_policies(desired_rules, num_results=10, offset=0):
+    """
+    Finds the policies most similar to the rules supplied, for suggesting licences which could be reused instead of
+    creating a new one. Unlike search_policies(), policies don't need to include every rule, they are ranked by how many
+    of their (rule type, action) pairs they share with the rules, giving more weight to rarer pairs. See similarity.py.
+
+    :param desired_rules: A List of Rules. Each Rule is a Dictionary containing the following elements:
+        TYPE_URI: string
+        ACTIONS: A List of Actions. Each Action is a Dictionary containing a URI
+    :param num_results: The maximum number of policies to return
+    :param offset: The number of the most similar policies to skip, for getting the next results
+    :return: A List of Policies, most similar first. Each Policy is a Dictionary containing a LABEL, LINK and RULES as
+             returned by search_policies(), and its SIMILARITY to the rules supplied as a number between 0 and 1.
+    """
+    matches = similarity.get_index().similar(desired_rules, offset + num_results)[offset:]
+    policies = db_access.get_policies_full([policy_uri for policy_uri, score in matches], expand_parties=True)
+    results = []
+    for policy, (policy_uri, score) in zip(policies, matches):
         results.append({
             'LABEL': policy['LABEL'],
-            'LINK': url_for('controller.licence_routes', uri=policy['URI']),
+            'LINK': url_for('controller.licence_routes', uri=policy_uri),
             'RULES': policy['RULES'],
-            'DIFFERENCES': len(extra_rules)
+            'SIMILARITY': round(score, 4)
         })
-    results.sort(key=lambda x: x['DIFFERENCES'])
-    return results[:num_results]
+    return results
+
+
+def get_text_query(text):
+    """
+    Turns words typed in by a user into an SQLite FTS5 query matching all of them. Each word matches as a prefix, so
+    'AU' matches 'Australia', and the parts of a word joined by punctuation must appear together, so 'CC-BY' matches
+    'CC BY' but not 'CC-SA BY'.
+
+    :param text: The words to search for
+    :return: The query, or None if there are no words to search for
+    """
+    phrases = ['"{}"*'.format(word.replace('"', '""')) for word in text.split() if re.search(r'\w', word)]
+    return ' '.join(phrases) or None
 
 
 def get_policy_rdf(policy, rules):
@@ -0,0 +1,222 @@
+import json
+from controller import functions, rdf_writer
+
+"""
+JSON_LD
+
+Builds the JSON-LD views of licences and registers directly as compacted documents, instead of building an rdflib Graph
+and compacting it against a context on every request. The documents describe the same triples as the graphs built in
+functions.py (see tests/test_json_ld.py).
+
+The nodes describing each licence are built once, when the licence is created (see functions.create_policy()), and
+stored alongside it as JSON. Views of a licence or of the licence register only wrap those stored nodes in a document.
+"""
+
+# JSON vocabularies that are added to all JSON-LD views served by this application.
+JSON_CONTEXT_ACTIONS = {
+    '@vocab': 'http://www.w3.org/ns/odrl/2/',
+    'label': 'http://www.w3.org/2000/01/rdf-schema#label',
+    'definition': 'http://www.w3.org/2004/02/skos/core#definition',
+    'containedItemClass': 'http://purl.org/linked-data/registry#containedItemClass',
+    'comment': 'http://www.w3.org/2000/01/rdf-schema#comment',
+    'register': 'http://purl.org/linked-data/registry#register'
+}
+JSON_CONTEXT_POLICIES = {
+    '@vocab': 'http://www.w3.org/ns/odrl/2/',
+    'label': 'http://www.w3.org/2000/01/rdf-schema#label',
+    'created': 'http://purl.org/dc/terms/created',
+    'comment': 'http://www.w3.org/2000/01/rdf-schema#comment',
+    'sameAs': 'http://www.w3.org/2002/07/owl#sameAs',
+    'register': 'http://purl.org/linked-data/registry#register',
+    'containedItemClass': 'http://purl.org/linked-data/registry#containedItemClass',
+    'hasVersion': 'http://purl.org/dc/terms/hasVersion',
+    'language': 'http://purl.org/dc/terms/language',
+    'legalCode': 'http://creativecommons.org/ns#legalcode',
+    'jurisdiction': 'http://creativecommons.org/ns#jurisdiction',
+    'seeAlso': 'http://www.w3.org/2000/01/rdf-schema#seeAlso',
+    'creator': 'http://purl.org/dc/terms/creator',
+    'logo': 'http://xmlns.com/foaf/0.1/logo',
+    'status': 'http://www.w3.org/ns/adms#status'
+}
+JSON_CONTEXT_PARTIES = {
+    '@vocab': 'http://www.w3.org/ns/odrl/2/',
+    'label': 'http://www.w3.org/2000/01/rdf-schema#label',
+    'comment': 'http://www.w3.org/2000/01/rdf-schema#comment',
+    'register': 'http://purl.org/linked-data/registry#register',
+    'containedItemClass': 'http://purl.org/linked-data/registry#containedItemClass',
+}
+
+# Policy attributes as (term in JSON_CONTEXT_POLICIES, whether the value is a URI, language of the value)
+POLICY_ATTRIBUTES = [
+    ('LABEL', 'label', False, 'en'),
+    ('COMMENT', 'comment', False, 'en'),
+    ('CREATOR', 'creator', True, None),
+    ('HAS_VERSION', 'hasVersion', False, None),
+    ('JURISDICTION', 'jurisdiction', True, None),
+    ('LANGUAGE', 'language', True, None),
+    ('LEGAL_CODE', 'legalCode', True, None),
+    ('LOGO', 'logo', True, None),
+    ('SAME_AS', 'sameAs', True, None),
+    ('SEE_ALSO', 'seeAlso', True, None),
+    ('STATUS', 'status', True, None)
+]
+
+
+def compact_type(uri):
+    # Types in the ODRL vocabulary are written relative to the @vocab of the contexts
+    local_name = uri[len(rdf_writer.ODRL):]
+    if uri.startswith(rdf_writer.ODRL) and local_name.isalnum():
+        return local_name
+    return uri
+
+
+def one_or_many(values):
+    # Compacted JSON-LD uses a single value rather than a List when there is only one
+    return values[0] if len(values) == 1 else values
+
+
+def policy_nodes(policy, rules):
+    """
+    Builds the nodes describing a policy and its rules, the same as functions.get_policy_rdf()
+
+    :param policy: A Policy, as returned by db_access.get_policy()
+    :param rules: The Rules included in the policy, as returned by db_access.get_rule()
+    :return: A List of nodes, the Policy first followed by its Rules
+    """
+    node = {'@id': policy['URI'], '@type': one_or_many(policy_types(policy))}
+    if policy['CREATED']:
+        node['created'] = {'@type': rdf_writer.XSD + 'date', '@value': str(policy['CREATED'])}
+    for attribute, term, is_uri, lang in POLICY_ATTRIBUTES:
+        if policy[attribute]:
+            if is_uri:
+                node[term] = {'@id': policy[attribute]}
+            elif lang:
+                node[term] = {'@language': lang, '@value': policy[attribute]}
+            else:
+                node[term] = policy[attribute]
+    rule_nodes = []
+    rules_by_type = {}
+    for rule in rules:
+        rule_id = rdf_writer.rule_node(policy['URI'], rule['URI'])
+        rules_by_type.setdefault(rule['TYPE_LABEL'].lower(), []).append({'@id': rule_id})
+        rule_json = {'@id': rule_id, '@type': rule['TYPE_LABEL']}
+        for term, uris in [('action', [action['URI'] for action in rule['ACTIONS']]),
+                           ('assignor', rule['ASSIGNORS']), ('assignee', rule['ASSIGNEES'])]:
+            if uris:
+                rule_json[term] = one_or_many([{'@id': uri} for uri in uris])
+        rule_nodes.append(rule_json)
+    for term, rule_ids in rules_by_type.items():
+        node[term] = one_or_many(rule_ids)
+    return [node] + rule_nodes
+
+
+def policy_register_entry(policy):
+    """
+    Builds the node describing a policy in the licence register, the same as functions.get_policies_rdf() but without
+    the link to the register itself, which is added by policies_document()
+
+    :param policy: A Policy, as returned by db_access.get_policy()
+    :return: A node
+    """
+    node = {'@id': policy['URI'], '@type': one_or_many(policy_types(policy))}
+    if policy['LABEL']:
+        node['label'] = {'@language': 'en', '@value': policy['LABEL']}
+    if policy['COMMENT']:
+        node['comment'] = {'@language': 'en', '@value': policy['COMMENT']}
+    return node
+
+
+def policy_types(policy):
+    types = ['Policy']
+    if policy['TYPE']:
+        types.append(compact_type(policy['TYPE']))
+    return types
+
+
+def register_node(register_uri, label, comment, contained_item_class):
+    # The node describing a register itself
+    return {
+        '@id': register_uri,
+        '@type': rdf_writer.REG + 'Register',
+        'label': label,
+        'comment': comment,
+        'containedItemClass': {'@id': contained_item_class}
+    }
+
+
+def dumps(nodes):
+    # Writes nodes as JSON, ready to be stored or stitched into a document
+    return json.dumps(nodes, ensure_ascii=False, separators=(',', ':'))
+
+
+def document(context, nodes_json):
+    """
+    Wraps nodes in a JSON-LD document
+
+    :param context: One of the JSON_CONTEXT_* Dictionaries
+    :param nodes_json: The JSON of a List of nodes, as written by dumps()
+    :return: The document as a string
+    """
+    return '{{"@context":{context},"@graph":{nodes}}}'.format(context=dumps(context), nodes=nodes_json)
+
+
+def policy_document(nodes_json):
+    # The JSON-LD view of a licence, from the stored JSON of policy_nodes()
+    return document(JSON_CONTEXT_POLICIES, nodes_json)
+
+
+def policies_document(entries, register_uri):
+    """
+    The JSON-LD view of the licence register, the same as functions.get_policies_rdf()
+
+    :param entries: The node of policy_register_entry() for each Policy, i.e. loaded from the stored JSON
+    :param register_uri: The URI of the licence register
+    :return: The document as a string
+    """
+    nodes = [register_node(register_uri, 'Licence Register', 'This is a register (controlled list) of '
+                           'machine-readable Licenses which are a particular type of Policy.',
+                           rdf_writer.ODRL + 'Policy')]
+    nodes.extend(dict(entry, register={'@id': register_uri}) for entry in entries)
+    return document(JSON_CONTEXT_POLICIES, dumps(nodes))
+
+
+def actions_document(actions, register_uri):
+    """
+    The JSON-LD view of the action register, the same as functions.get_actions_rdf()
+
+    :param actions: A List of Actions, as returned by db_access.get_all_actions()
+    :param register_uri: The URI of the action register
+    :return: The document as a string
+    """
+    nodes = [register_node(register_uri, 'Action Register', 'This is a register (controlled list) of '
+                           'machine-readable Actions.', rdf_writer.ODRL + 'Action')]
+    for action in actions:
+        nodes.append({
+            '@id': action['URI'],
+            '@type': 'Action',
+            'label': {'@language': 'en', '@value': action['LABEL']},
+            'definition': {'@language': 'en', '@value': action['DEFINITION']},
+            'register': {'@id': register_uri}
+        })
+    return document(JSON_CONTEXT_ACTIONS, dumps(nodes))
+
+
+def parties_document(parties, register_uri):
+    """
+    The JSON-LD view of the party register, the same as functions.get_parties_rdf()
+
+    :param parties: A List of Parties, as returned by db_access.get_all_parties()
+    :param register_uri: The URI of the party register
+    :return: The document as a string
+    """
+    nodes = [register_node(register_uri, 'Party Register', functions.party_register_comment,
+                           rdf_writer.ODRL + 'Party')]
+    for party in parties:
+        node = {'@id': party['URI'], '@type': 'Party'}
+        if party['LABEL']:
+            node['label'] = {'@language': 'en', '@value': party['LABEL']}
+        if party['COMMENT']:
+            node['comment'] = {'@language': 'en', '@value': party['COMMENT']}
+        node['register'] = {'@id': register_uri}
+        nodes.append(node)
+    return document(JSON_CONTEXT_PARTIES, dumps(nodes))
@@ -0,0 +1,167 @@
+import json
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import _conf
+from controller import db_access
+
+"""
+MAIL_QUEUE
+
+Sends the emails from the contact form through Mailjet without holding up the request. contact_submit only adds the
+email to the OUTBOX table, and a worker thread sends whatever is in the outbox in the background.
+
+The worker sends up to BATCH_SIZE emails per request to the Mailjet API over a pooled HTTP session. Emails which can't
+be sent are tried again later, waiting twice as long after each failed attempt (starting at RETRY_DELAY seconds, up to
+MAX_RETRY_DELAY), and are given up on after MAX_ATTEMPTS attempts. Emails are removed from the outbox once sent.
+Because the outbox is in the database, queued emails survive a restart and each is claimed by one worker at a time, even
+when the app is run in several processes.
+"""
+
+# Maximum number of emails sent to Mailjet in one request
+BATCH_SIZE = 50
+# Seconds to wait for Mailjet before giving up on an attempt
+TIMEOUT = 10
+# Seconds to wait before the first retry of a failed email, doubling after each attempt up to MAX_RETRY_DELAY
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 60 * 60
+MAX_ATTEMPTS = 8
+# Seconds a worker has to send the emails it claims before another worker may claim them
+CLAIM_SECONDS = 5 * 60
+# Seconds the worker sleeps between checks of the outbox when it isn't woken by a new email
+POLL_INTERVAL = 60
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def is_configured():
+    # Whether the details needed for sending emails through Mailjet are in _conf
+    return bool(_conf.MAILJET_SECRETS and _conf.MAILJET_SECRETS.get('API_ENDPOINT') and
+                _conf.MAILJET_EMAIL_RECEIVERS and _conf.MAILJET_EMAIL_SENDER)
+
+
+def contact_message(name, email, message):
+    # Builds the Mailjet message for a submission of the contact form
+    return {
+        'From': {'Email': _conf.MAILJET_EMAIL_SENDER, 'Name': 'Licence Catalogue Contact Form'},
+        'To': [{'Email': receiver, 'Name': ''} for receiver in _conf.MAILJET_EMAIL_RECEIVERS],
+        'Subject': '[Licence Catalogue Contact Form] Enquiry from ' + email,
+        'TextPart': 'Name: {name}\nEmail: {email}\n\n{message}'.format(name=name, email=email, message=message)
+    }
+
+
+def enqueue(message, app):
+    """
+    Adds an email to the outbox and wakes the worker to send it
+
+    :param message: A Mailjet message, see contact_message()
+    :param app: The Flask app, for the worker to access the database with if it isn't running yet
+    """
+    db_access.add_to_outbox(json.dumps(message))
+    db_access.commit_db(catalogue_changed=False)
+    start_worker(app).wake()
+
+
+def start_worker(app):
+    # Starts the worker for this process if it isn't running yet, and returns it
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = MailWorker(app)
+            _worker.start()
+        return _worker
+
+
+def stop_worker():
+    # Stops the worker for this process once it has finished what it is sending, if it is running
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop()
+        worker.join()
+
+
+class MailWorker(threading.Thread):
+    def __init__(self, app):
+        """
+        :param app: The Flask app, whose context is used for accessing the database
+        """
+        super().__init__(name='MailWorker', daemon=True)
+        self.app = app
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._woken = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self):
+        self._woken.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._woken.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    while self.send_due():
+                        pass
+            except Exception:
+                logging.exception('Mail worker failed to send emails from the outbox')
+            self._woken.wait(POLL_INTERVAL)
+            self._woken.clear()
+
+    def send_due(self):
+        """
+        Sends one batch of the emails in the outbox which are due to be sent. Must be run in an app context.
+
+        :return: The number of emails attempted
+        """
+        now = time.time()
+        emails = db_access.claim_outbox(now, now + CLAIM_SECONDS, BATCH_SIZE, MAX_ATTEMPTS)
+        db_access.commit_db(catalogue_changed=False)
+        if not emails:
+            return 0
+        errors = self.send([json.loads(email['MESSAGE']) for email in emails])
+        sent = [email['ID'] for email, error in zip(emails, errors) if error is None]
+        failures = [(email['ID'], error, time.time() + min(RETRY_DELAY * 2 ** (email['ATTEMPTS'] - 1), MAX_RETRY_DELAY))
+                    for email, error in zip(emails, errors) if error is not None]
+        for outbox_id, error, next_attempt in failures:
+            logging.warning('Could not send email %s from the outbox: %s', outbox_id, error)
+        db_access.delete_from_outbox(sent)
+        db_access.mark_outbox_failed(failures)
+        db_access.commit_db(catalogue_changed=False)
+        return len(emails)
+
+    def send(self, messages):
+        """
+        Sends messages through the Mailjet Send API in one request
+
+        :param messages: A List of Mailjet messages
+        :return: A List with an error message for each message which wasn't sent, None for those which were
+        """
+        try:
+            response = self.session.post(
+                _conf.MAILJET_SECRETS['API_ENDPOINT'],
+                data=json.dumps({'Messages': messages}),
+                headers={'Content-Type': 'application/json'},
+                auth=(_conf.MAILJET_SECRETS['MJ_APIKEY_PUBLIC'], _conf.MAILJET_SECRETS['MJ_APIKEY_PRIVATE']),
+                timeout=TIMEOUT
+            )
+        except requests.RequestException as error:
+            return [str(error)] * len(messages)
+        # Mailjet reports the status of each message, so only those which failed are tried again
+        try:
+            statuses = [result['Status'] for result in response.json()['Messages']]
+        except (ValueError, KeyError, TypeError):
+            statuses = None
+        if response.status_code < 500 and response.status_code != 429 and statuses and len(statuses) == len(messages):
+            return [None if status == 'success' else 'Mailjet status: ' + str(status) for status in statuses]
+        if response.ok:
+            return [None] * len(messages)
+        return ['HTTP {}'.format(response.status_code)] * len(messages)
@@ -0,0 +1,305 @@
+import atexit
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+import _conf
+
+"""
+METRICS
+
+Collects operational metrics - request latency and response sizes by route and media type, SQLite query durations,
+RDF serialisation time and response cache lookups - and exposes them at /metrics in Prometheus' text format.
+Turned on with METRICS in _conf. /metrics is only served to requests with the METRICS_TOKEN (see is_allowed()), and to
+no one if there isn't one. Where requests come from can't be trusted, as behind a reverse proxy on the same machine
+they all come from 127.0.0.1.
+
+Each thread counts into its own dictionary, so recording a metric never waits on a lock. The dictionaries are only
+added up when the metrics are collected. When the app is run in several processes (i.e. by gunicorn or mod_wsgi), each
+process also writes its totals to a file of its own in METRICS_DIR at most every FLUSH_INTERVAL seconds, replacing the
+file in one step so it is never read half written. /metrics adds up the files of every other process with the live
+totals of the process serving it. Files are kept after a process ends so that counts don't go backwards, so METRICS_DIR
+should be emptied when the app is (re)started, as with Prometheus' own multiprocess mode.
+"""
+
+# Upper bounds of the histogram buckets. Each histogram also has a +Inf bucket.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+# Each metric's type, help text, label names and (for histograms) buckets
+METRICS = {
+    'licences_request_duration_seconds': (
+        'histogram', 'Time taken to respond to a request, up to when a streamed body starts being sent',
+        ('route', 'media_type'), LATENCY_BUCKETS),
+    'licences_response_size_bytes': (
+        'histogram', 'Size of response bodies', ('route', 'media_type'), SIZE_BUCKETS),
+    'licences_db_query_duration_seconds': (
+        'histogram', 'Time taken by SQLite queries run through db_access, including fetching their results', (),
+        QUERY_BUCKETS),
+    'licences_rdf_serialisation_seconds': (
+        'histogram', 'Time taken to write out the Turtle and N-Triples views', ('media_type',), LATENCY_BUCKETS),
+    'licences_response_cache_lookups_total': (
+        'counter', 'Lookups of views in the response cache, by whether they were found', ('result',), None)
+}
+
+# Labels used for routes by endpoint. Every other endpoint is labelled 'other'.
+ROUTES = {
+    'controller.licence_routes': 'licence',
+    'controller.action_register': 'action',
+    'controller.party_register': 'party',
+    'controller.search_results': 'search',
+    'controller.similar_licences': 'similar',
+    'controller.dump_catalogue': 'dump'
+}
+
+# Seconds between writes of this process' metrics to METRICS_DIR
+FLUSH_INTERVAL = 5
+
+_local = threading.local()
+_shards = []
+_retired = {}
+_shards_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = 0
+
+
+def is_enabled():
+    return bool(_conf.METRICS)
+
+
+def is_allowed(authorization):
+    """
+    Whether a request may read the metrics, which include how busy the app is and how long its queries take
+
+    :param authorization: The request's Authorization header, if any
+    :return: True if the request has the METRICS_TOKEN as a bearer token. Always False if there is no METRICS_TOKEN.
+    """
+    if not _conf.METRICS_TOKEN:
+        return False
+    expected = 'Bearer ' + _conf.METRICS_TOKEN
+    return hmac.compare_digest((authorization or '').encode('utf-8'), expected.encode('utf-8'))
+
+
+def observe(name, value, *labels):
+    """
+    Records a value of a metric - adding it to a counter, or counting it in a histogram's bucket
+
+    :param name: One of METRICS
+    :param value: The value. For counters, the amount to increase the count by.
+    :param labels: The values of the metric's labels, in order
+    """
+    if not is_enabled():
+        return
+    shard = _shard()
+    key = (name, labels)
+    buckets = METRICS[name][3]
+    if buckets is None:
+        shard[key] = shard.get(key, 0) + value
+    else:
+        # A count for each bucket (not cumulative) followed by the sum of the values
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(buckets) + 2)
+        values[bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+
+def _shard():
+    # The current thread's dictionary of metrics
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+def _merge(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        totals[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+
+def process_totals():
+    # Adds up the metrics of every thread in this process. Threads which have ended are folded into _retired so the
+    # list of dictionaries doesn't keep growing when a thread is started for every request.
+    global _shards
+    with _shards_lock:
+        live = []
+        for thread, shard in _shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    _merge(_retired, key, value)
+        _shards = live
+        totals = {}
+        for key, value in _retired.items():
+            _merge(totals, key, value)
+    for thread, shard in live:
+        # Copying a dictionary is atomic, so this is safe while its thread keeps counting into it
+        for key, value in shard.copy().items():
+            _merge(totals, key, value)
+    return totals
+
+
+def _process_file():
+    return os.path.join(_conf.METRICS_DIR, '{}.json'.format(os.getpid()))
+
+
+def flush(force=False):
+    # Writes this process' totals to METRICS_DIR, if it's set and they haven't been written in the last FLUSH_INTERVAL
+    # seconds. A thread which finds another already writing them leaves it to that one.
+    global _last_flush
+    if not is_enabled() or not _conf.METRICS_DIR or (not force and time.monotonic() - _last_flush < FLUSH_INTERVAL):
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = time.monotonic()
+        rows = [[name, list(labels), value] for (name, labels), value in process_totals().items()]
+        os.makedirs(_conf.METRICS_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=_conf.METRICS_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(rows, file)
+        os.replace(temp_path, _process_file())
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    """
+    Adds up the metrics of this process and, if METRICS_DIR is set, every other process
+
+    :return: A Dictionary of (metric name, label values) to its value
+    """
+    totals = process_totals()
+    if _conf.METRICS_DIR:
+        own_file = _process_file()
+        for path in glob.glob(os.path.join(_conf.METRICS_DIR, '*.json')):
+            if path == own_file:
+                continue
+            try:
+                with open(path) as file:
+                    rows = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                if name in METRICS:
+                    _merge(totals, (name, tuple(labels)), value)
+    return totals
+
+
+def write_metrics(totals):
+    """
+    Writes metrics in Prometheus' text exposition format
+
+    :param totals: As returned by collect()
+    :return: The metrics as a string
+    """
+    lines = []
+    for name, (metric_type, help_text, label_names, buckets) in METRICS.items():
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for (metric_name, labels), value in sorted(totals.items()):
+            if metric_name != name:
+                continue
+            label_pairs = list(zip(label_names, labels))
+            if buckets is None:
+                lines.append('{}{} {}'.format(name, _labels(label_pairs), _number(value)))
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(name, _labels(label_pairs + [('le', str(bound))]), cumulative))
+            lines.append('{}_sum{} {}'.format(name, _labels(label_pairs), _number(value[-1])))
+            lines.append('{}_count{} {}'.format(name, _labels(label_pairs), cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(label_pairs):
+    if not label_pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in label_pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def start_request():
+    g._metrics_start = time.perf_counter()
+
+
+def observe_response(response):
+    # Records the latency and size of the current request's response. The size of a streamed response is recorded once
+    # it has all been sent.
+    start = g.pop('_metrics_start', None)
+    if not is_enabled() or start is None:
+        return response
+    labels = (ROUTES.get(request.endpoint, 'other'), response.mimetype or 'none')
+    observe('licences_request_duration_seconds', time.perf_counter() - start, *labels)
+    if response.is_streamed:
+        response.response = _counted(response.iter_encoded(), labels)
+    else:
+        observe('licences_response_size_bytes', response.content_length or 0, *labels)
+    flush()
+    return response
+
+
+def _counted(chunks, labels):
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    observe('licences_response_size_bytes', size, *labels)
+
+
+def timed_chunks(chunks, name, *labels):
+    """
+    Times how long it takes to produce chunks of a response, not counting the time spent sending them
+
+    :param chunks: An iterable of chunks, i.e. from rdf_writer.write_turtle()
+    :param name: The histogram the time is recorded in, one of METRICS
+    :param labels: The values of the histogram's labels
+    :return: A generator of the same chunks
+    """
+    seconds = 0
+    iterator = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            seconds += time.perf_counter() - start
+        yield chunk
+    observe(name, seconds, *labels)
+
+
+def clear():
+    # Forgets this process' metrics. Forked workers start afresh rather than carrying on from their parent's counts.
+    global _local, _shards, _retired, _shards_lock, _flush_lock, _last_flush
+    _local = threading.local()
+    _shards = []
+    _retired = {}
+    _shards_lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _last_flush = 0
+
+
+os.register_at_fork(after_in_child=clear)
+atexit.register(flush, force=True)
@@ -0,0 +1,197 @@
+import base64
+import json
+import threading
+from flask import request, url_for, abort
+import _conf
+from controller import db_access
+
+"""
+PAGINATION
+
+Registers are shown a page at a time, chosen with the 'page' (starting at 1) and 'per_page' GET variables, or with a
+'cursor' taken from the 'next' link of the previous page.
+
+Pages are found by key (keyset pagination) rather than with LIMIT/OFFSET: rows are kept in the order they were added,
+so each page is simply the rows after the rowid of the last row of the previous page. A cursor is that rowid. Page
+numbers are turned into the same rowids using the last rowid of every page of the default size, which is worked out in
+one query for each table and kept until the catalogue changes. Other page sizes start from the nearest of those rowids
+and skip the few rows after it, so no more is kept for them. Either way, each page only loads its own rows, no matter
+how big the catalogue is.
+
+The HTML views of the action and party registers list rows alphabetically, so are paged through in label order instead
+(see db_access.PAGE_ORDERS). Their keys, and so their cursors, are the label and rowid of a row.
+"""
+
+# The key before the first row in each of db_access.PAGE_ORDERS
+FIRST_KEYS = {'rowid': 0, 'label': ('', 0)}
+
+_page_ends = {}
+_page_ends_version = None
+_lock = threading.Lock()
+
+
+class Page:
+    def __init__(self, per_page, number=None, cursor=None, order='rowid'):
+        """
+        :param per_page: The maximum number of items on the page
+        :param number: The page number, starting at 1. Not used if a cursor is given.
+        :param cursor: A cursor from a previous page's next link
+        :param order: The name of one of db_access.PAGE_ORDERS the rows are paged through in
+        """
+        self.per_page = per_page
+        self.number = None if cursor else number or 1
+        self.cursor = cursor
+        self.order = order
+        self.next_cursor = None
+
+    @property
+    def key(self):
+        # Identifies the page for the response cache
+        return self.per_page, self.number, self.cursor, self.order
+
+    def fetch(self, table, get_rows=None):
+        """
+        Loads the rows on this page.
+
+        :param table: The table being paged through, either POLICY, ACTION or PARTY
+        :param get_rows: A function taking the key to start after and the maximum number of rows, returning rows
+                         containing a ROWID (and a URI and LABEL for the label order) in the page's order. Defaults to
+                         db_access.get_page() for the table.
+        :return: The rows on this page
+        """
+        get_rows = get_rows or (lambda after, limit: db_access.get_page(table, after, limit, self.order))
+        if self.cursor:
+            after = decode_cursor(self.cursor, self.order)
+        elif self.number == 1:
+            after = FIRST_KEYS[self.order]
+        else:
+            after = get_key_at(table, (self.number - 1) * self.per_page, self.order)
+            if after is None:
+                abort(404)
+        # One extra row is loaded to find out whether there is a next page
+        rows = get_rows(after, self.per_page + 1)
+        if not rows and self.number and self.number > 1:
+            abort(404)
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self.next_cursor = encode_cursor(row_key(rows[-1], self.order))
+        return rows
+
+    def links(self):
+        """
+        Links to the pages around this one, for the Link header and HTML views. Must be called after fetch().
+
+        :return: A Dictionary of link relation (first, prev and next) to URL
+        """
+        links = {'first': page_url(page=1)}
+        if self.number and self.number > 1:
+            links['prev'] = page_url(page=self.number - 1)
+        if self.next_cursor:
+            # Numbered pages link to the next number so the page can be read, otherwise the next cursor is used
+            links['next'] = page_url(page=self.number + 1) if self.number else page_url(cursor=self.next_cursor)
+        return links
+
+    def link_header(self):
+        # The links in the format of an HTTP Link header
+        return ', '.join('<{url}>; rel="{rel}"'.format(url=url, rel=rel) for rel, url in self.links().items())
+
+
+def from_request(order='rowid'):
+    """
+    Reads the page being requested from the 'page', 'per_page' and 'cursor' GET variables
+
+    :param order: The name of one of db_access.PAGE_ORDERS the rows are paged through in
+    :return: A Page
+    :raises ValueError: If the variables aren't valid
+    """
+    per_page = int(request.args.get('per_page', _conf.PAGE_SIZE_DEFAULT))
+    number = int(request.args.get('page', 1))
+    cursor = request.args.get('cursor')
+    if per_page < 1 or number < 1:
+        raise ValueError('Page numbers and sizes must be positive.')
+    if cursor:
+        decode_cursor(cursor, order)
+    return Page(min(per_page, _conf.PAGE_SIZE_MAX), number, cursor, order)
+
+
+def page_url(**page_args):
+    # The URL of the current view with different page variables, keeping any others (i.e. _format and per_page)
+    args = {key: value for key, value in request.args.items() if key not in ['page', 'cursor']}
+    args.update(page_args)
+    return url_for(request.endpoint, _external=True, **args)
+
+
+def row_key(row, order):
+    # The key of a row in one of db_access.PAGE_ORDERS. Rows without a label are sorted by their URI.
+    if order == 'label':
+        return row['URI'] if row['LABEL'] is None else row['LABEL'], row['ROWID']
+    return row['ROWID']
+
+
+def encode_cursor(key):
+    # Takes a rowid or, for the label order, a (label, rowid) tuple
+    text = str(key) if isinstance(key, int) else json.dumps(list(key))
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, order='rowid'):
+    # Raises ValueError if the cursor wasn't made by encode_cursor() for a key in the given order
+    text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    if order == 'rowid':
+        return int(text)
+    key = json.loads(text)
+    if not (isinstance(key, list) and len(key) == 2 and isinstance(key[0], str) and type(key[1]) is int):
+        raise ValueError('Not a cursor: ' + cursor)
+    return tuple(key)
+
+
+def get_page_ends(table, order='rowid'):
+    """
+    Returns the key of the last row of every full page of a table when pages are the default size, which are the
+    cursors of the pages after them. Kept until the catalogue version changes.
+
+    :return: A List of keys, see db_access.get_page_ends()
+    """
+    global _page_ends_version
+    version = db_access.get_catalogue_version()['VERSION']
+    key = (table, _conf.PAGE_SIZE_DEFAULT, order)
+    with _lock:
+        if version != _page_ends_version:
+            _page_ends.clear()
+            _page_ends_version = version
+        page_ends = _page_ends.get(key)
+    if page_ends is None:
+        page_ends = db_access.get_page_ends(table, _conf.PAGE_SIZE_DEFAULT, order)
+        with _lock:
+            if version == _page_ends_version:
+                _page_ends[key] = page_ends
+    return page_ends
+
+
+def get_key_at(table, position, order='rowid'):
+    """
+    Returns the key of the row at a position in a table, found from the nearest page end before it
+
+    :param position: The position of the row, starting at 1
+    :return: A key, see db_access.get_page_ends(), or None if the table has fewer rows
+    """
+    page_ends = get_page_ends(table, order)
+    index, skip = divmod(position, _conf.PAGE_SIZE_DEFAULT)
+    if index > len(page_ends):
+        return None
+    after = page_ends[index - 1] if index else FIRST_KEYS[order]
+    return db_access.get_key_after(table, after, skip, order) if skip else after
+
+
+def clear():
+    # Discards the page ends of every table, i.e. after a test wipes the database
+    global _page_ends_version
+    with _lock:
+        _page_ends.clear()
+        _page_ends_version = None
+
+
+def get_page_number(table, uri, order='rowid'):
+    # Returns the number of the page a row is on when pages are the default size, or None if there is no such row
+    position = db_access.get_position(table, uri, order)
+    return (position - 1) // _conf.PAGE_SIZE_DEFAULT + 1 if position else None
@@ -0,0 +1,242 @@
+import re
+from controller import db_access
+
+"""
+POLICY_INDEX
+
+An in-memory index of the catalogue used by functions.search_policies().
+Each Rule of a Policy is broken down into (rule type URI, action URI) pairs, of which there are only as many as there
+are Rule types times Actions. The index is a matrix of which Policies use which pairs, with a row for each Policy and a
+column for each pair, stored as Python integers used as bitsets: each row has a bit set for each pair the Policy uses,
+and each column has a bit set for each Policy using the pair. Searching is then done with a few AND, OR and bit count
+operations over whole columns rather than by comparing Policies one at a time, and doesn't have to reload every Policy
+and Rule from the database.
+
+The number of differences between each Policy and the desired Rules (the number of the Policy's pairs which aren't
+desired) is counted for every Policy at once by adding up the undesired columns in a bit-sliced counter: a list of
+bitsets where the nth holds the nth bit of every Policy's count. Policies are then picked out by their number of
+differences, fewest first.
+
+The index is built on first use and rebuilt whenever the catalogue version changes (see db_access.commit_db()), so
+changes committed by other processes are picked up as well. When a single Policy is created, add_policy() extends the
+index instead of rebuilding it. invalidate() discards it straight away.
+"""
+
+# Bytes of a bitset holding at least one set bit
+_NONZERO_BYTE = re.compile(b'[^\x00]')
+# The positions of the set bits in each byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+_index = None
+
+
+class PolicyIndex:
+    def __init__(self, version, policy_uris, policy_actions):
+        """
+        :param version: The catalogue version the index is built from
+        :param policy_uris: A List of all Policy URIs, in the order search results should be ranked by when tied
+        :param policy_actions: Rows containing POLICY_URI, TYPE_URI and ACTION_URI, see
+                               db_access.get_all_policy_actions()
+        """
+        self.version = version
+        self.policy_uris = list(policy_uris)
+        self.positions = {policy_uri: position for position, policy_uri in enumerate(self.policy_uris)}
+        # The column of each pair, and the rows and columns of the matrix
+        self.columns = {}
+        self.rows = [0] * len(self.policy_uris)
+        self.column_bits = []
+        # A Policy can use the same pair in more than one Rule. Each pair has a bitset of the Policies using it at least
+        # twice, then one of those using it at least three times and so on, as each use is a difference.
+        self.repeats = {}
+        for row in policy_actions:
+            self.add_pair(self.positions[row['POLICY_URI']], (row['TYPE_URI'], row['ACTION_URI']))
+
+    def add_pair(self, position, pair):
+        # Records that the Policy at a position uses a (rule type, action) pair
+        column = self.columns.get(pair)
+        if column is None:
+            column = self.columns[pair] = len(self.column_bits)
+            self.column_bits.append(0)
+        policy_bit = 1 << position
+        if not self.rows[position] >> column & 1:
+            self.rows[position] |= 1 << column
+            self.column_bits[column] |= policy_bit
+            return
+        repeats = self.repeats.setdefault(column, [])
+        for i, repeat_bits in enumerate(repeats):
+            if not repeat_bits & policy_bit:
+                repeats[i] |= policy_bit
+                return
+        repeats.append(policy_bit)
+
+    def with_policy(self, version, policy_uri, pairs):
+        """
+        Returns a copy of the index with a new Policy added, leaving this one as it is for any searches using it
+
+        :param version: The catalogue version including the new Policy
+        :param policy_uri: The URI of the new Policy, which is ranked after every existing Policy when tied
+        :param pairs: A List of the (rule type URI, action URI) pairs of the Policy's Rules
+        :return: A PolicyIndex
+        """
+        index = PolicyIndex.__new__(PolicyIndex)
+        index.version = version
+        index.policy_uris = self.policy_uris + [policy_uri]
+        index.positions = dict(self.positions)
+        index.positions[policy_uri] = len(self.policy_uris)
+        index.columns = dict(self.columns)
+        index.rows = self.rows + [0]
+        index.column_bits = list(self.column_bits)
+        index.repeats = {column: list(repeats) for column, repeats in self.repeats.items()}
+        for pair in pairs:
+            index.add_pair(len(self.policy_uris), pair)
+        return index
+
+    def desired(self, desired_rules):
+        """
+        Works out which Policies include all of the desired Rules. A desired Rule is included in a Policy if the Policy
+        has a Rule of the same type with at least one of the desired Actions.
+
+        :param desired_rules: A List of Rules. Each Rule is a Dictionary containing a TYPE_URI and a List of ACTIONS,
+                              each Action being a Dictionary containing a URI
+        :return: A bitset of the positions of the Policies, and a Set of the columns of the desired pairs
+        """
+        candidates = (1 << len(self.policy_uris)) - 1
+        desired_columns = set()
+        for desired_rule in desired_rules:
+            rule_columns = {self.columns.get((desired_rule['TYPE_URI'], action['URI']))
+                            for action in desired_rule['ACTIONS']}
+            rule_columns.discard(None)
+            desired_columns |= rule_columns
+            rule_bits = 0
+            for column in rule_columns:
+                rule_bits |= self.column_bits[column]
+            candidates &= rule_bits
+            if not candidates:
+                break
+        return candidates, desired_columns
+
+    def differences(self, policy_uri, desired_columns=()):
+        # The number of a Policy's (rule type, action) pairs which aren't among the desired columns, counting repeats
+        position = self.positions.get(policy_uri)
+        if position is None:
+            return 0
+        desired_bits = sum(1 << column for column in desired_columns)
+        policy_bit = 1 << position
+        return (self.rows[position] & ~desired_bits).bit_count() + \
+            sum(1 for column, repeats in self.repeats.items() if column not in desired_columns
+                for repeat_bits in repeats if repeat_bits & policy_bit)
+
+    def includes(self, policy_uris, desired_rules):
+        """
+        Picks out the Policies which include all of the desired Rules, see match()
+
+        :param policy_uris: A List of Policy URIs
+        :return: A List of those Policy URIs which include the Rules, in the same order, and a Set of the columns of the
+                 desired pairs for counting their differences with differences()
+        """
+        candidates, desired_columns = self.desired(desired_rules)
+        return [policy_uri for policy_uri in policy_uris if policy_uri in self.positions and
+                candidates >> self.positions[policy_uri] & 1], desired_columns
+
+    def match(self, desired_rules, limit=None, offset=0):
+        """
+        Finds the Policies which include all of the desired Rules, fewest differences first. Only the Policies in the
+        requested range are picked out, so asking for the first few of many matches doesn't cost much more than asking
+        for all of them.
+
+        :param desired_rules: A List of Rules. Each Rule is a Dictionary containing a TYPE_URI and a List of ACTIONS,
+                              each Action being a Dictionary containing a URI
+        :param limit: The maximum number of Policies to return, or None to return them all
+        :param offset: The number of best matching Policies to skip
+        :return: A List of (Policy URI, differences) tuples, sorted by the number of differences then the order of the
+                 Policies. The differences are the number of the Policy's (rule type, action) pairs which aren't among
+                 the desired Rules. Also returns the total number of matching Policies.
+        """
+        candidates, desired_columns = self.desired(desired_rules)
+        total = candidates.bit_count()
+        end = total if limit is None else min(offset + limit, total)
+        if offset >= end:
+            return [], total
+
+        # Count each candidate's differences in a bit-sliced counter
+        counts = []
+        for column, column_bits in enumerate(self.column_bits):
+            if column not in desired_columns:
+                add_to_counter(counts, column_bits & candidates)
+                # Each repeat of an undesired pair is another difference
+                for repeat_bits in self.repeats.get(column, ()):
+                    add_to_counter(counts, repeat_bits & candidates)
+
+        # Go through the candidates by their number of differences, only finding the positions of those in range
+        results = []
+        position = 0
+        differences = 0
+        while position < end:
+            # The candidates whose count has the same bits as the number of differences
+            matched = candidates
+            for i, count_bits in enumerate(counts):
+                matched &= count_bits if differences >> i & 1 else ~count_bits
+            count = matched.bit_count()
+            if position + count > offset:
+                positions = bit_positions(matched, end - position)[max(offset - position, 0):]
+                results.extend((self.policy_uris[policy], differences) for policy in positions)
+            candidates &= ~matched
+            position += count
+            differences += 1
+        return results, total
+
+
+def add_to_counter(counts, bits):
+    # Adds one to the counts of the Policies in a bitset, in a bit-sliced counter as used by PolicyIndex.match()
+    carry = bits
+    for i, count_bits in enumerate(counts):
+        if not carry:
+            return
+        counts[i] = count_bits ^ carry
+        carry &= count_bits
+    if carry:
+        counts.append(carry)
+
+
+def bit_positions(bits, limit=None):
+    # The positions of the set bits of a bitset, in ascending order. Stops after the first limit of them if given.
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    positions = []
+    for match in _NONZERO_BYTE.finditer(data):
+        positions.extend(match.start() * 8 + bit for bit in _BYTE_BITS[data[match.start()]])
+        if limit is not None and len(positions) >= limit:
+            return positions[:limit]
+    return positions
+
+
+def get_index():
+    # Returns the search index, building it from the database if it doesn't exist yet or the catalogue has changed
+    global _index
+    version = db_access.get_catalogue_version()['VERSION']
+    if _index is None or _index.version != version:
+        _index = PolicyIndex(version, db_access.get_all_policies(), db_access.get_all_policy_actions())
+    return _index
+
+
+def add_policy(policy_uri, pairs):
+    """
+    Adds a Policy to the index straight after it has been created, instead of rebuilding the whole index. This is only
+    done if the index was up to date beforehand, i.e. the catalogue version has only gone up by one since, for the
+    commit creating the Policy. Otherwise the index is discarded and rebuilt on next use.
+
+    :param policy_uri: The URI of the new Policy
+    :param pairs: A List of the (rule type URI, action URI) pairs of the Policy's Rules
+    """
+    global _index
+    index = _index
+    version = db_access.get_catalogue_version()['VERSION']
+    if index is not None and index.version == version - 1 and policy_uri not in index.positions:
+        _index = index.with_policy(version, policy_uri, pairs)
+    else:
+        _index = None
+
+
+def invalidate():
+    # Discards the search index so that it is rebuilt on next use. Call after any changes to Policies or their Rules.
+    global _index
+    _index = None
@@ -0,0 +1,194 @@
+import heapq
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from flask import g, has_request_context, request
+import _conf
+from controller import metrics
+
+"""
+QUERY_LOG
+
+Optional instrumentation of the queries run through db_access.query_db(), update_db() and update_db_many(), turned on
+with SQL_INSTRUMENTATION in _conf. It is meant for development and costs a little time per query, so is off by default.
+
+For each request, the number of queries, the total time spent on them and the slowest SLOWEST_KEPT statements are
+recorded. They are sent back in a Server-Timing header (so they show up in the browser's developer tools) and the last
+RECENT_REQUESTS requests can be viewed as JSON at /_debug/queries. Queries run while a streamed response is being sent
+happen after its headers are sent, so are only included in the JSON.
+
+Any statement which takes longer than SLOW_QUERY_MS milliseconds, in a request or not, is written to the slow query log
+(SLOW_QUERY_LOGFILE in _conf) along with its EXPLAIN QUERY PLAN.
+
+Queries are also timed for /metrics (see metrics.py) whether or not SQL_INSTRUMENTATION is on.
+"""
+
+# Number of the slowest statements kept for each request
+SLOWEST_KEPT = 5
+# Number of requests kept for viewing at /_debug/queries
+RECENT_REQUESTS = 50
+
+logger = logging.getLogger('slow_queries')
+
+_recent = deque(maxlen=RECENT_REQUESTS)
+_recent_lock = threading.Lock()
+
+
+class _NotTimed:
+    # Stands in for a QueryTimer when instrumentation is off, so that db_access doesn't need to check
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOT_TIMED = _NotTimed()
+
+
+class QueryTimer:
+    def __init__(self, conn, query_str, args):
+        self.conn = conn
+        self.query_str = query_str
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.conn, self.query_str, self.args, time.perf_counter() - self.start)
+        return False
+
+
+class RequestQueries:
+    # The queries run during one request
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.seconds = 0
+        self._slowest = []
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        # A min-heap of the slowest statements, so the quickest of them is the one replaced
+        entry = (seconds, self.count, statement)
+        if len(self._slowest) < SLOWEST_KEPT:
+            heapq.heappush(self._slowest, entry)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def summary(self):
+        return {
+            'METHOD': self.method,
+            'PATH': self.path,
+            'QUERIES': self.count,
+            'TOTAL_MS': round(self.seconds * 1000, 3),
+            'SLOWEST': [{'STATEMENT': statement, 'MS': round(seconds * 1000, 3)}
+                        for seconds, count, statement in sorted(self._slowest, reverse=True)]
+        }
+
+    def server_timing(self):
+        timing = 'db;desc="{count} queries";dur={ms:.3f}'.format(count=self.count, ms=self.seconds * 1000)
+        if self._slowest:
+            timing += ', db-slowest;desc="Slowest query";dur={ms:.3f}'.format(ms=max(self._slowest)[0] * 1000)
+        return timing
+
+
+def is_enabled():
+    return bool(_conf.SQL_INSTRUMENTATION)
+
+
+def timed(conn, query_str, args=()):
+    """
+    Times a query if instrumentation is on, for use in a with statement around running the query and fetching its
+    results
+
+    :param conn: The connection the query is run on, used for explaining slow queries
+    :param query_str: The query as a string
+    :param args: The query's variables
+    :return: A context manager
+    """
+    if not is_enabled() and not metrics.is_enabled():
+        return _NOT_TIMED
+    return QueryTimer(conn, query_str, args)
+
+
+def normalise(query_str):
+    # Collapses the whitespace in a query so that it fits on one line
+    return re.sub(r'\s+', ' ', query_str).strip()
+
+
+def record(conn, query_str, args, seconds):
+    # Adds a query to the current request's queries, and writes it to the slow query log if it took too long
+    metrics.observe('licences_db_query_duration_seconds', seconds)
+    if not is_enabled():
+        return
+    statement = normalise(query_str)
+    if has_request_context():
+        queries = getattr(g, '_queries', None)
+        if queries is None:
+            queries = g._queries = RequestQueries(request.method, request.full_path.rstrip('?'))
+        queries.add(statement, seconds)
+    if seconds * 1000 >= _conf.SLOW_QUERY_MS:
+        logger.warning('%.3fms%s: %s\n%s', seconds * 1000,
+                       ' in ' + request.full_path.rstrip('?') if has_request_context() else '', statement,
+                       explain(conn, query_str, args))
+
+
+def explain(conn, query_str, args=()):
+    """
+    Gets SQLite's plan for a query, indented the same way as the sqlite3 command line shell does
+
+    :return: The plan as a string, one step per line
+    """
+    try:
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + query_str, args).fetchall()
+    except sqlite3.Error as error:
+        return 'Query plan not available: ' + str(error)
+    depths = {0: -1}
+    lines = []
+    for row_id, parent, unused, detail in rows:
+        depths[row_id] = depths.get(parent, -1) + 1
+        lines.append('  ' * depths[row_id] + detail)
+    return '\n'.join(lines)
+
+
+def add_server_timing(response):
+    # Adds a Server-Timing header with the current request's queries to its response
+    queries = getattr(g, '_queries', None)
+    if queries is not None:
+        response.headers.add('Server-Timing', queries.server_timing())
+    return response
+
+
+def finish_request():
+    # Keeps the summary of the current request's queries for viewing at /_debug/queries
+    queries = g.pop('_queries', None)
+    if queries is not None:
+        with _recent_lock:
+            _recent.append(queries.summary())
+
+
+def recent_requests():
+    # The summaries of the queries of the most recent requests, newest first
+    with _recent_lock:
+        return list(reversed(_recent))
+
+
+def clear():
+    with _recent_lock:
+        _recent.clear()
+
+
+def open_log(path):
+    # Writes the slow query log to a file
+    handler = logging.FileHandler(path, delay=True)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s', '%Y-%m-%d %H:%M:%S'))
+    logger.addHandler(handler)
@@ -0,0 +1,136 @@
+import logging
+from rdflib import Graph, BNode
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from controller import db_access, functions, vocabulary
+from controller.rdf_writer import DCTERMS, ODRL, POLICY_ATTRIBUTES, RDF, RDFS
+
+"""
+RDF_READER
+
+Imports licences from RDF - Turtle, N-Triples or JSON-LD describing ODRL Policies the same way as the views of a
+licence (see rdf_writer.py) - i.e. to load licences from another register or from a dump of this catalogue.
+
+The statements about a Policy and its Rules can be anywhere in the file, so triples are first staged in a temporary
+table a batch at a time. Policies are then read back from the staging table and created with
+functions.create_policies_bulk() a batch at a time, so only one batch is held in memory at once. N-Triples are parsed
+line by line. Turtle and JSON-LD can't be parsed that way, so are parsed into an rdflib Graph first.
+
+Any Parties described in the same file (i.e. by the party register) are created with their labels and comments.
+"""
+
+# Number of triples staged, and Policies created, at a time
+BATCH_SIZE = 1000
+
+# Formats which can be read, as rdflib format names
+FORMATS = ['turtle', 'nt', 'json-ld']
+
+# Policy attributes by the predicate used for them
+ATTRIBUTE_PREDICATES = {predicate: attribute for attribute, predicate, is_uri, lang in POLICY_ATTRIBUTES}
+
+
+class StagingSink:
+    # Receives triples from a parser and stages them in batches, see db_access.add_staged_triples()
+    def __init__(self):
+        self.triples = []
+
+    def triple(self, subject, predicate, obj):
+        self.triples.append((term(subject), str(predicate), term(obj)))
+        if len(self.triples) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        db_access.add_staged_triples(self.triples)
+        self.triples = []
+
+
+def term(node):
+    # Blank nodes are staged as '_:' followed by their ID, so that they can't be mistaken for URIs
+    return '_:' + str(node) if isinstance(node, BNode) else str(node)
+
+
+def import_policies(source, rdf_format):
+    """
+    Imports every Policy described in a file of RDF
+
+    :param source: The file, opened in binary mode
+    :param rdf_format: One of FORMATS
+    :return: A Dictionary of Policy URI to an error message for each Policy which was not created
+    """
+    if rdf_format not in FORMATS:
+        raise ValueError('RDF format ' + rdf_format + ' is not supported.')
+    db_access.create_staged_triples()
+    # The created dates written by this catalogue aren't valid xsd:dates, which rdflib warns about for every Policy
+    rdflib_logger = logging.getLogger('rdflib.term')
+    rdflib_log_level = rdflib_logger.level
+    rdflib_logger.setLevel(logging.ERROR)
+    try:
+        sink = StagingSink()
+        if rdf_format == 'nt':
+            W3CNTriplesParser(sink).parse(source)
+        else:
+            for triple in Graph().parse(source, format=rdf_format):
+                sink.triple(*triple)
+        sink.flush()
+        errors = {}
+        rule_types = vocabulary.get_vocabulary().rule_type_labels.keys()
+        policy_uris = db_access.get_staged_subjects(RDF + 'type', ODRL + 'Policy')
+        for start in range(0, len(policy_uris), BATCH_SIZE):
+            policies = read_policies(policy_uris[start:start + BATCH_SIZE], rule_types)
+            for policy in policies:
+                if policy['URI'].startswith('_:'):
+                    errors[policy['URI']] = 'Cannot create policy - Policy has no URI'
+            policies = [policy for policy in policies if policy['URI'] not in errors]
+            errors.update(functions.create_policies_bulk(policies))
+    finally:
+        rdflib_logger.setLevel(rdflib_log_level)
+        db_access.drop_staged_triples()
+    return errors
+
+
+def read_policies(policy_uris, rule_types):
+    """
+    Reads staged Policies into the form taken by functions.create_policies_bulk()
+
+    :param policy_uris: A List of the URIs of the Policies
+    :param rule_types: A Set of the URIs of the permitted Rule types, which are also the predicates linking Policies to
+                       their Rules
+    :return: A List of Policies
+    """
+    policy_triples = db_access.get_staged_triples(policy_uris)
+    rule_nodes = [obj for triples in policy_triples.values() for predicate, obj in triples
+                  if predicate in rule_types]
+    rule_triples = db_access.get_staged_triples(rule_nodes)
+    party_uris = [obj for triples in rule_triples.values() for predicate, obj in triples
+                  if predicate in [ODRL + 'assignor', ODRL + 'assignee']]
+    parties = {}
+    for party_uri, triples in db_access.get_staged_triples(party_uris).items():
+        party = {'URI': party_uri, 'LABEL': None, 'COMMENT': None}
+        for predicate, obj in triples:
+            if predicate == RDFS + 'label':
+                party['LABEL'] = obj
+            elif predicate == RDFS + 'comment':
+                party['COMMENT'] = obj
+        parties[party_uri] = party
+
+    policies = []
+    for policy_uri, triples in policy_triples.items():
+        policy = {'URI': policy_uri, 'ATTRIBUTES': {}, 'RULES': []}
+        for predicate, obj in triples:
+            if predicate == RDF + 'type' and obj != ODRL + 'Policy':
+                policy['ATTRIBUTES']['TYPE'] = obj
+            elif predicate == DCTERMS + 'created':
+                policy['CREATED'] = obj
+            elif predicate in ATTRIBUTE_PREDICATES:
+                policy['ATTRIBUTES'][ATTRIBUTE_PREDICATES[predicate]] = obj
+            elif predicate in rule_types:
+                rule = {'TYPE_URI': predicate, 'ACTIONS': [], 'ASSIGNORS': [], 'ASSIGNEES': []}
+                for rule_predicate, rule_obj in rule_triples[obj]:
+                    if rule_predicate == ODRL + 'action':
+                        rule['ACTIONS'].append(rule_obj)
+                    elif rule_predicate == ODRL + 'assignor':
+                        rule['ASSIGNORS'].append(parties[rule_obj])
+                    elif rule_predicate == ODRL + 'assignee':
+                        rule['ASSIGNEES'].append(parties[rule_obj])
+                policy['RULES'].append(rule)
+        policies.append(policy)
+    return policies
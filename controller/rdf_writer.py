@@ -0,0 +1,262 @@
+import hashlib
+from controller import functions
+
+"""
+RDF_WRITER
+
+Writes the RDF views of licences and registers as Turtle or N-Triples directly from the dictionaries returned by
+db_access.py, without building an rdflib Graph first. The output describes exactly the same triples as the graphs
+built in functions.py (see tests/test_rdf_writer.py) but is produced as a generator, so it can be streamed as a Flask
+Response.
+
+The writers work on statements - (subject, predicate, object) tuples where each term is already written out as an
+N-Triples term, i.e. '<http://example.com>', '"Label"@en' or '_:b1'.
+"""
+
+ADMS = 'http://www.w3.org/ns/adms#'
+CREATIVE_COMMONS = 'http://creativecommons.org/ns#'
+DCTERMS = 'http://purl.org/dc/terms/'
+FOAF = 'http://xmlns.com/foaf/0.1/'
+ODRL = 'http://www.w3.org/ns/odrl/2/'
+OWL = 'http://www.w3.org/2002/07/owl#'
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDFS = 'http://www.w3.org/2000/01/rdf-schema#'
+REG = 'http://purl.org/linked-data/registry#'
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+# Prefixes used when writing Turtle
+PREFIXES = {
+    'adms': ADMS,
+    'cc': CREATIVE_COMMONS,
+    'dct': DCTERMS,
+    'foaf': FOAF,
+    'odrl': ODRL,
+    'owl': OWL,
+    'rdf': RDF,
+    'rdfs': RDFS,
+    'reg': REG,
+    'skos': SKOS,
+    'xsd': XSD
+}
+
+# Policy attributes which are written as a (predicate, whether the value is a URI, language of the value) triple
+POLICY_ATTRIBUTES = [
+    ('LABEL', RDFS + 'label', False, 'en'),
+    ('COMMENT', RDFS + 'comment', False, 'en'),
+    ('CREATOR', DCTERMS + 'creator', True, None),
+    ('HAS_VERSION', DCTERMS + 'hasVersion', False, None),
+    ('JURISDICTION', CREATIVE_COMMONS + 'jurisdiction', True, None),
+    ('LANGUAGE', DCTERMS + 'language', True, None),
+    ('LEGAL_CODE', CREATIVE_COMMONS + 'legalcode', True, None),
+    ('LOGO', FOAF + 'logo', True, None),
+    ('SAME_AS', OWL + 'sameAs', True, None),
+    ('SEE_ALSO', RDFS + 'seeAlso', True, None),
+    ('STATUS', ADMS + 'status', True, None)
+]
+
+# Characters which must be escaped in IRIs and literals
+IRI_ESCAPES = {c: '\\u{:04X}'.format(ord(c)) for c in '<>"{}|^`\\ '}
+IRI_ESCAPES.update({chr(c): '\\u{:04X}'.format(c) for c in range(0x20)})
+LITERAL_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r'}
+
+# Size in characters of the chunks of output yielded by the writers
+CHUNK_SIZE = 64 * 1024
+
+
+def iri(uri):
+    # Writes a URI as an N-Triples IRI
+    return '<' + ''.join(IRI_ESCAPES.get(c, c) for c in uri) + '>'
+
+
+def literal(value, lang=None, datatype=None):
+    # Writes a value as an N-Triples literal, optionally with a language tag or a datatype URI
+    term = '"' + ''.join(LITERAL_ESCAPES.get(c, c) for c in str(value)) + '"'
+    if lang:
+        return term + '@' + lang
+    if datatype:
+        return term + '^^' + iri(datatype)
+    return term
+
+
+def rule_node(policy_uri, rule_uri):
+    # Rules are written as blank nodes. The label is unique to the rule within the policy so that policies written in
+    # the same document never share rule nodes.
+    return '_:r' + hashlib.md5((policy_uri + ' ' + rule_uri).encode('utf-8')).hexdigest()
+
+
+def policy_statements(policy, rules):
+    """
+    Statements describing a policy and its rules, the same as functions.get_policy_rdf()
+
+    :param policy: A Policy, as returned by db_access.get_policy()
+    :param rules: The Rules included in the policy, as returned by db_access.get_rule()
+    """
+    policy_node = iri(policy['URI'])
+    yield policy_node, iri(RDF + 'type'), iri(ODRL + 'Policy')
+    if policy['TYPE']:
+        yield policy_node, iri(RDF + 'type'), iri(policy['TYPE'])
+    if policy['CREATED']:
+        yield policy_node, iri(DCTERMS + 'created'), literal(policy['CREATED'], datatype=XSD + 'date')
+    for attribute, predicate, is_uri, lang in POLICY_ATTRIBUTES:
+        if policy[attribute]:
+            value = iri(policy[attribute]) if is_uri else literal(policy[attribute], lang=lang)
+            yield policy_node, iri(predicate), value
+    for rule in rules:
+        node = rule_node(policy['URI'], rule['URI'])
+        yield policy_node, iri(ODRL + rule['TYPE_LABEL'].lower()), node
+        yield node, iri(RDF + 'type'), iri(ODRL + rule['TYPE_LABEL'])
+        for action in rule['ACTIONS']:
+            yield node, iri(ODRL + 'action'), iri(action['URI'])
+        for assignor in rule['ASSIGNORS']:
+            yield node, iri(ODRL + 'assignor'), iri(assignor)
+        for assignee in rule['ASSIGNEES']:
+            yield node, iri(ODRL + 'assignee'), iri(assignee)
+
+
+def register_statements(register_uri, label, comment, contained_item_class):
+    # Statements describing a register itself
+    register_node = iri(register_uri)
+    yield register_node, iri(RDF + 'type'), iri(REG + 'Register')
+    yield register_node, iri(RDFS + 'label'), literal(label)
+    yield register_node, iri(RDFS + 'comment'), literal(comment)
+    yield register_node, iri(REG + 'containedItemClass'), iri(contained_item_class)
+
+
+def policies_statements(policies, register_uri):
+    """
+    Statements describing the licence register, the same as functions.get_policies_rdf()
+
+    :param policies: A List of Policies, as returned by db_access.get_policy()
+    :param register_uri: The URI of the licence register
+    """
+    yield from register_statements(register_uri, 'Licence Register', 'This is a register (controlled list) of '
+                                   'machine-readable Licenses which are a particular type of Policy.', ODRL + 'Policy')
+    for policy in policies:
+        policy_node = iri(policy['URI'])
+        yield policy_node, iri(RDF + 'type'), iri(ODRL + 'Policy')
+        if policy['TYPE']:
+            yield policy_node, iri(RDF + 'type'), iri(policy['TYPE'])
+        if policy['LABEL']:
+            yield policy_node, iri(RDFS + 'label'), literal(policy['LABEL'], lang='en')
+        if policy['COMMENT']:
+            yield policy_node, iri(RDFS + 'comment'), literal(policy['COMMENT'], lang='en')
+        yield policy_node, iri(REG + 'register'), iri(register_uri)
+
+
+def actions_statements(actions, register_uri):
+    """
+    Statements describing the action register, the same as functions.get_actions_rdf()
+
+    :param actions: A List of Actions, as returned by db_access.get_all_actions()
+    :param register_uri: The URI of the action register
+    """
+    yield from register_statements(register_uri, 'Action Register', 'This is a register (controlled list) of '
+                                   'machine-readable Actions.', ODRL + 'Action')
+    for action in actions:
+        yield from action_statements(action)
+        yield iri(action['URI']), iri(REG + 'register'), iri(register_uri)
+
+
+def action_statements(action):
+    # Statements describing an Action, as returned by db_access.get_action()
+    action_node = iri(action['URI'])
+    yield action_node, iri(RDF + 'type'), iri(ODRL + 'Action')
+    yield action_node, iri(RDFS + 'label'), literal(action['LABEL'], lang='en')
+    yield action_node, iri(SKOS + 'definition'), literal(action['DEFINITION'], lang='en')
+
+
+def parties_statements(parties, register_uri):
+    """
+    Statements describing the party register, the same as functions.get_parties_rdf()
+
+    :param parties: A List of Parties, as returned by db_access.get_all_parties()
+    :param register_uri: The URI of the party register
+    """
+    yield from register_statements(register_uri, 'Party Register', functions.party_register_comment,
+                                   ODRL + 'Party')
+    for party in parties:
+        yield from party_statements(party)
+        yield iri(party['URI']), iri(REG + 'register'), iri(register_uri)
+
+
+def party_statements(party):
+    # Statements describing a Party, as returned by db_access.get_party()
+    party_node = iri(party['URI'])
+    yield party_node, iri(RDF + 'type'), iri(ODRL + 'Party')
+    if party['LABEL']:
+        yield party_node, iri(RDFS + 'label'), literal(party['LABEL'], lang='en')
+    if party['COMMENT']:
+        yield party_node, iri(RDFS + 'comment'), literal(party['COMMENT'], lang='en')
+
+
+def dump_statements(policies):
+    """
+    Statements describing policies in full for the catalogue dump (see dump.py) - the same as policy_statements() for
+    each policy, followed by statements describing the Actions and Parties of its Rules.
+
+    :param policies: Policies as returned by db_access.iter_policies_full() with expand_parties
+    """
+    for policy in policies:
+        rules = [rule.replace(ASSIGNORS=tuple(party['URI'] for party in rule['ASSIGNORS']),
+                              ASSIGNEES=tuple(party['URI'] for party in rule['ASSIGNEES'])) for rule in policy['RULES']]
+        yield from policy_statements(policy, rules)
+        for rule in policy['RULES']:
+            for action in rule['ACTIONS']:
+                yield from action_statements(action)
+            for party in rule['ASSIGNORS'] + rule['ASSIGNEES']:
+                yield from party_statements(party)
+
+
+def write_ntriples(statements):
+    # Writes statements as N-Triples, yielding chunks of text
+    return chunked('{} {} {} .\n'.format(*statement) for statement in statements)
+
+
+def write_turtle(statements):
+    # Writes statements as Turtle, yielding chunks of text. Consecutive statements about the same subject are grouped.
+    return chunked(_turtle_lines(statements))
+
+
+def _turtle_lines(statements):
+    for prefix, namespace in PREFIXES.items():
+        yield '@prefix {prefix}: {namespace} .\n'.format(prefix=prefix, namespace=iri(namespace))
+    yield '\n'
+    subject = None
+    for statement_subject, predicate, obj in statements:
+        if statement_subject == subject:
+            yield ' ;\n    {} {}'.format(_turtle_predicate(predicate), obj)
+        else:
+            if subject is not None:
+                yield ' .\n\n'
+            subject = statement_subject
+            yield '{} {} {}'.format(subject, _turtle_predicate(predicate), obj)
+    if subject is not None:
+        yield ' .\n'
+
+
+def _turtle_predicate(predicate):
+    # Shortens a predicate to a prefixed name where possible
+    if predicate == iri(RDF + 'type'):
+        return 'a'
+    uri = predicate[1:-1]
+    for prefix, namespace in PREFIXES.items():
+        local_name = uri[len(namespace):]
+        if uri.startswith(namespace) and local_name.isalnum():
+            return prefix + ':' + local_name
+    return predicate
+
+
+def chunked(pieces):
+    # Joins small pieces of text into chunks of around CHUNK_SIZE characters
+    chunk = []
+    size = 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+import _conf
+
+"""
+RESPONSE_CACHE
+
+An in-memory cache for the JSON, JSON-LD and Turtle views of licences and registers, which only change when changes to
+the catalogue are committed. Entries are stored against the catalogue version (see db_access.get_catalogue_version())
+and the whole cache is emptied as soon as a newer version is seen.
+
+The cache is limited to a memory budget (RESPONSE_CACHE_MAX_BYTES in _conf). When it is full, the least recently used
+entries are evicted first.
+"""
+
+# Rough overhead in bytes of each entry on top of the size of its body, used for keeping within the memory budget
+ENTRY_OVERHEAD = 512
+
+
+class ResponseCache:
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: The memory budget of the cache. Nothing is cached if this is 0.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """
+        Looks up an entry in the cache
+
+        :param key: A hashable key, i.e. a tuple of the route, URI and media type
+        :param version: The current catalogue version
+        :return: The value stored with put(), or None if there is no entry for that key and version
+        """
+        with self._lock:
+            if not self._is_current(version):
+                return None
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value[0] if value is not None else None
+
+    def put(self, key, version, value, size):
+        """
+        Stores an entry in the cache, evicting the least recently used entries if the cache is over its memory budget.
+
+        :param key: A hashable key, i.e. a tuple of the route, URI and media type
+        :param version: The catalogue version the value was built from
+        :param value: The value to store
+        :param size: The size of the value in bytes
+        """
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._is_current(version):
+                return
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.size -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._clear(None)
+
+    def _is_current(self, version):
+        # Versions only ever increase, so a newer version empties the cache and an older one is ignored
+        if self.version is None or version > self.version:
+            self._clear(version)
+        return version == self.version
+
+    def _clear(self, version):
+        self._entries.clear()
+        self.size = 0
+        self.version = version
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = ResponseCache(_conf.RESPONSE_CACHE_MAX_BYTES)
@@ -1,51 +1,134 @@
-from flask import Blueprint, render_template, request, redirect, url_for, abort, jsonify, Response, flash, session
-import requests
-from controller import db_access, functions
+from flask import Blueprint, render_template, request, redirect, url_for, abort, jsonify, Response, flash, session, \
+    stream_with_context, current_app, g
+from controller import db_access, dump, external_parties, functions, json_ld, mail_queue, metrics, pagination, \
+    query_log, rdf_writer, response_cache, vocabulary
 import _conf as conf
 import json
+import hashlib
+from datetime import datetime, timezone
 from uuid import uuid4
 from flask_login import current_user, login_user, logout_user
 from model.user import User
 
 from controller.functions import get_policy_json
 
-# JSON vocabularies that are added to all JSON views served by this application.
-JSON_CONTEXT_ACTIONS = {
-    '@vocab': 'http://www.w3.org/ns/odrl/2/',
-    'label': 'http://www.w3.org/2000/01/rdf-schema#label',
-    'definition': 'http://www.w3.org/2004/02/skos/core#definition',
-    'containedItemClass': 'http://purl.org/linked-data/registry#containedItemClass',
-    'comment': 'http://www.w3.org/2000/01/rdf-schema#comment',
-    'register': 'http://purl.org/linked-data/registry#register'
-}
-JSON_CONTEXT_POLICIES = {
-    '@vocab': 'http://www.w3.org/ns/odrl/2/',
-    'label': 'http://www.w3.org/2000/01/rdf-schema#label',
-    'created': 'http://purl.org/dc/terms/created',
-    'comment': 'http://www.w3.org/2000/01/rdf-schema#comment',
-    'sameAs': 'http://www.w3.org/2002/07/owl#sameAs',
-    'register': 'http://purl.org/linked-data/registry#register',
-    'containedItemClass': 'http://purl.org/linked-data/registry#containedItemClass',
-    'hasVersion': 'http://purl.org/dc/terms/hasVersion',
-    'language': 'http://purl.org/dc/terms/language',
-    'legalCode': 'http://creativecommons.org/ns#legalcode',
-    'jurisdiction': 'http://creativecommons.org/ns#jurisdiction',
-    'seeAlso': 'http://www.w3.org/2000/01/rdf-schema#seeAlso',
-    'creator': 'http://purl.org/dc/terms/creator',
-    'logo': 'http://xmlns.com/foaf/0.1/logo',
-    'status': 'http://www.w3.org/ns/adms#status'
-}
-JSON_CONTEXT_PARTIES = {
-    '@vocab': 'http://www.w3.org/ns/odrl/2/',
-    'label': 'http://www.w3.org/2000/01/rdf-schema#label',
-    'comment': 'http://www.w3.org/2000/01/rdf-schema#comment',
-    'register': 'http://purl.org/linked-data/registry#register',
-    'containedItemClass': 'http://purl.org/linked-data/registry#containedItemClass',
-}
-
 routes = Blueprint('controller', __name__)
 
 
+def get_requested_format():
+    """
+    Works out which format the client wants from the Accept header or the _format GET variable.
+
+    :return: One of 'application/json', 'text/turtle', 'application/n-triples', 'application/ld+json' or 'text/html'
+    """
+    g.negotiated = True
+    preferred_media_type = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    for media_type in ['application/json', 'text/turtle', 'application/n-triples', 'application/ld+json']:
+        if preferred_media_type == media_type or request.values.get('_format') == media_type:
+            return media_type
+    return 'text/html'
+
+
+@routes.after_request
+def add_vary(response):
+    # Views negotiated on the Accept header (see get_requested_format()) vary by it, so browsers and shared caches must
+    # keep a copy, and an ETag, for each media type. This includes 304 Not Modified responses.
+    if g.get('negotiated'):
+        response.vary.add('Accept')
+    return response
+
+
+def cached_response(media_type, build_response, uri=None, page=None):
+    """
+    Returns a JSON, JSON-LD, Turtle/RDF or N-Triples view from the response cache (see response_cache.py). If it isn't
+    cached yet, it is built with build_response() and cached until the catalogue changes.
+
+    Views are given an ETag based on the catalogue version and a Last-Modified date, so clients which already have the
+    latest version (If-None-Match or If-Modified-Since headers) get a 304 Not Modified response without a body.
+
+    :param media_type: The format of the view
+    :param build_response: A function returning the view as a Flask Response. It may set the response's last_modified,
+                           otherwise the time the catalogue last changed is used. Streamed responses are cached as they
+                           are sent. Any Link header is cached along with the view.
+    :param uri: The URI of the thing being viewed, if the route shows a single thing
+    :param page: The Page being viewed, if the route shows a page of a register (see pagination.py)
+    :return: A Flask Response
+    """
+    catalogue_version = db_access.get_catalogue_version()
+    version = catalogue_version['VERSION']
+    # Register views contain absolute links, so the host they're served from is part of the key
+    key = (request.endpoint, request.url_root, uri, media_type, page.key if page else None)
+    etag = '{version}-{key}'.format(version=version, key=hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16])
+    if request.if_none_match.contains_weak(etag):
+        metrics.observe('licences_response_cache_lookups_total', 1, 'not_modified')
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    cached = response_cache.cache.get(key, version)
+    metrics.observe('licences_response_cache_lookups_total', 1, 'miss' if cached is None else 'hit')
+    if cached is None:
+        response = build_response()
+        last_modified = response.last_modified or parse_timestamp(catalogue_version['MODIFIED'])
+        link = response.headers.get('Link')
+        if response.is_streamed:
+            body = tee_to_cache(response.iter_encoded(), key, version, (response.mimetype, last_modified, link))
+            cached = (body, response.mimetype, last_modified, link)
+        else:
+            cached = (response.get_data(), response.mimetype, last_modified, link)
+            response_cache.cache.put(key, version, cached, len(cached[0]))
+    response = Response(cached[0], status=200, mimetype=cached[1])
+    response.set_etag(etag)
+    response.last_modified = cached[2]
+    if cached[3]:
+        response.headers['Link'] = cached[3]
+    return response.make_conditional(request)
+
+
+def tee_to_cache(chunks, key, version, details):
+    # Passes on the chunks of a streamed response, storing the whole body in the response cache along with its other
+    # details (mimetype, last modified date and Link header) once it has been sent. Bodies larger than the cache's
+    # memory budget are not kept.
+    body = []
+    size = 0
+    for chunk in chunks:
+        if body is not None:
+            size += len(chunk)
+            if size <= response_cache.cache.max_bytes:
+                body.append(chunk)
+            else:
+                body = None
+        yield chunk
+    if body is not None:
+        response_cache.cache.put(key, version, (b''.join(body),) + details, size)
+
+
+def rdf_response(statements, media_type):
+    # Streams statements from rdf_writer.py as Turtle or N-Triples
+    if media_type == 'application/n-triples':
+        chunks = rdf_writer.write_ntriples(statements)
+    else:
+        media_type = 'text/turtle'
+        chunks = rdf_writer.write_turtle(statements)
+    chunks = metrics.timed_chunks(chunks, 'licences_rdf_serialisation_seconds', media_type)
+    return Response(chunks, status=200, mimetype=media_type)
+
+
+def requested_page(order='rowid'):
+    # Reads the page of a register being requested (see pagination.py), responding with 400 Bad Request if it's invalid
+    try:
+        return pagination.from_request(order)
+    except ValueError:
+        abort(400)
+
+
+def parse_timestamp(timestamp):
+    # Converts a timestamp stored by SQLite's CURRENT_TIMESTAMP (UTC) to a datetime. Returns None if it can't be read.
+    try:
+        return datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
 @routes.before_request
 def csrf_protect():
     # For all POST methods, verify that the CSRF token is correct
@@ -67,26 +150,13 @@ def about():
 
 @routes.route('/contact_submit', methods=['POST'])
 def contact_submit():
-    # Sends an email via mailjet with the contents of the contact form submission
+    # Queues an email via mailjet with the contents of the contact form submission. It is sent in the background, see
+    # mail_queue.py
     name = request.form['name']
     email = request.form['email']
     message = request.form['message']
-    if conf.MAILJET_SECRETS and conf.MAILJET_EMAIL_RECEIVERS and conf.MAILJET_EMAIL_SENDER:
-        email_body = 'Name: {name}\nEmail: {email}\n\n{message}'.format(name=name, email=email, message=message)
-        data = {
-            'Messages': [{
-                'From': {'Email': conf.MAILJET_EMAIL_SENDER, 'Name': 'Licence Catalogue Contact Form'},
-                'To': [{'Email': email, 'Name': ''} for email in conf.MAILJET_EMAIL_RECEIVERS],
-                'Subject': '[Licence Catalogue Contact Form] Enquiry from ' + email,
-                'TextPart': email_body
-            }]
-        }
-        requests.post(
-            conf.MAILJET_SECRETS['API_ENDPOINT'],
-            data=json.dumps(data),
-            headers={'Content-Type': 'application/json'},
-            auth=(conf.MAILJET_SECRETS['MJ_APIKEY_PUBLIC'], conf.MAILJET_SECRETS['MJ_APIKEY_PRIVATE'])
-        )
+    if mail_queue.is_configured():
+        mail_queue.enqueue(mail_queue.contact_message(name, email, message), current_app._get_current_object())
         return redirect(url_for('controller.about'))
     else:
         flash(('Message not sent', 'Contact form is currently disabled'))
@@ -96,10 +166,69 @@ def contact_submit():
 @routes.route('/_search_results')
 def search_results():
     # For AJAX requests searching through licences. Filters through licences according to the rules supplied and returns
-    # a maximum of 10 licences.
-    rules = json.loads(request.args.get('rules'))
-    results = functions.filter_policies(rules)
-    return jsonify(results=results)
+    # a maximum of 10 licences. If words to search for are given in q, licences are also searched for them and ranked by
+    # how well they match. Also returns the total number of matching licences and, if there are more, a cursor which
+    # gets the next 10 when given in the cursor GET variable.
+    rules = json.loads(request.args.get('rules', '[]'))
+    try:
+        offset = pagination.decode_cursor(request.args['cursor']) if request.args.get('cursor') else 0
+    except ValueError:
+        abort(400)
+    if offset < 0:
+        abort(400)
+    results, total = functions.search_policies(rules, text=request.args.get('q'), offset=offset)
+    return jsonify(search_page(results, total, offset))
+
+
+def search_page(results, total, offset=0):
+    # A page of search results as sent to the licence search page, with a cursor for the next page if there is one
+    # A page adding no results has no next page, so a client following next links can't get stuck on it
+    end = offset + len(results)
+    return {'results': results, 'total': total,
+            'next': pagination.encode_cursor(end) if results and end < total else None}
+
+
+@routes.route('/_similar_licences')
+def similar_licences():
+    # For AJAX requests suggesting licences similar to the rules supplied while creating a licence. Returns at most k
+    # licences (10 by default), most similar first, and a cursor which gets the next k when given in the cursor GET
+    # variable. Until any rules are chosen, every licence is listed as on the licence search page.
+    rules = json.loads(request.args.get('rules', '[]'))
+    num_results = min(max(request.args.get('k', 10, type=int), 1), 100)
+    try:
+        offset = pagination.decode_cursor(request.args['cursor']) if request.args.get('cursor') else 0
+    except ValueError:
+        abort(400)
+    if offset < 0:
+        abort(400)
+    if not any(rule['ACTIONS'] for rule in rules):
+        results, total = functions.search_policies([], num_results, offset=offset)
+        return jsonify(search_page(results, total, offset))
+    # One extra licence is found to tell whether there are more. The total isn't counted, since any licence sharing a
+    # rule is similar.
+    results = functions.similar_policies(rules, num_results + 1, offset)
+    end = offset + num_results
+    return jsonify(results=results[:num_results], total=None,
+                   next=pagination.encode_cursor(end) if len(results) > num_results else None)
+
+
+@routes.route('/_debug/queries')
+def debug_queries():
+    # The queries run by the most recent requests, when SQL instrumentation is turned on. See query_log.py for details.
+    if not query_log.is_enabled():
+        abort(404)
+    return jsonify(requests=query_log.recent_requests())
+
+
+@routes.route('/metrics')
+def view_metrics():
+    # Metrics for Prometheus to scrape, added up across every process. See metrics.py for details.
+    if not metrics.is_enabled():
+        abort(404)
+    if not metrics.is_allowed(request.headers.get('Authorization')):
+        abort(403)
+    return Response(metrics.write_metrics(metrics.collect()), status=200,
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @routes.route('/licence/index.json')
@@ -133,26 +262,19 @@ def view_licence_list():
     """
     'Find a Licence' page. Displays up to ten licences initially, with no filter applied. User can update the filter
     and the page updates accordingly via the search_results() route.
-    Also available as JSON, JSON-LD and Turtle/RDF. These views return all licences, no search is applied.
+    Also available as JSON, JSON-LD, Turtle/RDF and N-Triples. These views list all licences a page at a time (see
+    pagination.py), no search is applied.
     """
-    licences = [db_access.get_policy(policy_uri) for policy_uri in db_access.get_all_policies()]
-    actions = db_access.get_all_actions()
-    for action in actions:
-        action.update({'LINK': url_for('controller.action_register', uri=action['URI'])})
-
     # Respond according to preferred media type
-    preferred_media_type = request.accept_mimetypes.best_match(['application/json', 'text/html'])
-    if preferred_media_type == 'application/json' or request.values.get('_format') == 'application/json':
-        return functions.get_policies_json(licences)
-    elif preferred_media_type == 'text/turtle' or request.values.get('_format') == 'text/turtle':
-        policies_rdf = functions.get_policies_rdf(licences).serialize(format='turtle')
-        return Response(policies_rdf, status=200, mimetype='text/turtle')
-    elif preferred_media_type == 'application/ld+json' or request.values.get('_format') == 'application/ld+json':
-        json_ld = functions.get_policies_rdf(licences).serialize(format='json-ld', context=JSON_CONTEXT_POLICIES)
-        return Response(json_ld, status=200, mimetype='application/json')
+    media_type = get_requested_format()
+    if media_type != 'text/html':
+        page = requested_page()
+        return cached_response(media_type, lambda: licence_list_response(media_type, page), page=page)
     else:
         # Display as HTML
-        licences = functions.filter_policies([])
+        actions = [dict(action, LINK=url_for('controller.action_register', uri=action['URI']))
+                   for action in vocabulary.get_vocabulary().actions]
+        licences = search_page(*functions.search_policies([]))
         return render_template(
             'licence_search.html',
             licences=licences,
@@ -165,38 +287,58 @@ def view_licence_list():
         )
 
 
+def licence_list_response(media_type, page):
+    # Builds the JSON, JSON-LD, Turtle/RDF or N-Triples view of a page of licences
+    if media_type == 'application/ld+json':
+        response = licence_list_json_ld_response(page)
+    else:
+        licences = page.fetch('POLICY')
+        if media_type == 'application/json':
+            response = functions.get_policies_json(licences)
+        else:
+            register_uri = url_for('controller.licence_routes', _external=True)
+            response = rdf_response(rdf_writer.policies_statements(licences, register_uri), media_type)
+    response.headers['Link'] = page.link_header()
+    return response
+
+
+def licence_list_json_ld_response(page):
+    # Builds the JSON-LD view of a page of licences from the register entries stored when each licence was created
+    entries = page.fetch('POLICY', db_access.get_policy_register_entries)
+    missing = [entry['URI'] for entry in entries if entry['REGISTER_ENTRY'] is None]
+    # Licences created before JSON-LD was stored (see migrate_database.py) are built as needed
+    built = {policy['URI']: json_ld.policy_register_entry(policy)
+             for policy in db_access.get_policies_full(missing)} if missing else {}
+    entries = [json.loads(entry['REGISTER_ENTRY']) if entry['REGISTER_ENTRY'] else built[entry['URI']]
+               for entry in entries]
+    register_uri = url_for('controller.licence_routes', _external=True)
+    return Response(json_ld.policies_document(entries, register_uri), status=200, mimetype='application/json')
+
+
 def view_licence(policy_uri):
     """
     Displays information about a licence, including its attributes and rules (which are sorted into permissions, duties,
     and prohibitions before display).
-    Also available as JSON, JSON-LD and Turtle/RDF.
+    Also available as JSON, JSON-LD, Turtle/RDF and N-Triples.
     """
-    try:
-        policy = db_access.get_policy(policy_uri)
-    except ValueError:
-        abort(404)
-        return
     # Respond according to preferred media type
-    preferred_media_type = request.accept_mimetypes.best_match(['application/json', 'text/html'])
-    rules = [db_access.get_rule(rule_uri) for rule_uri in policy['RULES']]
-    if preferred_media_type == 'application/json' or request.values.get('_format') == 'application/json':
-        return get_policy_json(policy, rules)
-    elif preferred_media_type == 'text/turtle' or request.values.get('_format') == 'text/turtle':
-        policy_rdf = functions.get_policy_rdf(policy, rules).serialize(format='turtle')
-        return Response(policy_rdf, status=200, mimetype='text/turtle')
-    elif preferred_media_type == 'application/ld+json' or request.values.get('_format') == 'application/ld+json':
-        json_ld = functions.get_policy_rdf(policy, rules).serialize(format='json-ld', context=JSON_CONTEXT_POLICIES)
-        return Response(json_ld, status=200, mimetype='application/json')
+    media_type = get_requested_format()
+    if media_type != 'text/html':
+        return cached_response(media_type, lambda: licence_response(policy_uri, media_type), uri=policy_uri)
     else:
         # Display as HTML
+        try:
+            # Assignors and assignees are shown with their labels
+            policy = db_access.get_policies_full([policy_uri], expand_parties=True)[0]
+        except ValueError:
+            abort(404)
+            return
         permissions = []
         duties = []
         prohibitions = []
-        for rule in rules:
-            rule['ASSIGNORS'] = [db_access.get_party(assignor) for assignor in rule['ASSIGNORS']]
-            rule['ASSIGNEES'] = [db_access.get_party(assignee) for assignee in rule['ASSIGNEES']]
+        for rule in policy['RULES']:
             if rule['LABEL'] is None:
-                rule['LABEL'] = rule['URI']
+                rule = rule.replace(LABEL=rule['URI'])
             if rule['TYPE_LABEL'] == 'Permission':
                 permissions.append(rule)
             elif rule['TYPE_LABEL'] == 'Duty':
@@ -216,6 +358,41 @@ def view_licence(policy_uri):
         )
 
 
+def licence_response(policy_uri, media_type):
+    # Builds the JSON, JSON-LD, Turtle/RDF or N-Triples view of a licence
+    if media_type == 'application/ld+json':
+        return licence_json_ld_response(policy_uri)
+    try:
+        policy = db_access.get_policies_full([policy_uri])[0]
+    except ValueError:
+        abort(404)
+        return
+    rules = policy['RULES']
+    if media_type == 'application/json':
+        response = get_policy_json(policy, rules)
+    elif media_type in ['text/turtle', 'application/n-triples']:
+        response = rdf_response(rdf_writer.policy_statements(policy, rules), media_type)
+    # Licences aren't changed once created
+    response.last_modified = parse_timestamp(policy['CREATED'])
+    return response
+
+
+def licence_json_ld_response(policy_uri):
+    # Builds the JSON-LD view of a licence from the JSON-LD stored when it was created
+    policy = db_access.get_policy_json_ld(policy_uri)
+    if policy is None:
+        abort(404)
+        return
+    nodes_json = policy['NODES']
+    if nodes_json is None:
+        # Licences created before JSON-LD was stored (see migrate_database.py) are built as needed
+        full_policy = db_access.get_policies_full([policy_uri])[0]
+        nodes_json = json_ld.dumps(json_ld.policy_nodes(full_policy, full_policy['RULES']))
+    response = Response(json_ld.policy_document(nodes_json), status=200, mimetype='application/json')
+    response.last_modified = parse_timestamp(policy['CREATED'])
+    return response
+
+
 @routes.route('/action/index.json')
 def view_action_list_json():
     # Redirect for alternate URL for JSON view
@@ -225,48 +402,61 @@ def view_action_list_json():
 @routes.route('/action/')
 def action_register():
     """
-    Displays all actions in alphabetical order and grouped into their first letter.
+    Displays a page of actions (see pagination.py) in alphabetical order and grouped into their first letter.
     Specific actions in this register are usually pointed to via element ID
     i.e. licences.com/action/#http://www.w3.org/ns/odrl/2/read
-    Also available as JSON, JSON-LD and Turtle/RDF.
+    Also available as JSON, JSON-LD, Turtle/RDF and N-Triples.
     """
     action_uri = request.values.get('uri')
     if action_uri:
-        return redirect(url_for('controller.action_register') + '#' + action_uri)
-    actions = db_access.get_all_actions()
-    # Respond according to preferred media type
-    preferred_media_type = request.accept_mimetypes.best_match(['application/json', 'text/html'])
-    if preferred_media_type == 'application/json' or request.values.get('_format') == 'application/json':
-        return functions.get_actions_json(actions)
-    elif preferred_media_type == 'text/turtle' or request.values.get('_format') == 'text/turtle':
-        actions_rdf = functions.get_actions_rdf(actions).serialize(format='turtle')
-        return Response(actions_rdf, status=200, mimetype='text/turtle')
-    elif preferred_media_type == 'application/ld+json' or request.values.get('_format') == 'application/ld+json':
-        json_ld = functions.get_actions_rdf(actions).serialize(format='json-ld', context=JSON_CONTEXT_ACTIONS)
-        return Response(json_ld, status=200, mimetype='application/json')
+        # Registers are split into pages, so the link is to the page the action is on
+        page_number = pagination.get_page_number('ACTION', action_uri, 'label')
+        page_args = {'page': page_number} if page_number and page_number > 1 else {}
+        return redirect(url_for('controller.action_register', **page_args) + '#' + action_uri)
+    # Respond according to preferred media type. The HTML view is paged through alphabetically, so the groups of each
+    # letter are in order across pages.
+    media_type = get_requested_format()
+    page = requested_page('rowid' if media_type != 'text/html' else 'label')
+    if media_type != 'text/html':
+        return cached_response(media_type, lambda: action_list_response(media_type, page), page=page)
     else:
         # Display as HTML
+        actions = page.fetch('ACTION')
         action_groups = {}
+        policies_by_action = db_access.get_policies_by_action([action['URI'] for action in actions])
         for action in actions:
             if not action['LABEL']:
                 action['LABEL'] = action['URI']
             first_char = action['LABEL'][0].upper()
-            licences_using_action = db_access.get_policies_using_action(action['URI'])
+            licences_using_action = policies_by_action.get(action['URI'], [])
             action['LICENCES'] = sorted(licences_using_action, key=lambda x: x['LABEL'].lower())
             if first_char in action_groups:
                 action_groups[first_char].append(action)
             else:
                 action_groups[first_char] = [action]
-        for group in action_groups:
-            action_groups[group].sort(key=lambda x: x['LABEL'].lower())
         return render_template(
             'action_register.html',
             action_groups=action_groups,
             permalink=conf.PERMALINK_BASE + 'action/',
             rdf_link=url_for('controller.action_register', _format='text/turtle'),
             json_link=url_for('controller.action_register', _format='application/json'),
-            json_ld_link=url_for('controller.action_register', _format='application/ld+json')
-        )
+            json_ld_link=url_for('controller.action_register', _format='application/ld+json'),
+            page_links=page.links()
+        ), {'Link': page.link_header()}
+
+
+def action_list_response(media_type, page):
+    # Builds the JSON, JSON-LD, Turtle/RDF or N-Triples view of a page of actions
+    actions = page.fetch('ACTION')
+    register_uri = url_for('controller.action_register', _external=True)
+    if media_type == 'application/json':
+        response = functions.get_actions_json(actions)
+    elif media_type in ['text/turtle', 'application/n-triples']:
+        response = rdf_response(rdf_writer.actions_statements(actions, register_uri), media_type)
+    else:
+        response = Response(json_ld.actions_document(actions, register_uri), status=200, mimetype='application/json')
+    response.headers['Link'] = page.link_header()
+    return response
 
 
 @routes.route('/logout')
@@ -316,23 +506,17 @@ def create_licence_form():
     3. The user enters other information about the licence such as its name, description, etc.
 
     Assignors and assignees are selected from a list of permitted 'parties', which consists of a list pulled from
-    http://catalogue.linked.data.gov.au/org/json combined with the parties that are already in the database.
+    http://catalogue.linked.data.gov.au/org/json (cached, see external_parties.py) combined with the parties that are
+    already in the database.
     """
     if not current_user.is_authenticated: # Unauthenticated users will be redirected to the login page.
         return redirect(url_for('controller.login', next=request.url))
-    actions = db_access.get_all_actions()
-    parties = db_access.get_all_parties()
-    try:
-        external_parties = json.loads(requests.get('http://catalogue.linked.data.gov.au/org/json').text)
-        for external_party in external_parties:
-            if not any(external_party['view_taxonomy_term'] == party['URI'] for party in parties):
-                parties.append({
-                    'URI': external_party['view_taxonomy_term'],
-                    'LABEL': external_party['name'],
-                    'COMMENT': external_party['description__value']
-                })
-    except requests.ConnectionError:
-        pass
+    actions = [dict(action) for action in vocabulary.get_vocabulary().actions]
+    parties = {party['URI']: dict(party) for party in db_access.get_all_parties()}
+    for party_uri, external_party in external_parties.cache.get().items():
+        if party_uri not in parties:
+            parties[party_uri] = dict(external_party)
+    parties = list(parties.values())
     actions.sort(key=lambda x: (x['LABEL'] is None, x['LABEL']))
     parties.sort(key=lambda x: (x['LABEL'] is None, x['LABEL']))
     for action in actions:
@@ -342,7 +526,7 @@ def create_licence_form():
         if not party['LABEL']:
             party['LABEL'] = party['URI']
     return render_template('create_licence.html', actions=actions, parties=parties,
-                           search_url=url_for('controller.search_results'))
+                           search_url=url_for('controller.similar_licences'))
 
 
 @routes.route('/licence/create', methods=['POST'])
@@ -382,51 +566,58 @@ def view_party_list_json():
 @routes.route('/party/')
 def party_register():
     """
-    Displays all parties in alphabetical order and grouped into their first letter.
+    Displays a page of parties (see pagination.py) in alphabetical order and grouped into their first letter.
     Specific parties in this register are usually pointed to via element ID
     i.e. licences.com/parties/#http://test.linked.data.gov.au/board/B-0068
-    Also available as JSON, JSON-LD and Turtle/RDF.
+    Also available as JSON, JSON-LD, Turtle/RDF and N-Triples.
     """
     party_uri = request.values.get('uri')
     if party_uri:
-        return redirect(url_for('controller.party_register') + '#' + party_uri)
-    parties = db_access.get_all_parties()
-    # Respond according to preferred media type
-    preferred_media_type = request.accept_mimetypes.best_match(['application/json', 'text/html'])
-    if preferred_media_type == 'application/json' or request.values.get('_format') == 'application/json':
-        return functions.get_parties_json(parties)
-    elif preferred_media_type == 'text/turtle' or request.values.get('_format') == 'text/turtle':
-        parties_rdf = functions.get_parties_rdf(parties).serialize(format='turtle')
-        return Response(parties_rdf, status=200, mimetype='text/turtle')
-    elif preferred_media_type == 'application/ld+json' or request.values.get('_format') == 'application/ld+json':
-        json_ld = functions.get_parties_rdf(parties).serialize(format='json-ld', context=JSON_CONTEXT_PARTIES)
-        return Response(json_ld, status=200, mimetype='application/json')
+        # Registers are split into pages, so the link is to the page the party is on
+        page_number = pagination.get_page_number('PARTY', party_uri, 'label')
+        page_args = {'page': page_number} if page_number and page_number > 1 else {}
+        return redirect(url_for('controller.party_register', **page_args) + '#' + party_uri)
+    # Respond according to preferred media type. The HTML view is paged through alphabetically, so the groups of each
+    # letter are in order across pages.
+    media_type = get_requested_format()
+    page = requested_page('rowid' if media_type != 'text/html' else 'label')
+    if media_type != 'text/html':
+        return cached_response(media_type, lambda: party_list_response(media_type, page), page=page)
     else:
         # Display as HTML
         party_groups = {}
-        for party in parties:
+        for party in page.fetch('PARTY', lambda after, limit: db_access.get_party_licence_map(after, limit, 'label')):
             if not party['LABEL']:
                 party['LABEL'] = party['URI']
-            rules_involving_party = db_access.get_rules_for_party(party['URI'])
-            licences_involving_party = []
-            for rule_involving_party in rules_involving_party:
-                licences_involving_party.extend(db_access.get_policies_for_rule(rule_involving_party))
-            party['LICENCES'] = sorted(licences_involving_party, key=lambda x: x['LABEL'].lower())
+            party['LICENCES'].sort(key=lambda x: x['LABEL'].lower())
             first_char = party['LABEL'][0].upper()
             if first_char in party_groups:
                 party_groups[first_char].append(party)
             else:
                 party_groups[first_char] = [party]
-        for group in party_groups:
-            party_groups[group].sort(key=lambda x: x['LABEL'].lower())
         return render_template(
             'party_register.html',
             party_groups=party_groups,
             permalink=conf.PERMALINK_BASE + 'party/',
             rdf_link=url_for('controller.party_register', _format='text/turtle'),
             json_link=url_for('controller.party_register', _format='application/json'),
-            json_ld_link=url_for('controller.party_register', _format='application/ld+json')
-        )
+            json_ld_link=url_for('controller.party_register', _format='application/ld+json'),
+            page_links=page.links()
+        ), {'Link': page.link_header()}
+
+
+def party_list_response(media_type, page):
+    # Builds the JSON, JSON-LD, Turtle/RDF or N-Triples view of a page of parties
+    parties = page.fetch('PARTY')
+    register_uri = url_for('controller.party_register', _external=True)
+    if media_type == 'application/json':
+        response = functions.get_parties_json(parties)
+    elif media_type in ['text/turtle', 'application/n-triples']:
+        response = rdf_response(rdf_writer.parties_statements(parties, register_uri), media_type)
+    else:
+        response = Response(json_ld.parties_document(parties, register_uri), status=200, mimetype='application/json')
+    response.headers['Link'] = page.link_header()
+    return response
 
 
 @routes.route('/object')
@@ -444,3 +635,34 @@ def view_object():
         if db_access.party_exists(object_uri):
             return redirect(url_for('controller.party_register', uri=object_uri))
         abort(404)
+
+
+@routes.route('/dump')
+def dump_catalogue():
+    """
+    The whole catalogue - every licence with its rules, actions and parties - as N-Triples (the default) or JSON Lines
+    (application/x-ndjson), for harvesting by aggregators. The dump is streamed straight from the database (see
+    dump.py) and compressed with gzip if the client accepts it.
+    """
+    media_type = request.values.get('_format')
+    if media_type not in dump.MEDIA_TYPES:
+        media_type = request.accept_mimetypes.best_match(dump.MEDIA_TYPES, default=dump.MEDIA_TYPES[0])
+    use_gzip = 'gzip' in request.accept_encodings
+    catalogue_version = db_access.get_catalogue_version()
+    etag = 'dump-{version}-{format}{gzip}'.format(version=catalogue_version['VERSION'],
+                                                  format=dump.MEDIA_TYPES.index(media_type),
+                                                  gzip='-gzip' if use_gzip else '')
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        chunks = dump.write_dump(media_type)
+        if use_gzip:
+            chunks = dump.gzip_chunks(chunks)
+        # The request context is kept until the dump has been sent, so the database connection stays open meanwhile
+        response = Response(stream_with_context(chunks), status=200, mimetype=media_type)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    response.set_etag(etag)
+    response.last_modified = parse_timestamp(catalogue_version['MODIFIED'])
+    return response
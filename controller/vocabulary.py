@@ -0,0 +1,46 @@
+from controller import db_access
+
+"""
+VOCABULARY
+
+The controlled vocabularies Rules are made from - the permitted Rule types and Actions. There are only a few dozen of
+them and they hardly ever change, so rather than querying their tables every time a Rule is created or a page is shown,
+they are loaded once into a Vocabulary with Dictionaries for looking up URIs by label and labels by URI.
+
+The vocabulary is reloaded whenever the vocabulary version changes, which triggers on the RULE_TYPE and ACTION tables
+increase on any change to them (see create_database.create_vocabulary_version_table()). Changes to the catalogue itself,
+such as creating licences, leave it alone. invalidate() discards it straight away.
+"""
+
+_vocabulary = None
+
+
+class Vocabulary:
+    def __init__(self, version, rule_types, actions):
+        """
+        :param version: The vocabulary version the Vocabulary is loaded from
+        :param rule_types: A List of Rule types, as returned by db_access.get_permitted_rule_types()
+        :param actions: A List of Actions, as returned by db_access.get_all_actions()
+        """
+        self.version = version
+        self.rule_type_uris = {rule_type['LABEL']: rule_type['URI'] for rule_type in rule_types}
+        self.rule_type_labels = {rule_type['URI']: rule_type['LABEL'] for rule_type in rule_types}
+        # Actions are immutable records, so can be handed out as they are
+        self.actions = tuple(actions)
+        self.action_uris = {action['LABEL']: action['URI'] for action in self.actions}
+        self.action_labels = {action['URI']: action['LABEL'] for action in self.actions}
+
+
+def get_vocabulary():
+    # Returns the vocabulary, loading it from the database if it hasn't been loaded yet or the vocabulary has changed
+    global _vocabulary
+    version = db_access.get_vocabulary_version()
+    if _vocabulary is None or _vocabulary.version != version:
+        _vocabulary = Vocabulary(version, db_access.get_permitted_rule_types(), db_access.get_all_actions())
+    return _vocabulary
+
+
+def invalidate():
+    # Discards the vocabulary so that it is reloaded on next use
+    global _vocabulary
+    _vocabulary = None
@@ -1,5 +1,6 @@
 import os
 import _conf
+from controller import connection_pool
 from controller.offline_db_access import get_db
 
 '''
@@ -7,12 +8,19 @@ Beware:
 This script completely wipes the database and starts over!
 '''
 
+# Tables indexed for full-text search, with the column indexed along with their labels, if any. See
+# create_search_table()
+SEARCH_SOURCES = [('POLICY', 'COMMENT'), ('ACTION', 'DEFINITION'), ('PARTY', None)]
+
 
 def teardown():
-    try:
-        os.remove(_conf.DATABASE_PATH)
-    except FileNotFoundError:
-        pass
+    connection_pool.close_all()
+    # The write-ahead log and shared memory files are left next to the database while connections are open
+    for path in [_conf.DATABASE_PATH, _conf.DATABASE_PATH + '-wal', _conf.DATABASE_PATH + '-shm']:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
 
 
 def rebuild():
@@ -106,6 +114,12 @@ def rebuild():
             PRIMARY KEY (PARTY_URI, RULE_URI)
         );
     ''')
+    create_indexes(conn)
+    create_version_table(conn)
+    create_vocabulary_version_table(conn)
+    create_json_ld_table(conn)
+    create_outbox_table(conn)
+    create_search_table(conn)
     conn.execute('''
         INSERT INTO POLICY_TYPE (TYPE) VALUES ('http://creativecommons.org/ns#License');
     ''')
@@ -217,6 +231,144 @@ def rebuild():
     conn.commit()
 
 
+def create_indexes(conn):
+    # Secondary indexes for the reverse lookups not covered by the primary keys, i.e. Parties by Rule, Rules by Action
+    # and Policies by Rule. Safe to run against an existing database, see migrate_database.py
+    conn.execute('CREATE INDEX IF NOT EXISTS ASSIGNOR_RULE_URI ON ASSIGNOR (RULE_URI)')
+    conn.execute('CREATE INDEX IF NOT EXISTS ASSIGNEE_RULE_URI ON ASSIGNEE (RULE_URI)')
+    conn.execute('CREATE INDEX IF NOT EXISTS RULE_HAS_ACTION_ACTION_URI ON RULE_HAS_ACTION (ACTION_URI)')
+    conn.execute('CREATE INDEX IF NOT EXISTS POLICY_HAS_RULE_RULE_URI ON POLICY_HAS_RULE (RULE_URI)')
+    # The order the HTML views of the action and party registers are paged through in, see db_access.PAGE_ORDERS
+    conn.execute('CREATE INDEX IF NOT EXISTS ACTION_LABEL ON ACTION (COALESCE(LABEL, URI) COLLATE NOCASE)')
+    conn.execute('CREATE INDEX IF NOT EXISTS PARTY_LABEL ON PARTY (COALESCE(LABEL, URI) COLLATE NOCASE)')
+
+
+def create_version_table(conn):
+    # A single row holding the catalogue version, which is increased by db_access.commit_db() whenever changes are
+    # committed. Safe to run against an existing database, see migrate_database.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS CATALOGUE_VERSION (
+            VERSION     INT     NOT NULL,
+            MODIFIED    TEXT    NOT NULL
+        );
+    ''')
+    conn.execute('''
+        INSERT INTO CATALOGUE_VERSION (VERSION, MODIFIED) SELECT 0, CURRENT_TIMESTAMP
+        WHERE NOT EXISTS (SELECT 1 FROM CATALOGUE_VERSION);
+    ''')
+
+
+def create_vocabulary_version_table(conn):
+    # A single row holding the version of the controlled vocabularies (Rule types and Actions), which triggers increase
+    # whenever either table changes so vocabulary.py knows when to reload them. Safe to run against an existing
+    # database, see migrate_database.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS VOCABULARY_VERSION (
+            VERSION     INT     NOT NULL
+        );
+    ''')
+    conn.execute('''
+        INSERT INTO VOCABULARY_VERSION (VERSION)
+        SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM VOCABULARY_VERSION)
+    ''')
+    for table in ['RULE_TYPE', 'ACTION']:
+        for event in ['INSERT', 'UPDATE', 'DELETE']:
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS {table}_VOCABULARY_{event} AFTER {event} ON {table} BEGIN
+                    UPDATE VOCABULARY_VERSION SET VERSION = VERSION + 1;
+                END;
+            '''.format(table=table, event=event))
+
+
+def create_json_ld_table(conn):
+    # The JSON-LD of each Policy, stored when it is created so the JSON-LD views don't have to build it (see
+    # json_ld.py). Safe to run against an existing database, see migrate_database.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS POLICY_JSON_LD (
+            POLICY_URI      TEXT    PRIMARY KEY,
+            NODES           TEXT    NOT NULL,
+            REGISTER_ENTRY  TEXT    NOT NULL,
+            FOREIGN KEY (POLICY_URI) REFERENCES POLICY (URI) ON DELETE CASCADE
+        );
+    ''')
+
+
+def create_outbox_table(conn):
+    # Emails waiting to be sent by mail_queue.py, which are deleted once sent. NEXT_ATTEMPT is a Unix time.
+    # Safe to run against an existing database, see migrate_database.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS OUTBOX (
+            ID              INTEGER     PRIMARY KEY,
+            MESSAGE         TEXT        NOT NULL,
+            CREATED         TIMESTAMP   NOT NULL,
+            ATTEMPTS        INTEGER     NOT NULL DEFAULT 0,
+            NEXT_ATTEMPT    REAL        NOT NULL DEFAULT 0,
+            LAST_ERROR      TEXT
+        );
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS OUTBOX_NEXT_ATTEMPT ON OUTBOX (NEXT_ATTEMPT)')
+
+
+def create_search_table(conn):
+    # A full-text index (SQLite FTS5) of the labels and comments of Policies, the labels and definitions of Actions and
+    # the labels of Parties, searched by db_access.get_policies_by_text(). The rowid of each row of the index is kept
+    # in SEARCH_KEY under the kind and URI of the row it indexes, so the triggers keeping it in sync can find it without
+    # scanning the index. The rowids of the indexed tables themselves can't be used, as VACUUM may renumber them.
+    # Safe to run against an existing database, see migrate_database.py. Existing rows are (re)indexed each time.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS SEARCH_TEXT USING fts5 (
+            KIND    UNINDEXED,
+            URI     UNINDEXED,
+            LABEL,
+            BODY,
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS SEARCH_KEY (
+            ID      INTEGER     PRIMARY KEY,
+            KIND    TEXT        NOT NULL,
+            URI     TEXT        NOT NULL,
+            UNIQUE (KIND, URI)
+        );
+    ''')
+    conn.execute('DELETE FROM SEARCH_TEXT')
+    conn.execute('DELETE FROM SEARCH_KEY')
+    for table, body in SEARCH_SOURCES:
+        columns = {'table': table, 'body': body or 'NULL', 'new_body': 'NEW.' + body if body else 'NULL',
+                   'updated': 'URI, LABEL, ' + body if body else 'URI, LABEL',
+                   'key': "SELECT ID FROM SEARCH_KEY WHERE KIND = '{table}' AND URI".format(table=table)}
+        # Triggers are replaced rather than kept, as databases indexed before SEARCH_KEY have triggers using rowids
+        for event in ['INSERT', 'UPDATE', 'DELETE']:
+            conn.execute('DROP TRIGGER IF EXISTS {table}_SEARCH_{event}'.format(table=table, event=event))
+        conn.execute('''
+            CREATE TRIGGER {table}_SEARCH_INSERT AFTER INSERT ON {table} BEGIN
+                INSERT INTO SEARCH_KEY (KIND, URI) VALUES ('{table}', NEW.URI);
+                INSERT INTO SEARCH_TEXT (rowid, KIND, URI, LABEL, BODY)
+                VALUES (({key} = NEW.URI), '{table}', NEW.URI, NEW.LABEL, {new_body});
+            END;
+        '''.format(**columns))
+        conn.execute('''
+            CREATE TRIGGER {table}_SEARCH_UPDATE AFTER UPDATE OF {updated} ON {table} BEGIN
+                UPDATE SEARCH_KEY SET URI = NEW.URI WHERE KIND = '{table}' AND URI = OLD.URI;
+                UPDATE SEARCH_TEXT SET URI = NEW.URI, LABEL = NEW.LABEL, BODY = {new_body}
+                WHERE rowid = ({key} = NEW.URI);
+            END;
+        '''.format(**columns))
+        conn.execute('''
+            CREATE TRIGGER {table}_SEARCH_DELETE AFTER DELETE ON {table} BEGIN
+                DELETE FROM SEARCH_TEXT WHERE rowid = ({key} = OLD.URI);
+                DELETE FROM SEARCH_KEY WHERE KIND = '{table}' AND URI = OLD.URI;
+            END;
+        '''.format(**columns))
+        conn.execute("INSERT INTO SEARCH_KEY (KIND, URI) SELECT '{table}', URI FROM {table}".format(**columns))
+        conn.execute('''
+            INSERT INTO SEARCH_TEXT (rowid, KIND, URI, LABEL, BODY)
+            SELECT K.ID, K.KIND, T.URI, T.LABEL, {body} FROM {table} T, SEARCH_KEY K
+            WHERE K.KIND = '{table}' AND K.URI = T.URI
+        '''.format(**columns))
+
+
 if __name__ == '__main__':
     teardown()
     rebuild()
@@ -0,0 +1,43 @@
+import argparse
+import sys
+from unittest import mock
+from controller import dump
+from controller.offline_db_access import get_db
+
+'''
+Writes out the whole catalogue - every licence with its rules, actions and parties - as N-Triples or JSON Lines, the
+same as the /dump route. See dump.py.
+Usage: python dump_catalogue.py [--format nt|jsonl] [--gzip] [--output FILE]
+'''
+
+# Media types by format name
+FORMATS = {'nt': 'application/n-triples', 'jsonl': 'application/x-ndjson'}
+
+
+@mock.patch('controller.db_access.get_db', side_effect=get_db)
+def write_catalogue(output, media_type, use_gzip, mock):
+    # Mocks out get_db() so this can be run independently of the Flask application
+    chunks = dump.write_dump(media_type)
+    if use_gzip:
+        for chunk in dump.gzip_chunks(chunks):
+            output.write(chunk)
+    else:
+        for chunk in chunks:
+            output.write(chunk.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes out the whole catalogue.')
+    parser.add_argument('--format', choices=FORMATS, default='nt', help='Format of the dump')
+    parser.add_argument('--gzip', action='store_true', help='Compress the dump with gzip')
+    parser.add_argument('--output', help='File to write the dump to, otherwise it is written to standard output')
+    args = parser.parse_args()
+    if args.output:
+        with open(args.output, 'wb') as output:
+            write_catalogue(output, FORMATS[args.format], args.gzip)
+    else:
+        write_catalogue(sys.stdout.buffer, FORMATS[args.format], args.gzip)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import sys
+from unittest import mock
+from controller import functions, rdf_reader
+from controller.offline_db_access import get_db
+
+'''
+Imports licences in bulk from a JSON file, see functions.create_policies_bulk().
+The file should contain a List of licences, each an Object with a URI and optionally ATTRIBUTES and RULES in the same
+form as the arguments of functions.create_policy(), i.e.
+[
+    {
+        "URI": "http://example.com/licence/1",
+        "ATTRIBUTES": {"label": "Licence 1", "type": "http://creativecommons.org/ns#License"},
+        "RULES": [{"TYPE_LABEL": "Permission", "ACTIONS": ["Read"],
+                   "ASSIGNORS": [{"URI": "http://example.com/party/1", "LABEL": "Party 1", "COMMENT": null}]}]
+    }
+]
+Licences can also be imported from Turtle, N-Triples or JSON-LD describing them the same way as the RDF views of a
+licence, see rdf_reader.py. The format is worked out from the file extension unless given. Only N-Triples are read a
+little at a time - Turtle and JSON-LD files are loaded into memory whole, so files larger than MAX_GRAPH_BYTES are
+refused unless --force is given. Convert them to N-Triples first, i.e. with rdflib's rdfpipe:
+    rdfpipe -i turtle -o nt licences.ttl > licences.nt
+Licences which can't be imported are listed with the reason, the rest are still imported.
+Usage: python import_licences.py licences.json [--batch-size N]
+       python import_licences.py licences.nt [--format json|turtle|nt|json-ld] [--force]
+'''
+
+# Formats by file extension
+EXTENSIONS = {'.json': 'json', '.ttl': 'turtle', '.nt': 'nt', '.jsonld': 'json-ld'}
+# The largest Turtle or JSON-LD file imported without --force. An rdflib Graph takes many times the size of its file.
+MAX_GRAPH_BYTES = 100 * 1024 * 1024
+
+
+@mock.patch('controller.db_access.get_db', side_effect=get_db)
+def import_licences(licences, batch_size, mock):
+    # Mocks out get_db() so this can be run independently of the Flask application. Each batch is one transaction.
+    errors = {}
+    for start in range(0, len(licences), batch_size):
+        errors.update(functions.create_policies_bulk(licences[start:start + batch_size]))
+    return errors
+
+
+@mock.patch('controller.db_access.get_db', side_effect=get_db)
+def import_rdf(path, rdf_format, mock):
+    with open(path, 'rb') as file:
+        return rdf_reader.import_policies(file, rdf_format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Imports licences in bulk from a JSON or RDF file.')
+    parser.add_argument('path', help='JSON file containing a List of licences, or an RDF file describing them')
+    parser.add_argument('--format', choices=['json'] + rdf_reader.FORMATS, help='Format of the file')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='Number of licences imported per transaction from JSON')
+    parser.add_argument('--force', action='store_true',
+                        help='Import Turtle or JSON-LD files larger than {:d} MiB'.format(MAX_GRAPH_BYTES // 1024 ** 2))
+    args = parser.parse_args()
+    file_format = args.format or EXTENSIONS.get(os.path.splitext(args.path)[1].lower())
+    if file_format is None:
+        parser.error('Unknown file extension, use --format')
+    if file_format in ['turtle', 'json-ld'] and os.path.getsize(args.path) > MAX_GRAPH_BYTES and not args.force:
+        parser.error('Turtle and JSON-LD files are loaded into memory whole. Convert this file to N-Triples, which are '
+                     'imported a little at a time, or use --force.')
+    if file_format == 'json':
+        with open(args.path, encoding='utf-8') as file:
+            licences = json.load(file)
+        errors = import_licences(licences, args.batch_size)
+        print('Imported {} of {} licences.'.format(len(licences) - len(errors), len(licences)))
+    else:
+        errors = import_rdf(args.path, file_format)
+        print('Imported licences, {} could not be imported.'.format(len(errors)))
+    for licence_uri, error in errors.items():
+        print('{}: {}'.format(licence_uri, error), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
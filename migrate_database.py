@@ -0,0 +1,33 @@
+import create_database
+from unittest import mock
+from controller import db_access, functions
+from controller.offline_db_access import get_db
+
+'''
+Brings an existing database up to date with the current schema without losing any data.
+Every step is safe to run more than once, so this can be run after every upgrade.
+'''
+
+
+def migrate():
+    conn = get_db()
+    create_database.create_indexes(conn)
+    create_database.create_version_table(conn)
+    create_database.create_vocabulary_version_table(conn)
+    create_database.create_json_ld_table(conn)
+    create_database.create_outbox_table(conn)
+    create_database.create_search_table(conn)
+    conn.commit()
+    store_missing_json_ld()
+
+
+@mock.patch('controller.db_access.get_db', side_effect=get_db)
+def store_missing_json_ld(mock):
+    # Stores the JSON-LD of Policies created before it was stored on creation
+    missing = [row['URI'] for row in db_access.get_policy_register_entries() if row['REGISTER_ENTRY'] is None]
+    functions.store_policies_json_ld(missing)
+    db_access.commit_db()
+
+
+if __name__ == '__main__':
+    migrate()
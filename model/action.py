@@ -0,0 +1,9 @@
+from weakref import WeakValueDictionary
+from model.record import Record
+
+
+class Action(Record):
+    # An Action which Rules can permit, require or prohibit. Interned, see Record.intern().
+    FIELDS = ('URI', 'LABEL', 'DEFINITION')
+    __slots__ = FIELDS
+    _interned = WeakValueDictionary()
@@ -0,0 +1,10 @@
+from weakref import WeakValueDictionary
+from model.record import Record
+
+
+class Party(Record):
+    # A person, group of people, organisation or agent which can be the assignor or assignee of Rules. Interned, see
+    # Record.intern().
+    FIELDS = ('URI', 'LABEL', 'COMMENT')
+    __slots__ = FIELDS
+    _interned = WeakValueDictionary()
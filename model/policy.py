@@ -0,0 +1,9 @@
+from model.record import Record
+
+
+class Policy(Record):
+    # A Policy (licence) with the columns of the POLICY table. RULES is a tuple of Rules, or of their URIs when the
+    # Policy is loaded on its own (see db_access.get_policy()).
+    FIELDS = ('URI', 'TYPE', 'LABEL', 'JURISDICTION', 'LEGAL_CODE', 'HAS_VERSION', 'LANGUAGE', 'SEE_ALSO', 'SAME_AS',
+              'COMMENT', 'LOGO', 'CREATED', 'STATUS', 'CREATOR', 'RULES')
+    __slots__ = FIELDS
@@ -0,0 +1,88 @@
+from collections.abc import Mapping
+
+
+class Record(Mapping):
+    """
+    Base class of the immutable records returned by db_access (Policy, Rule, Action and Party).
+
+    Each record keeps its fields in __slots__ rather than a __dict__, so it takes a fraction of the memory of the
+    Dictionary it replaces. Fields are named after the database's columns and can be read either as attributes
+    (action.LABEL) or as items (action['LABEL']), and a record compares equal to a Dictionary with the same items.
+    Fields can't be changed once a record is made; use replace() to get a changed copy. Lists of other records or URIs
+    are kept as tuples for the same reason.
+    """
+    __slots__ = ('__weakref__',)
+    # The names of the fields, in order
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # The slots' own setters, which get around __setattr__ while a record is being made
+        cls._setters = tuple(getattr(cls, name).__set__ for name in cls.FIELDS)
+
+    def __init__(self, **fields):
+        for name, set_field in zip(self.FIELDS, self._setters):
+            set_field(self, fields.pop(name, None))
+        if fields:
+            raise TypeError('{} has no fields named {}'.format(type(self).__name__, ', '.join(fields)))
+
+    @classmethod
+    def make(cls, values):
+        # Makes a record from the values of its fields, in the order of FIELDS. Quicker than naming each field.
+        record = object.__new__(cls)
+        for set_field, value in zip(cls._setters, values):
+            set_field(record, value)
+        return record
+
+    @classmethod
+    def intern(cls, *values):
+        """
+        Returns the record with the given field values, reusing an existing one if there is one so that records which
+        are referred to many times (i.e. an Action used by many Rules) are only held in memory once. Only for classes
+        with an _interned WeakValueDictionary.
+
+        :param values: The values of the fields, in the order of FIELDS
+        """
+        record = cls._interned.get(values)
+        if record is None:
+            record = cls._interned.setdefault(values, cls.make(values))
+        return record
+
+    def replace(self, **changes):
+        # Returns a copy of the record with some of its fields changed
+        return type(self)(**dict(self, **changes))
+
+    def __getitem__(self, name):
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} records can\'t be changed'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} records can\'t be changed'.format(type(self).__name__))
+
+    def __reduce__(self):
+        return _restore, (type(self), tuple(self.values()))
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join('{}={!r}'.format(name, getattr(self, name))
+                                                                 for name in self.FIELDS))
+
+
+def _restore(cls, values):
+    return cls.make(values)
+
+
+def json_default(value):
+    # For json.dumps(), writes records as JSON objects
+    if isinstance(value, Record):
+        return dict(value)
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
@@ -0,0 +1,8 @@
+from model.record import Record
+
+
+class Rule(Record):
+    # A Rule of a Policy. ACTIONS is a tuple of Actions. ASSIGNORS and ASSIGNEES are tuples of Parties, or of their URIs
+    # when they aren't expanded (see db_access.get_rules_full()).
+    FIELDS = ('URI', 'LABEL', 'TYPE_URI', 'TYPE_LABEL', 'ACTIONS', 'ASSIGNORS', 'ASSIGNEES')
+    __slots__ = FIELDS
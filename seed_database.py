@@ -9,30 +9,33 @@ from controller.offline_db_access import get_db
 @mock.patch('controller.db_access.get_db', side_effect=get_db)
 def seed(mock):
     # Mocks out get_db() so this can be run independently of the Flask application
-    readonly_licence()
-    cc_by_4()
-    cc_by_nd_4()
-    cc_by_nc_nd_4()
-    cc_by_sa_3_au()
-    cc_by_2_5_au()
-    cc_by_2_au()
-    cc_by_nc_nd_3_au()
-    gpl_3()
-    mit()
-    cc_by_sa_4()
-    cc_zero_1()
-    gpl_2()
-    # nem_513a()
-    ogl_uk()
-    csiro_data_licence()
-    csiro_open_source_software_licence()
-    csiro_binary_software_licence()
-    gpl3_csiro()
-    cc_public_domain()
-    cc_by_3_unported()
-    cc_by_sa_3_unported()
-    cc_by_nc_nd_3_unported()
-    db_access.commit_db()
+    errors = functions.create_policies_bulk([
+        readonly_licence(),
+        cc_by_4(),
+        cc_by_nd_4(),
+        cc_by_nc_nd_4(),
+        cc_by_sa_3_au(),
+        cc_by_2_5_au(),
+        cc_by_2_au(),
+        cc_by_nc_nd_3_au(),
+        gpl_3(),
+        mit(),
+        cc_by_sa_4(),
+        cc_zero_1(),
+        gpl_2(),
+        # nem_513a(),
+        ogl_uk(),
+        csiro_data_licence(),
+        csiro_open_source_software_licence(),
+        csiro_binary_software_licence(),
+        gpl3_csiro(),
+        cc_public_domain(),
+        cc_by_3_unported(),
+        cc_by_sa_3_unported(),
+        cc_by_nc_nd_3_unported()
+    ])
+    if errors:
+        raise ValueError('Could not create licences: ' + str(errors))
 
 
 def readonly_licence():
@@ -47,7 +50,7 @@ def readonly_licence():
         'label': 'Discovery Read Only License'
     }
     rules = [{'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read']}]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_4():
@@ -66,7 +69,7 @@ def cc_by_4():
          'TYPE_LABEL': 'Permission', 'ACTIONS': ['Distribute', 'Reproduce', 'Derivative Works']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Attribution', 'Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_nd_4():
@@ -85,7 +88,7 @@ def cc_by_nd_4():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty',
          'ACTIONS': ['Attribution', 'Notice', 'Derivative Works']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_nc_nd_4():
@@ -105,7 +108,7 @@ def cc_by_nc_nd_4():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Prohibition',
          'ACTIONS': ['Commercial Use', 'Derivative Works']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_sa_3_au():
@@ -128,7 +131,7 @@ def cc_by_sa_3_au():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty',
          'ACTIONS': ['Attribution', 'Share Alike', 'Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_2_5_au():
@@ -150,7 +153,7 @@ def cc_by_2_5_au():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty',
          'ACTIONS': ['Attribution', 'Share Alike', 'Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_2_au():
@@ -172,7 +175,7 @@ def cc_by_2_au():
          'ACTIONS': ['Distribute', 'Reproduce', 'Derive']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Attribute', 'Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_nc_nd_3_au():
@@ -196,7 +199,7 @@ def cc_by_nc_nd_3_au():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Prohibition',
          'ACTIONS': ['Derive', 'Commercial Use']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def gpl_3():
@@ -218,7 +221,7 @@ def gpl_3():
          'ACTIONS': ['Distribute', 'Reproduce', 'Derive']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Notice', 'Source Code']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def mit():
@@ -232,7 +235,7 @@ def mit():
     }
     rules = [{'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Permission',
               'ACTIONS': ['Distribute', 'Reproduce', 'Derive', 'Sell']}]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_sa_4():
@@ -252,7 +255,7 @@ def cc_by_sa_4():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty',
          'ACTIONS': ['Attribution', 'Share Alike', 'Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_zero_1():
@@ -269,7 +272,7 @@ def cc_zero_1():
     }
     rules = [{'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Permission',
               'ACTIONS': ['Distribute', 'Reproduce', 'Derivative Works']}]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def gpl_2():
@@ -290,7 +293,7 @@ def gpl_2():
          'ACTIONS': ['Distribute', 'Reproduce', 'Derive']},
         {'URI': _conf.BASE_URI + '/rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Notice', 'Source Code']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def nem_513a():
@@ -309,7 +312,7 @@ def nem_513a():
     rules = [{'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': [],
               'ASSIGNORS': [{'URI': 'http://test.linked.data.gov.au/board/B-0068'}],
               'ASSIGNEES': [{'URI': 'http://example.com/group/power-companies'}]}]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def ogl_uk():
@@ -329,7 +332,7 @@ def ogl_uk():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Attribution', 'Notice']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Prohibition', 'ACTIONS': ['Commercial Use']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def csiro_data_licence():
@@ -351,7 +354,7 @@ def csiro_data_licence():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Prohibition',
          'ACTIONS': ['Grant Use', 'Commercial Use', 'Sell', 'Distribute']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def csiro_open_source_software_licence():
@@ -371,7 +374,7 @@ def csiro_open_source_software_licence():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Permission', 'ACTIONS': ['Distribute']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def csiro_binary_software_licence():
@@ -396,7 +399,7 @@ def csiro_binary_software_licence():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Prohibition',
          'ACTIONS': ['Concurrent Use', 'Modify', 'Distribute', 'Derive']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def gpl3_csiro():
@@ -420,7 +423,7 @@ def gpl3_csiro():
          'ACTIONS': ['Distribute', 'Reproduce', 'Derive']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Notice', 'Source Code']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_public_domain():
@@ -438,7 +441,7 @@ def cc_public_domain():
     }
     rules = [{'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Permission',
               'ACTIONS': ['Reproduction', 'Derive', 'Distribution']}]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_3_unported():
@@ -457,7 +460,7 @@ def cc_by_3_unported():
          'ACTIONS': ['Reproduction', 'Derive', 'Distribution']},
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty', 'ACTIONS': ['Attribution', 'Notice']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_sa_3_unported():
@@ -477,7 +480,7 @@ def cc_by_sa_3_unported():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Duty',
          'ACTIONS': ['Attribution', 'Share Alike']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 def cc_by_nc_nd_3_unported():
@@ -499,7 +502,7 @@ def cc_by_nc_nd_3_unported():
         {'URI': _conf.BASE_URI + 'rule/' + str(uuid4()), 'TYPE_LABEL': 'Prohibition',
          'ACTIONS': ['Commercial Use', 'Derivative Works']}
     ]
-    functions.create_policy(policy_uri, attributes, rules)
+    return {'URI': policy_uri, 'ATTRIBUTES': attributes, 'RULES': rules}
 
 
 if __name__ == '__main__':
@@ -1,13 +1,13 @@
 import pytest
 import _conf
 import create_database
-from controller.offline_db_access import get_db
+from tests import database
 
 
 """
 This file contains fixtures used to set up and clean up after all the tests.
 setup_database() runs first, before any of the tests are run.
-wipe_database() is run between each test.
+wipe_database() is run between each test, see tests/database.py
 """
 
 
@@ -22,12 +22,4 @@ def setup_database():
 @pytest.fixture(autouse=True)
 def wipe_database():
     # Wipe database between tests to ensure they don't interfere with each other
-    conn = get_db()
-    conn.execute('DELETE FROM ASSIGNEE')
-    conn.execute('DELETE FROM ASSIGNOR')
-    conn.execute('DELETE FROM RULE_HAS_ACTION')
-    conn.execute('DELETE FROM POLICY_HAS_RULE')
-    conn.execute('DELETE FROM PARTY')
-    conn.execute('DELETE FROM RULE')
-    conn.execute('DELETE FROM POLICY')
-    conn.commit()
+    database.wipe_database()
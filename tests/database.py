@@ -0,0 +1,23 @@
+from controller.offline_db_access import get_db
+from controller import pagination, policy_index, response_cache, similarity, vocabulary
+
+
+def wipe_database():
+    # Deletes everything added to the database by a test, keeping the Rule types and Actions, and clears the caches
+    # built from it. Run between each test by conftest.py, and by tests which need to start again part way through.
+    conn = get_db()
+    conn.execute('DELETE FROM ASSIGNEE')
+    conn.execute('DELETE FROM ASSIGNOR')
+    conn.execute('DELETE FROM RULE_HAS_ACTION')
+    conn.execute('DELETE FROM POLICY_HAS_RULE')
+    conn.execute('DELETE FROM POLICY_JSON_LD')
+    conn.execute('DELETE FROM PARTY')
+    conn.execute('DELETE FROM RULE')
+    conn.execute('DELETE FROM POLICY')
+    conn.execute('DELETE FROM OUTBOX')
+    conn.commit()
+    policy_index.invalidate()
+    similarity.invalidate()
+    vocabulary.invalidate()
+    response_cache.cache.clear()
+    pagination.clear()
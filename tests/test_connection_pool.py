@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import _conf
+from controller import connection_pool
+
+
+"""
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+def test_acquire():
+    # Should reuse the same connection within a thread
+    conn = connection_pool.acquire()
+    assert connection_pool.acquire() is conn
+    assert connection_pool.acquire(_conf.DATABASE_PATH) is conn
+
+    # Should give each thread its own connection
+    other_connections = []
+    thread = threading.Thread(target=lambda: other_connections.append(connection_pool.acquire()))
+    thread.start()
+    thread.join()
+    assert other_connections[0] is not conn
+
+    # Should configure connections for concurrent access
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+
+def test_reuse_across_threads():
+    # Should hand connections released by one thread, or left by threads which have ended, to the next thread
+    connection_pool.close_all()
+    connections = []
+
+    def use_connection(release):
+        conn = connection_pool.acquire()
+        connections.append(conn)
+        if release:
+            connection_pool.release(conn)
+    for release in [True, True, False, False, True]:
+        thread = threading.Thread(target=use_connection, args=(release,))
+        thread.start()
+        thread.join()
+    assert len(set(map(id, connections))) == 1
+    assert connections[0].execute('SELECT COUNT(1) FROM RULE_TYPE').fetchone()[0] == 3
+
+    # Should keep at most POOL_SIZE idle connections, closing any more
+    all_acquired = threading.Barrier(connection_pool.POOL_SIZE + 3)
+    connections.clear()
+
+    def hold_connection():
+        conn = connection_pool.acquire()
+        connections.append(conn)
+        all_acquired.wait()
+        connection_pool.release(conn)
+    threads = [threading.Thread(target=hold_connection) for _ in range(connection_pool.POOL_SIZE + 2)]
+    for thread in threads:
+        thread.start()
+    all_acquired.wait()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, connections))) == connection_pool.POOL_SIZE + 2
+    assert sum(1 for conn in connections if is_closed(conn)) == 2
+
+
+def is_closed(conn):
+    try:
+        conn.execute('SELECT 1')
+        return False
+    except sqlite3.ProgrammingError:
+        return True
+
+
+def test_release():
+    # Should roll back anything which wasn't committed
+    conn = connection_pool.acquire()
+    conn.execute('INSERT INTO PARTY (URI) VALUES (?)', ('http://example.com#party',))
+    connection_pool.release(conn)
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(1) FROM PARTY').fetchone()[0] == 0
+
+
+def test_close_all():
+    # Should open a new connection the next time one is needed
+    conn = connection_pool.acquire()
+    connection_pool.close_all()
+    new_conn = connection_pool.acquire()
+    assert new_conn is not conn
+    assert new_conn.execute('SELECT COUNT(1) FROM RULE_TYPE').fetchone()[0] == 3
@@ -1,4 +1,5 @@
 import pytest
+import create_database
 from controller import db_access
 from unittest import mock
 from controller.offline_db_access import get_db as mock_get_db
@@ -12,6 +13,19 @@ All tests use the fixtures defined in conftest.py for setup and teardown.
 """
 
 
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_commit_db(mock):
+    # Should increase the catalogue version when there are changes to commit
+    version = db_access.get_catalogue_version()['VERSION']
+    db_access.create_policy('https://example.com#test')
+    db_access.commit_db()
+    assert db_access.get_catalogue_version()['VERSION'] == version + 1
+
+    # Should leave the version alone when there is nothing to commit
+    db_access.commit_db()
+    assert db_access.get_catalogue_version()['VERSION'] == version + 1
+
+
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
 def test_create_policy(mock):
     # Should store a new policy entry in the database
@@ -86,7 +100,7 @@ def test_get_policy(mock):
     assert all(attr in policy for attr in expected_policy_attributes)
     assert policy['URI'] == policy_uri
     assert policy['TYPE'] == policy_type
-    assert policy['RULES'] == [rule_uri]
+    assert policy['RULES'] == (rule_uri,)
 
 
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
@@ -100,6 +114,34 @@ def test_get_all_policies(mock):
     assert db_access.get_all_policies() == [policy1_uri, policy2_uri]
 
 
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_policies_full(mock):
+    # Should raise an exception when a policy doesn't exist
+    policy1_uri = 'https://example.com#policy1'
+    with pytest.raises(ValueError):
+        db_access.get_policies_full([policy1_uri])
+
+    # Should get the same attributes as get_policy, with the rules fully retrieved
+    policy2_uri = 'https://example.com#policy2'
+    db_access.create_policy(policy1_uri)
+    db_access.create_policy(policy2_uri)
+    db_access.set_policy_attribute(policy1_uri, 'LABEL', 'Policy 1')
+    rule_uri = 'http://example.com#rule'
+    db_access.create_rule(rule_uri, 'http://www.w3.org/ns/odrl/2/permission', 'Rule')
+    db_access.add_action_to_rule('http://www.w3.org/ns/odrl/2/distribute', rule_uri)
+    db_access.add_rule_to_policy(rule_uri, policy1_uri)
+    db_access.add_rule_to_policy(rule_uri, policy2_uri)
+    policies = db_access.get_policies_full([policy2_uri, policy1_uri])
+    assert [policy['URI'] for policy in policies] == [policy2_uri, policy1_uri]
+    expected_policy = db_access.get_policy(policy1_uri).replace(RULES=(db_access.get_rule(rule_uri),))
+    assert policies[1] == expected_policy
+    assert policies[0]['RULES'] == (db_access.get_rule(rule_uri),)
+
+    # Should get every policy if no URIs are given
+    assert [policy['URI'] for policy in db_access.get_policies_full()] == db_access.get_all_policies()
+    assert db_access.get_policies_full([]) == []
+
+
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
 def test_policy_has_rule(mock):
     # Should return false if the policy does not have the rule
@@ -202,8 +244,45 @@ def test_get_rule(mock):
     assert action['DEFINITION'] == 'To supply the Asset to third-parties.'
 
     # Should get assignors and assignees associated with the rule
-    assert rule['ASSIGNORS'] == [assignor_uri]
-    assert rule['ASSIGNEES'] == [assignee_uri]
+    assert rule['ASSIGNORS'] == (assignor_uri,)
+    assert rule['ASSIGNEES'] == (assignee_uri,)
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_rules_full(mock):
+    # Should raise an exception when a rule doesn't exist
+    rule1_uri = 'http://example.com#rule1'
+    with pytest.raises(ValueError):
+        db_access.get_rules_full([rule1_uri])
+
+    # Should get the same information as get_rule for every rule
+    rule2_uri = 'http://example.com#rule2'
+    db_access.create_rule(rule1_uri, 'http://www.w3.org/ns/odrl/2/permission', 'Rule 1')
+    db_access.create_rule(rule2_uri, 'http://www.w3.org/ns/odrl/2/duty')
+    db_access.add_action_to_rule('http://www.w3.org/ns/odrl/2/distribute', rule1_uri)
+    db_access.add_action_to_rule('http://www.w3.org/ns/odrl/2/read', rule1_uri)
+    db_access.add_action_to_rule('http://creativecommons.org/ns#Attribution', rule2_uri)
+    assignor_uri = 'https://example.com#assignor'
+    assignee_uri = 'https://example.com#assignee'
+    db_access.create_party(assignor_uri, 'Assignor', 'This is an assignor.')
+    db_access.create_party(assignee_uri)
+    db_access.add_assignor_to_rule(assignor_uri, rule1_uri)
+    db_access.add_assignee_to_rule(assignee_uri, rule2_uri)
+    rules = db_access.get_rules_full([rule2_uri, rule1_uri])
+    assert rules == [db_access.get_rule(rule2_uri), db_access.get_rule(rule1_uri)]
+
+    # Should include the details of assignors and assignees if asked to
+    rule1, rule2 = db_access.get_rules_full([rule1_uri, rule2_uri], expand_parties=True)
+    assert rule1['ASSIGNORS'] == (db_access.get_party(assignor_uri),)
+    assert rule2['ASSIGNEES'] == (db_access.get_party(assignee_uri),)
+
+    # Should use the same number of queries no matter how many rules there are
+    with mock.patch('controller.db_access.query_db', side_effect=db_access.query_db) as query_mock:
+        db_access.get_rules_full([rule1_uri])
+        single_rule_queries = query_mock.call_count
+        query_mock.reset_mock()
+        db_access.get_rules_full([rule1_uri, rule2_uri])
+        assert query_mock.call_count == single_rule_queries
 
 
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
@@ -452,6 +531,34 @@ def test_get_policies_using_action(mock):
     db_access.add_rule_to_policy(rule2_uri, policy3_uri)
     policies = db_access.get_policies_using_action(action_uri)
     assert all(policy['URI'] in [policy1_uri, policy2_uri, policy3_uri] for policy in policies)
+    assert len(policies) == 3
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_policies_by_action(mock):
+    action1_uri = 'http://www.w3.org/ns/odrl/2/acceptTracking'
+    action2_uri = 'http://www.w3.org/ns/odrl/2/read'
+    rule1_uri = 'https://example.com#rule1'
+    rule2_uri = 'https://example.com#rule2'
+    rule_type = 'http://www.w3.org/ns/odrl/2/permission'
+    db_access.create_rule(rule1_uri, rule_type)
+    db_access.create_rule(rule2_uri, rule_type)
+    db_access.add_action_to_rule(action1_uri, rule1_uri)
+    db_access.add_action_to_rule(action1_uri, rule2_uri)
+    db_access.add_action_to_rule(action2_uri, rule2_uri)
+    policy1_uri = 'http://example.com#policy1'
+    policy2_uri = 'http://example.com#policy2'
+    db_access.create_policy(policy1_uri)
+    db_access.create_policy(policy2_uri)
+    db_access.add_rule_to_policy(rule1_uri, policy1_uri)
+    db_access.add_rule_to_policy(rule2_uri, policy1_uri)
+    db_access.add_rule_to_policy(rule2_uri, policy2_uri)
+
+    # Should list each policy once per action, and leave out actions not used by any policy
+    policies_by_action = db_access.get_policies_by_action()
+    assert sorted(policy['URI'] for policy in policies_by_action[action1_uri]) == [policy1_uri, policy2_uri]
+    assert sorted(policy['URI'] for policy in policies_by_action[action2_uri]) == [policy1_uri, policy2_uri]
+    assert 'http://www.w3.org/ns/odrl/2/sell' not in policies_by_action
 
 
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
@@ -531,6 +638,90 @@ def test_get_rules_for_party(mock):
     assert {rule_uris[0], rule_uris[1], rule_uris[2]} == set(db_access.get_rules_for_party(party_uris[0]))
     assert [rule_uris[3]] == db_access.get_rules_for_party(party_uris[1])
 
+    # Should still find rules where the party is an assignor when no rule has an assignee
+    db_access.remove_assignee_from_rule(party_uris[0], rule_uris[2])
+    assert {rule_uris[0], rule_uris[1]} == set(db_access.get_rules_for_party(party_uris[0]))
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_party_licence_map(mock):
+    party_uris = ['https://example.com/party/1', 'https://example.com/party/2', 'https://example.com/party/3']
+    for party_uri in party_uris:
+        db_access.create_party(party_uri)
+    rule_uris = ['http://example.com/rule/1', 'http://example.com/rule/2', 'http://example.com/rule/3']
+    for rule_uri in rule_uris:
+        db_access.create_rule(rule_uri, 'http://www.w3.org/ns/odrl/2/permission')
+    policy_uris = ['http://example.com/policy/1', 'http://example.com/policy/2']
+    for policy_uri in policy_uris:
+        db_access.create_policy(policy_uri)
+        db_access.set_policy_attribute(policy_uri, 'LABEL', policy_uri[-1])
+    db_access.add_rule_to_policy(rule_uris[0], policy_uris[0])
+    db_access.add_rule_to_policy(rule_uris[1], policy_uris[0])
+    db_access.add_rule_to_policy(rule_uris[2], policy_uris[1])
+    db_access.add_assignor_to_rule(party_uris[0], rule_uris[0])
+    db_access.add_assignee_to_rule(party_uris[0], rule_uris[1])
+    db_access.add_assignee_to_rule(party_uris[0], rule_uris[2])
+    db_access.add_assignor_to_rule(party_uris[1], rule_uris[2])
+
+    # Should list every party with the licences it is involved in, each licence only once
+    parties = {party['URI']: party for party in db_access.get_party_licence_map()}
+    assert set(parties) == set(party_uris)
+    assert sorted(licence['URI'] for licence in parties[party_uris[0]]['LICENCES']) == policy_uris
+    assert parties[party_uris[1]]['LICENCES'] == [{'URI': policy_uris[1], 'LABEL': '2'}]
+    assert parties[party_uris[2]] == {'ROWID': parties[party_uris[2]]['ROWID'], 'URI': party_uris[2], 'LABEL': None,
+                                      'COMMENT': None, 'LICENCES': []}
+
+    # Should only list the parties on the requested page
+    page = db_access.get_party_licence_map(parties[party_uris[0]]['ROWID'], 1)
+    assert [party['URI'] for party in page] == [party_uris[1]]
+    assert page[0]['LICENCES'] == [{'URI': policy_uris[1], 'LABEL': '2'}]
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_page(mock):
+    party_uris = ['https://example.com/party/' + str(i) for i in range(7)]
+    for party_uri in party_uris:
+        db_access.create_party(party_uri)
+
+    # Should return rows in the order they were added, after the given rowid
+    rows = db_access.get_page('PARTY', 0, 3)
+    assert [row['URI'] for row in rows] == party_uris[:3]
+    rows = db_access.get_page('PARTY', rows[-1]['ROWID'], 3)
+    assert [row['URI'] for row in rows] == party_uris[3:6]
+    assert [row['URI'] for row in db_access.get_page('PARTY', rows[-1]['ROWID'])] == party_uris[6:]
+
+    # Should return the last rowid of every full page
+    page_ends = db_access.get_page_ends('PARTY', 3)
+    assert page_ends == [row['ROWID'] for row in db_access.get_page('PARTY')][2:6:3]
+    assert db_access.get_page_ends('PARTY', 10) == []
+
+    # Should return the key a number of rows after another
+    assert db_access.get_key_after('PARTY', page_ends[0], 2) == page_ends[0] + 2
+    assert db_access.get_key_after('PARTY', page_ends[0], 5) is None
+
+    # Should return the position of a row
+    assert db_access.get_position('PARTY', party_uris[4]) == 5
+    assert db_access.get_position('PARTY', 'https://example.com/missing') == 0
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_page_by_label(mock):
+    # Should page through rows by label, ignoring case, then by rowid. Rows without a label are sorted by their URI.
+    for party_uri, label in [('https://example.com/party/1', 'b'), ('https://example.com/party/2', 'A'),
+                             ('https://example.com/party/3', None), ('https://example.com/party/4', 'b')]:
+        db_access.create_party(party_uri, label)
+    rows = db_access.get_page('PARTY', ('', 0), 2, 'label')
+    assert [row['URI'] for row in rows] == ['https://example.com/party/2', 'https://example.com/party/1']
+    rows = db_access.get_page('PARTY', (rows[-1]['LABEL'], rows[-1]['ROWID']), -1, 'label')
+    assert [row['URI'] for row in rows] == ['https://example.com/party/4', 'https://example.com/party/3']
+
+    rowids = {row['URI']: row['ROWID'] for row in db_access.get_page('PARTY')}
+    assert db_access.get_page_ends('PARTY', 2, 'label') == [('b', rowids['https://example.com/party/1']),
+                                                            ('https://example.com/party/3', rowids[rows[1]['URI']])]
+    assert db_access.get_position('PARTY', 'https://example.com/party/4', 'label') == 3
+    assert [party['URI'] for party in db_access.get_party_licence_map(('A', 0), 2, 'label')] == \
+        ['https://example.com/party/2', 'https://example.com/party/1']
+
 
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
 def test_add_assignor_to_rule(mock):
@@ -698,3 +889,49 @@ def test_get_party(mock):
     comment = 'This is a party.'
     db_access.create_party(uri, label, comment)
     assert db_access.get_party(uri) == {'URI': uri, 'LABEL': label, 'COMMENT': comment}
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_policies_by_text(mock):
+    permission = 'http://www.w3.org/ns/odrl/2/permission'
+    db_access.create_policy('http://example.com/licence/1')
+    db_access.set_policy_attribute('http://example.com/licence/1', 'LABEL', 'Creative Commons CC-BY-SA 3.0 Australia')
+    db_access.create_policy('http://example.com/licence/2')
+    db_access.set_policy_attribute('http://example.com/licence/2', 'LABEL', 'Open Licence')
+    db_access.set_policy_attribute('http://example.com/licence/2', 'COMMENT', 'Like Creative Commons, but shorter')
+    db_access.create_rule('http://example.com/rule/1', permission)
+    db_access.add_action_to_rule('http://www.w3.org/ns/odrl/2/watermark', 'http://example.com/rule/1')
+    db_access.create_party('http://example.com/party/1', 'Geoscience Australia')
+    db_access.add_assignor_to_rule('http://example.com/party/1', 'http://example.com/rule/1')
+    db_access.add_rule_to_policy('http://example.com/rule/1', 'http://example.com/licence/2')
+
+    # Should rank matches in labels above matches in comments
+    assert db_access.get_policies_by_text('"creative commons"') == \
+        ['http://example.com/licence/1', 'http://example.com/licence/2']
+    assert db_access.get_policies_by_text('"creative commons"', limit=1) == ['http://example.com/licence/1']
+
+    # Should find policies by the Actions and Parties their Rules use
+    assert db_access.get_policies_by_text('watermark') == ['http://example.com/licence/2']
+    assert db_access.get_policies_by_text('geoscience') == ['http://example.com/licence/2']
+    assert db_access.get_policies_by_text('australia') == \
+        ['http://example.com/licence/1', 'http://example.com/licence/2']
+
+    # Should keep the index up to date as policies change
+    db_access.set_policy_attribute('http://example.com/licence/1', 'LABEL', 'MIT License')
+    assert db_access.get_policies_by_text('australia') == ['http://example.com/licence/2']
+    db_access.delete_policy('http://example.com/licence/2')
+    assert db_access.get_policies_by_text('australia') == []
+    assert db_access.get_policies_by_text('mit') == ['http://example.com/licence/1']
+
+    # Should index existing rows again when migrating
+    create_database.create_search_table(mock_get_db())
+    assert db_access.get_policies_by_text('mit') == ['http://example.com/licence/1']
+    assert db_access.get_policies_by_text('watermark') == []
+
+    # Should keep the index in sync when rows are renumbered, as VACUUM may do to the rowids of the indexed tables
+    db_access.create_policy('http://example.com/licence/3')
+    db_access.set_policy_attribute('http://example.com/licence/3', 'LABEL', 'Apache License')
+    db_access.update_db('UPDATE POLICY SET rowid = rowid + 1000')
+    db_access.set_policy_attribute('http://example.com/licence/3', 'LABEL', 'BSD License')
+    assert db_access.get_policies_by_text('apache') == []
+    assert db_access.get_policies_by_text('bsd') == ['http://example.com/licence/3']
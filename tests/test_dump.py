@@ -0,0 +1,70 @@
+import gzip
+import io
+import json
+import _conf
+from controller import db_access, metrics, rdf_reader
+from unittest import mock
+from controller.offline_db_access import get_db as mock_get_db
+from model.record import json_default
+from rdflib.compare import isomorphic
+from app import app
+from tests.database import wipe_database
+from tests.test_rdf_reader import policies_graph
+from tests.test_rdf_writer import create_licences
+
+
+"""
+Tests the catalogue dump in dump.py and the /dump route.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+@mock.patch('controller.dump.BATCH_SIZE', 2)
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_dump_ntriples(mock):
+    create_licences()
+    expected = policies_graph()
+    parties = db_access.get_all_parties()
+    response = app.test_client().get('/dump')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/n-triples'
+    assert response.headers.get('Content-Encoding') is None
+
+    # Importing the dump should give back the same licences and parties
+    wipe_database()
+    assert rdf_reader.import_policies(io.BytesIO(response.data), 'nt') == {}
+    assert isomorphic(policies_graph(), expected)
+    assert sorted(db_access.get_all_parties(), key=str) == sorted(parties, key=str)
+
+
+@mock.patch('controller.dump.BATCH_SIZE', 2)
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_dump_json_lines(mock):
+    create_licences()
+    response = app.test_client().get('/dump', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    policies = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert policies == json.loads(json.dumps(db_access.get_policies_full(expand_parties=True), default=json_default))
+
+
+def test_dump_gzip():
+    create_licences()
+    client = app.test_client()
+    plain = client.get('/dump?_format=application/x-ndjson')
+    compressed = client.get('/dump?_format=application/x-ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert {'Accept', 'Accept-Encoding'} <= set(compressed.vary) and {'Accept', 'Accept-Encoding'} <= set(plain.vary)
+
+    # Clients which already have the latest dump shouldn't be sent it again. The dump isn't cached, so this isn't
+    # counted as a response cache lookup.
+    with mock.patch.object(_conf, 'METRICS', True):
+        metrics.clear()
+        response = client.get('/dump?_format=application/x-ndjson', headers={'If-None-Match': plain.headers['ETag']})
+        assert not any(name == 'licences_response_cache_lookups_total' for name, labels in metrics.collect())
+        metrics.clear()
+    assert response.status_code == 304
+    assert response.data == b''
+    assert {'Accept', 'Accept-Encoding'} <= set(response.vary)
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import pytest
+from controller import db_access, external_parties
+from controller.offline_db_access import get_db as mock_get_db
+from app import app
+
+
+"""
+Tests the cache of external parties in external_parties.py against a stub of the external catalogue running locally.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+ORGANISATIONS = [
+    {'view_taxonomy_term': 'http://example.com/org/1', 'name': 'Organisation 1', 'description__value': 'First'},
+    {'view_taxonomy_term': 'http://example.com/org/2', 'name': 'Organisation 2', 'description__value': None}
+]
+
+
+class StubCatalogue(BaseHTTPRequestHandler):
+    # Serves the server's organisations as JSON, or fails with the server's status if it has one, after its delay
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        if self.server.status:
+            self.send_response(self.server.status)
+            self.end_headers()
+            return
+        body = json.dumps(self.server.organisations).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCatalogue)
+    server.organisations = ORGANISATIONS
+    server.requests = 0
+    server.delay = 0
+    server.status = None
+    server.url = 'http://127.0.0.1:{}/org/json'.format(server.server_port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition):
+    # Waits for a background refresh to finish
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_fresh_parties_are_cached(stub_server):
+    cache = external_parties.ExternalParties(stub_server.url, ttl=60, timeout=1)
+    parties = cache.get()
+    assert parties['http://example.com/org/1'] == {'URI': 'http://example.com/org/1', 'LABEL': 'Organisation 1',
+                                                   'COMMENT': 'First'}
+    assert len(parties) == 2
+    assert cache.get() == parties
+    assert stub_server.requests == 1
+
+
+def test_stale_parties_are_refreshed_in_background(stub_server):
+    cache = external_parties.ExternalParties(stub_server.url, ttl=0, timeout=1)
+    old_parties = cache.get()
+    stub_server.organisations = ORGANISATIONS[:1]
+    stub_server.delay = 0.2
+    # The stale parties should be returned straight away while they are refreshed
+    started = time.monotonic()
+    assert cache.get() == old_parties
+    assert time.monotonic() - started < 0.2
+    wait_for(lambda: len(cache.get()) == 1)
+
+
+def test_timeout_and_circuit_breaker(stub_server):
+    stub_server.delay = 0.5
+    cache = external_parties.ExternalParties(stub_server.url, ttl=0, timeout=0.1)
+    started = time.monotonic()
+    assert cache.get() == {}
+    assert time.monotonic() - started < 0.5
+
+    # After too many failures in a row, the external catalogue shouldn't be tried again for a while
+    stub_server.delay = 0
+    stub_server.status = 500
+    stub_server.requests = 0
+    cache = external_parties.ExternalParties(stub_server.url, ttl=0, timeout=0.1)
+    for i in range(external_parties.FAILURE_THRESHOLD + 2):
+        assert cache.get() == {}
+    assert stub_server.requests == external_parties.FAILURE_THRESHOLD
+
+    # It should be tried again once it's time to retry
+    stub_server.status = None
+    with mock.patch('controller.external_parties.RETRY_AFTER', 0):
+        cache.clear()
+        assert len(cache.get()) == 2
+
+
+def test_refresh_after_error(stub_server):
+    # Should try again after an unexpected error, rather than waiting forever for the refresh to finish
+    cache = external_parties.ExternalParties(stub_server.url, ttl=0, timeout=1)
+    with mock.patch.object(cache, 'fetch', side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            cache.get()
+    assert len(cache.get()) == 2
+
+    # Should forget a refresh in progress when cleared
+    cache.clear()
+    cache._refreshing = True
+    cache.clear()
+    assert len(cache.get()) == 2
+    assert stub_server.requests == 2
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_create_licence_form(db_mock, stub_server):
+    db_access.create_party('http://example.com/org/1', 'Local organisation 1')
+    db_access.commit_db()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = 'admin'
+    cache = external_parties.ExternalParties(stub_server.url, ttl=60, timeout=1)
+    with mock.patch('controller.external_parties.cache', cache):
+        page = client.get('/licence/create').get_data(as_text=True)
+    # Parties already in the database should take precedence over external ones with the same URI
+    assert 'Local organisation 1' in page
+    assert 'Organisation 1' not in page.replace('Local organisation 1', '')
+    assert 'Organisation 2' in page
@@ -1,6 +1,8 @@
-from controller import functions
+import sqlite3
+from controller import db_access, functions, vocabulary
 from unittest import mock
 from controller.offline_db_access import get_db as mock_get_db
+from app import app
 
 
 """
@@ -11,6 +13,7 @@ All tests use the fixtures defined in conftest.py for setup and teardown.
 """
 
 
+@mock.patch('controller.functions.store_policies_json_ld')
 @mock.patch('controller.db_access.set_policy_attribute')
 @mock.patch('controller.db_access.create_policy')
 @mock.patch('controller.db_access.create_rule')
@@ -19,7 +22,7 @@ All tests use the fixtures defined in conftest.py for setup and teardown.
 @mock.patch('controller.db_access.add_assignee_to_rule')
 @mock.patch('controller.db_access.add_action_to_rule')
 @mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
-def test_create_policy(db_mock, add_action_to_rule_mock, add_assignee_to_rule_mock, add_assignor_to_rule_mock, add_rule_to_policy_mock, create_rule_mock, create_policy_mock, set_policy_attribute_mock):
+def test_create_policy(db_mock, add_action_to_rule_mock, add_assignee_to_rule_mock, add_assignor_to_rule_mock, add_rule_to_policy_mock, create_rule_mock, create_policy_mock, set_policy_attribute_mock, store_policies_json_ld_mock):
     # With no attributes
     policy_uri = 'http://example.com#policy'
     functions.create_policy(policy_uri)
@@ -51,8 +54,199 @@ def test_create_policy(db_mock, add_action_to_rule_mock, add_assignee_to_rule_mo
     add_rule_to_policy_mock.assert_called()
     add_assignor_to_rule_mock.assert_called()
     add_assignee_to_rule_mock.assert_called()
+    store_policies_json_ld_mock.assert_called_with([policy_uri])
 
 
 def test_uri_is_valid():
     assert functions.is_valid_uri('not a uri') is False
     assert functions.is_valid_uri('https://example.com#test') is True
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_filter_policies(mock):
+    permission = 'http://www.w3.org/ns/odrl/2/permission'
+    duty = 'http://www.w3.org/ns/odrl/2/duty'
+    read = 'http://www.w3.org/ns/odrl/2/read'
+    distribute = 'http://www.w3.org/ns/odrl/2/distribute'
+    attribution = 'http://creativecommons.org/ns#Attribution'
+    functions.create_policy('http://example.com#read-only', {'label': 'Read Only'}, [
+        {'TYPE_URI': permission, 'ACTIONS': [read]}
+    ])
+    functions.create_policy('http://example.com#attribution', {'label': 'Attribution'}, [
+        {'TYPE_URI': permission, 'ACTIONS': [read, distribute]},
+        {'TYPE_URI': duty, 'ACTIONS': [attribution]}
+    ])
+    with app.test_request_context():
+        # Should return every policy when there are no rules to filter by, ranked by number of differences
+        results = functions.filter_policies([])
+        assert [result['LABEL'] for result in results] == ['Read Only', 'Attribution']
+        assert [result['DIFFERENCES'] for result in results] == [1, 3]
+        assert results[1]['RULES'][0]['ACTIONS'][0]['URI'] in [read, distribute, attribution]
+
+        # Should only return policies which include all of the desired rules
+        results = functions.filter_policies([{'TYPE_URI': permission, 'ACTIONS': [{'URI': distribute}]}])
+        assert [(result['LABEL'], result['DIFFERENCES']) for result in results] == [('Attribution', 2)]
+        results = functions.filter_policies([{'TYPE_URI': duty, 'ACTIONS': [{'URI': read}]}])
+        assert results == []
+
+        # Should rank policies with fewer extra rules first
+        results = functions.filter_policies([{'TYPE_URI': permission, 'ACTIONS': [{'URI': read}]}])
+        assert [(result['LABEL'], result['DIFFERENCES']) for result in results] == [
+            ('Read Only', 0), ('Attribution', 2)
+        ]
+
+        # Should limit the number of results
+        assert len(functions.filter_policies([], num_results=1)) == 1
+
+        # Should skip the best matches when given an offset, and count every match
+        results, total = functions.search_policies([], num_results=1, offset=1)
+        assert [result['LABEL'] for result in results] == ['Attribution'] and total == 2
+        assert functions.search_policies([], offset=2) == ([], 2)
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_filter_policies_text(db_mock):
+    permission = 'http://www.w3.org/ns/odrl/2/permission'
+    read = 'http://www.w3.org/ns/odrl/2/read'
+    distribute = 'http://www.w3.org/ns/odrl/2/distribute'
+    functions.create_policy('http://example.com/licence/1', {'label': 'Creative Commons CC-BY-SA 3.0 Australia'}, [
+        {'TYPE_URI': permission, 'ACTIONS': [read, distribute]}
+    ])
+    functions.create_policy('http://example.com/licence/2', {'label': 'Creative Commons CC-BY 4.0'}, [
+        {'TYPE_URI': permission, 'ACTIONS': [read]}
+    ])
+    functions.create_policy('http://example.com/licence/3', {'label': 'MIT License'}, [
+        {'TYPE_URI': permission, 'ACTIONS': [read]}
+    ])
+    with app.test_request_context():
+        # Should match words as prefixes, with words joined by punctuation appearing together
+        results = functions.filter_policies([], text='CC-BY-SA 3.0 AU')
+        assert [(result['LABEL'], result['DIFFERENCES']) for result in results] == \
+            [('Creative Commons CC-BY-SA 3.0 Australia', 2)]
+        # Should rank closer matches (here the shorter label) first
+        assert [result['LABEL'] for result in functions.filter_policies([], text='creative')] == \
+            ['Creative Commons CC-BY 4.0', 'Creative Commons CC-BY-SA 3.0 Australia']
+
+        # Should only return policies which also include the desired rules
+        results = functions.filter_policies([{'TYPE_URI': permission, 'ACTIONS': [{'URI': distribute}]}], text='cc')
+        assert [(result['LABEL'], result['DIFFERENCES']) for result in results] == \
+            [('Creative Commons CC-BY-SA 3.0 Australia', 1)]
+
+        # Should ignore text with no words in it, and quotes in the text
+        assert len(functions.filter_policies([], text=' - ')) == 3
+        assert functions.filter_policies([], text='"MIT')[0]['LABEL'] == 'MIT License'
+        assert functions.get_text_query('CC-BY "SA') == '"CC-BY"* "\"\"SA"*'
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_filter_policies_after_create(db_mock):
+    permission = 'http://www.w3.org/ns/odrl/2/permission'
+    read = 'http://www.w3.org/ns/odrl/2/read'
+    distribute = 'http://www.w3.org/ns/odrl/2/distribute'
+    functions.create_policy('http://example.com#read-only', {'label': 'Read Only'}, [
+        {'TYPE_URI': permission, 'ACTIONS': [read]}
+    ])
+    with app.test_request_context():
+        functions.filter_policies([])
+        # Should add a new policy to the search index rather than rebuilding it, counting repeated pairs as differences
+        with mock.patch('controller.db_access.get_all_policy_actions') as get_all_policy_actions_mock:
+            functions.create_policy('http://example.com#read-twice', {'label': 'Read Twice'}, [
+                {'TYPE_URI': permission, 'ACTIONS': [read]},
+                {'TYPE_URI': permission, 'ACTIONS': [read, distribute]}
+            ])
+            results = functions.filter_policies([{'TYPE_URI': permission, 'ACTIONS': [{'URI': distribute}]}])
+            assert get_all_policy_actions_mock.call_count == 0
+        assert [(result['LABEL'], result['DIFFERENCES']) for result in results] == [('Read Twice', 2)]
+
+        # Should rebuild the index if the catalogue was changed some other way in between
+        db_access.create_policy('http://example.com#empty')
+        db_access.commit_db()
+        functions.create_policy('http://example.com#distribute', {'label': 'Distribute'}, [
+            {'TYPE_URI': permission, 'ACTIONS': [distribute]}
+        ])
+        results = functions.filter_policies([])
+        assert [result['DIFFERENCES'] for result in results] == [0, 1, 1, 3]
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_create_policies_bulk(mock):
+    permission = 'http://www.w3.org/ns/odrl/2/permission'
+    read = 'http://www.w3.org/ns/odrl/2/read'
+    assignor = {'URI': 'http://example.com/party/1', 'LABEL': 'Party 1', 'COMMENT': None}
+    functions.create_policy('http://example.com/licence/existing')
+    errors = functions.create_policies_bulk([
+        {'URI': 'http://example.com/licence/1', 'ATTRIBUTES': {'label': 'Licence 1'}, 'RULES': [
+            {'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read', 'Distribute'], 'ASSIGNORS': [assignor]},
+            {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/duty', 'ACTIONS': ['Attribution']}
+        ]},
+        {'URI': 'http://example.com/licence/2', 'RULES': [
+            {'TYPE_URI': permission, 'ACTIONS': [read], 'ASSIGNORS': [assignor], 'ASSIGNEES': [assignor]}
+        ]},
+        {'URI': 'http://example.com/licence/existing'},
+        {'URI': 'http://example.com/licence/1'},
+        {'URI': 'not a uri'},
+        {'URI': 'http://example.com/licence/bad-action', 'RULES': [{'TYPE_URI': permission, 'ACTIONS': ['Fly']}]},
+        {'URI': 'http://example.com/licence/bad-rule-type', 'RULES': [{'TYPE_LABEL': 'Suggestion', 'ACTIONS': []}]},
+        {'URI': 'http://example.com/licence/bad-attribute', 'ATTRIBUTES': {'colour': 'blue'}},
+        {'URI': 'http://example.com/licence/bad-type', 'ATTRIBUTES': {'type': 'http://example.com/type'}}
+    ])
+    # Should report every policy which could not be created without stopping the others
+    assert set(errors) == {'http://example.com/licence/existing', 'http://example.com/licence/1', 'not a uri',
+                           'http://example.com/licence/bad-action', 'http://example.com/licence/bad-rule-type',
+                           'http://example.com/licence/bad-attribute', 'http://example.com/licence/bad-type'}
+    assert errors['http://example.com/licence/bad-action'] == 'Cannot create policy - Action Fly is not permitted'
+    assert set(db_access.get_all_policies()) == {'http://example.com/licence/existing', 'http://example.com/licence/1',
+                                                 'http://example.com/licence/2'}
+
+    # Should create the same policies as create_policy()
+    policy_1, policy_2 = db_access.get_policies_full(['http://example.com/licence/1', 'http://example.com/licence/2'])
+    assert policy_1['LABEL'] == 'Licence 1' and policy_1['CREATED']
+    rules = {rule['TYPE_LABEL']: rule for rule in policy_1['RULES']}
+    assert set(rules) == {'Permission', 'Duty'}
+    assert {action['LABEL'] for action in rules['Permission']['ACTIONS']} == {'Read', 'Distribute'}
+    assert rules['Permission']['ASSIGNORS'] == (assignor['URI'],)
+    assert policy_2['RULES'][0]['ASSIGNEES'] == (assignor['URI'],)
+    assert db_access.get_party(assignor['URI']) == assignor
+    assert db_access.get_policy_json_ld('http://example.com/licence/2')['NODES']
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_create_policies_bulk_queries(db_mock):
+    # Should use the same number of queries however many policies are created
+    def count_queries(policies):
+        with mock.patch('controller.db_access.query_db', wraps=db_access.query_db) as query_db_mock, \
+                mock.patch('controller.db_access.update_db_many', wraps=db_access.update_db_many) as update_db_mock:
+            assert functions.create_policies_bulk(policies) == {}
+        return query_db_mock.call_count + update_db_mock.call_count
+
+    def licences(prefix, count):
+        return [{'URI': 'http://example.com/licence/' + prefix + str(i), 'ATTRIBUTES': {'label': 'Licence'}, 'RULES': [
+            {'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read'],
+             'ASSIGNEES': [{'URI': 'http://example.com/party/' + prefix + str(i), 'LABEL': None, 'COMMENT': None}]}
+        ]} for i in range(count)]
+
+    # The vocabulary is only loaded by the first call, so load it beforehand
+    vocabulary.get_vocabulary()
+    assert count_queries(licences('a', 2)) == count_queries(licences('b', 50))
+    assert len(db_access.get_all_policies()) == 52
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_create_policies_bulk_fallback(db_mock):
+    # When the batch can't be inserted in one go, policies should be inserted one at a time, leaving out those that fail
+    create_policies_full = db_access.create_policies_full
+
+    def fail_for_licence_2(policies, parties=()):
+        if any(policy['URI'] == 'http://example.com/licence/2' for policy in policies):
+            raise sqlite3.IntegrityError('FOREIGN KEY constraint failed')
+        create_policies_full(policies, parties)
+
+    with mock.patch('controller.db_access.create_policies_full', side_effect=fail_for_licence_2):
+        errors = functions.create_policies_bulk([
+            {'URI': 'http://example.com/licence/' + str(i),
+             'RULES': [{'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read']}]}
+            for i in range(1, 4)
+        ])
+    assert errors == {'http://example.com/licence/2': 'FOREIGN KEY constraint failed'}
+    assert set(db_access.get_all_policies()) == {'http://example.com/licence/1', 'http://example.com/licence/3'}
+    assert len(db_access.get_all_rules()) == 2
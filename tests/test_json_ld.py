@@ -0,0 +1,66 @@
+import json
+from controller import db_access, functions, json_ld
+from unittest import mock
+from controller.offline_db_access import get_db as mock_get_db
+from rdflib import Graph
+from rdflib.compare import isomorphic
+from tests.test_rdf_writer import create_licences
+from app import app
+
+
+"""
+Tests that json_ld.py builds the same RDF as the rdflib graphs built in functions.py. The documents are parsed with
+rdflib and compared with the graphs, ignoring blank node labels.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+def assert_same_rdf(document, graph):
+    assert isomorphic(Graph().parse(data=document, format='json-ld'), graph)
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_policy_document(mock):
+    create_licences()
+    for policy in db_access.get_policies_full():
+        # JSON-LD should have been stored when the licence was created
+        nodes_json = db_access.get_policy_json_ld(policy['URI'])['NODES']
+        assert nodes_json == json_ld.dumps(json_ld.policy_nodes(policy, policy['RULES']))
+        assert_same_rdf(json_ld.policy_document(nodes_json), functions.get_policy_rdf(policy, policy['RULES']))
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_register_documents(mock):
+    create_licences()
+    with app.test_request_context():
+        policies = db_access.get_policies_full()
+        entries = [json.loads(entry['REGISTER_ENTRY']) for entry in db_access.get_policy_register_entries()]
+        document = json_ld.policies_document(entries, 'http://localhost/licence/')
+        assert_same_rdf(document, functions.get_policies_rdf(policies))
+
+        actions = db_access.get_all_actions()
+        document = json_ld.actions_document(actions, 'http://localhost/action/')
+        assert_same_rdf(document, functions.get_actions_rdf(actions))
+
+        parties = db_access.get_all_parties()
+        document = json_ld.parties_document(parties, 'http://localhost/party/')
+        assert_same_rdf(document, functions.get_parties_rdf(parties))
+
+
+def test_json_ld_views():
+    create_licences()
+    with mock.patch('controller.db_access.get_db', side_effect=mock_get_db):
+        # Licences created before JSON-LD was stored should still be shown
+        db_access.query_db('DELETE FROM POLICY_JSON_LD WHERE POLICY_URI = ?', ('http://example.com/licence/2',))
+        db_access.commit_db()
+        policies = db_access.get_policies_full()
+    client = app.test_client()
+    response = client.get('/licence/?uri=http://example.com/licence/2&_format=application/ld%2Bjson')
+    assert response.status_code == 200
+    assert_same_rdf(response.get_data(as_text=True), functions.get_policy_rdf(policies[1], policies[1]['RULES']))
+    response = client.get('/licence/?_format=application/ld%2Bjson')
+    assert response.status_code == 200
+    with app.test_request_context():
+        assert_same_rdf(response.get_data(as_text=True), functions.get_policies_rdf(policies))
+    assert client.get('/licence/?uri=http://example.com/missing&_format=application/ld%2Bjson').status_code == 404
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import pytest
+import _conf
+from controller import db_access, mail_queue
+from controller.offline_db_access import get_db as mock_get_db
+from app import app
+
+
+"""
+Tests the outbox in mail_queue.py against a fake Mailjet API running locally.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+class FakeMailjet(BaseHTTPRequestHandler):
+    # Accepts messages like the Mailjet Send API, failing with the server's status or for recipients in its bounces
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.server.delay)
+        self.server.batches.append(body['Messages'])
+        if self.server.status:
+            self.send_response(self.server.status)
+            self.end_headers()
+            return
+        statuses = [{'Status': 'error' if message['To'][0]['Email'] in self.server.bounces else 'success'}
+                    for message in body['Messages']]
+        response = json.dumps({'Messages': statuses}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mailjet():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeMailjet)
+    server.batches = []
+    server.delay = 0
+    server.status = None
+    server.bounces = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    secrets = {'API_ENDPOINT': 'http://127.0.0.1:{}/v3.1/send'.format(server.server_port),
+               'MJ_APIKEY_PUBLIC': 'public', 'MJ_APIKEY_PRIVATE': 'private'}
+    with mock.patch.object(_conf, 'MAILJET_SECRETS', secrets), \
+            mock.patch.object(_conf, 'MAILJET_EMAIL_SENDER', 'sender@example.com'), \
+            mock.patch.object(_conf, 'MAILJET_EMAIL_RECEIVERS', ['receiver@example.com']):
+        yield server
+        mail_queue.stop_worker()
+    server.shutdown()
+    server.server_close()
+
+
+def queue_messages(recipients):
+    for recipient in recipients:
+        message = dict(mail_queue.contact_message('Name', 'someone@example.com', 'Hello'), To=[{'Email': recipient}])
+        db_access.add_to_outbox(json.dumps(message))
+    db_access.commit_db(catalogue_changed=False)
+
+
+def test_contact_submit(mailjet):
+    mailjet.delay = 0.5
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_csrf_token'] = 'token'
+    started = time.monotonic()
+    response = client.post('/contact_submit', data={'name': 'Name', 'email': 'someone@example.com', 'message': 'Hi',
+                                                    '_csrf_token': 'token'})
+    # The email should only be queued by the request, then sent in the background
+    assert response.status_code == 302
+    assert time.monotonic() - started < 0.5
+    with app.app_context():
+        assert len(db_access.get_outbox()) == 1
+        deadline = time.monotonic() + 5
+        while db_access.get_outbox() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert db_access.get_outbox() == []
+    assert mailjet.batches[0][0]['Subject'] == '[Licence Catalogue Contact Form] Enquiry from someone@example.com'
+    assert 'Hi' in mailjet.batches[0][0]['TextPart']
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_batches(db_mock, mailjet):
+    queue_messages(['{}@example.com'.format(i) for i in range(mail_queue.BATCH_SIZE + 10)])
+    catalogue_version = db_access.get_catalogue_version()['VERSION']
+    worker = mail_queue.MailWorker(app)
+    assert worker.send_due() == mail_queue.BATCH_SIZE
+    assert worker.send_due() == 10
+    assert worker.send_due() == 0
+    assert [len(batch) for batch in mailjet.batches] == [mail_queue.BATCH_SIZE, 10]
+    assert db_access.get_outbox() == []
+    # Sending emails doesn't change the catalogue, so caches should be left alone
+    assert db_access.get_catalogue_version()['VERSION'] == catalogue_version
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_retries(db_mock, mailjet):
+    queue_messages(['1@example.com', 'bounce@example.com'])
+    worker = mail_queue.MailWorker(app)
+
+    # When Mailjet fails, every email should be tried again later, waiting longer after each attempt
+    mailjet.status = 500
+    started = time.time()
+    assert worker.send_due() == 2
+    assert worker.send_due() == 0
+    emails = db_access.get_outbox()
+    assert [email['ATTEMPTS'] for email in emails] == [1, 1]
+    assert emails[0]['LAST_ERROR'] == 'HTTP 500'
+    assert emails[0]['NEXT_ATTEMPT'] >= started + mail_queue.RETRY_DELAY
+
+    # Only the emails Mailjet couldn't send should be tried again
+    mailjet.status = None
+    mailjet.bounces = ['bounce@example.com']
+    with mock.patch('controller.mail_queue.RETRY_DELAY', 0):
+        db_access.mark_outbox_failed([(email['ID'], 'HTTP 500', 0) for email in emails])
+        db_access.commit_db(catalogue_changed=False)
+        emails_before = emails
+        assert worker.send_due() == 2
+        emails = db_access.get_outbox()
+        assert [email['ID'] for email in emails] == [emails_before[1]['ID']]
+        assert emails[0]['LAST_ERROR'] == 'Mailjet status: error'
+
+        # Emails should be given up on after too many attempts
+        with mock.patch('controller.mail_queue.MAX_ATTEMPTS', 4):
+            while worker.send_due():
+                pass
+        assert db_access.get_outbox()[0]['ATTEMPTS'] == 4
+    assert [len(batch) for batch in mailjet.batches] == [2, 2, 1, 1]
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_claims_count_as_attempts(db_mock):
+    # Emails claimed by workers which never finish sending them should still be given up on
+    queue_messages(['1@example.com'])
+    for i in range(mail_queue.MAX_ATTEMPTS):
+        assert len(db_access.claim_outbox(time.time(), 0, 10, mail_queue.MAX_ATTEMPTS)) == 1
+    assert db_access.claim_outbox(time.time(), 0, 10, mail_queue.MAX_ATTEMPTS) == []
+    assert db_access.get_outbox()[0]['ATTEMPTS'] == mail_queue.MAX_ATTEMPTS
@@ -0,0 +1,120 @@
+import multiprocessing
+import threading
+from unittest import mock
+import pytest
+import _conf
+from controller import functions, metrics
+from controller.offline_db_access import get_db as mock_get_db
+from app import app
+
+
+"""
+Tests the metrics collected in metrics.py and exposed at /metrics
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    with mock.patch.object(_conf, 'METRICS', True), mock.patch.object(_conf, 'METRICS_DIR', None):
+        metrics.clear()
+        yield
+        metrics.clear()
+
+
+def observe_queries(count):
+    for _ in range(count):
+        metrics.observe('licences_db_query_duration_seconds', 0.002)
+
+
+def test_write_metrics():
+    metrics.observe('licences_request_duration_seconds', 0.003, 'licence', 'text/turtle')
+    metrics.observe('licences_request_duration_seconds', 0.2, 'licence', 'text/turtle')
+    metrics.observe('licences_request_duration_seconds', 20, 'licence', 'text/turtle')
+    metrics.observe('licences_response_cache_lookups_total', 1, 'hit')
+    metrics.observe('licences_response_cache_lookups_total', 1, 'hit')
+    lines = metrics.write_metrics(metrics.collect()).splitlines()
+
+    # Buckets should be cumulative, ending with +Inf
+    labels = 'route="licence",media_type="text/turtle"'
+    assert '# TYPE licences_request_duration_seconds histogram' in lines
+    assert 'licences_request_duration_seconds_bucket{' + labels + ',le="0.001"} 0' in lines
+    assert 'licences_request_duration_seconds_bucket{' + labels + ',le="0.005"} 1' in lines
+    assert 'licences_request_duration_seconds_bucket{' + labels + ',le="0.25"} 2' in lines
+    assert 'licences_request_duration_seconds_bucket{' + labels + ',le="+Inf"} 3' in lines
+    assert 'licences_request_duration_seconds_count{' + labels + '} 3' in lines
+    assert 'licences_request_duration_seconds_sum{' + labels + '} 20.203' in lines
+    assert 'licences_response_cache_lookups_total{result="hit"} 2' in lines
+
+
+def test_threads():
+    threads = [threading.Thread(target=observe_queries, args=(100,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    observe_queries(10)
+
+    # Should add up the counts of every thread, including those which have ended, and only count those once
+    assert sum(metrics.collect()[('licences_db_query_duration_seconds', ())][:-1]) == 410
+    assert sum(metrics.collect()[('licences_db_query_duration_seconds', ())][:-1]) == 410
+
+
+def observe_in_worker():
+    observe_queries(5)
+    metrics.flush(force=True)
+
+
+def test_processes(tmp_path):
+    with mock.patch.object(_conf, 'METRICS_DIR', str(tmp_path)):
+        observe_queries(1)
+        metrics.flush(force=True)
+        for _ in range(2):
+            worker = multiprocessing.get_context('fork').Process(target=observe_in_worker)
+            worker.start()
+            worker.join()
+        observe_queries(1)
+
+        # Should add up every worker's file with this process' live counts, without counting its own file twice
+        assert len(list(tmp_path.glob('*.json'))) == 3
+        assert sum(metrics.collect()[('licences_db_query_duration_seconds', ())][:-1]) == 12
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_metrics_route(db_mock):
+    functions.create_policy('http://example.com/licence/1', {'label': 'Licence'}, [
+        {'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read']}
+    ])
+    metrics.clear()
+    client = app.test_client()
+    for _ in range(2):
+        client.get('/licence/', query_string={'uri': 'http://example.com/licence/1', '_format': 'text/turtle'})
+    client.get('/action/', query_string={'_format': 'application/n-triples'}).get_data()
+    client.get('/party/')
+    headers = {'Authorization': 'Bearer secret'}
+    with mock.patch.object(_conf, 'METRICS_TOKEN', 'secret'):
+        response = client.get('/metrics', headers=headers)
+    assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert 'licences_request_duration_seconds_count{route="licence",media_type="text/turtle"} 2' in lines
+    assert 'licences_request_duration_seconds_count{route="action",media_type="application/n-triples"} 1' in lines
+    assert 'licences_request_duration_seconds_count{route="party",media_type="text/html"} 1' in lines
+    assert 'licences_response_cache_lookups_total{result="miss"} 2' in lines
+    assert 'licences_response_cache_lookups_total{result="hit"} 1' in lines
+    assert 'licences_rdf_serialisation_seconds_count{media_type="text/turtle"} 1' in lines
+    assert 'licences_response_size_bytes_count{route="action",media_type="application/n-triples"} 1' in lines
+    query_count = next(line for line in lines if line.startswith('licences_db_query_duration_seconds_count'))
+    assert int(query_count.split()[-1]) > 0
+
+    # Should not be available when turned off
+    with mock.patch.object(_conf, 'METRICS', False):
+        assert client.get('/metrics').status_code == 404
+
+    # Should only be served to requests with the token, even from the same machine, and to no one without a token
+    with mock.patch.object(_conf, 'METRICS_TOKEN', 'secret'):
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+        assert client.get('/metrics', headers=headers, environ_base={'REMOTE_ADDR': '192.0.2.1'}).status_code == 200
+    assert client.get('/metrics').status_code == 403
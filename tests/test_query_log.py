@@ -0,0 +1,85 @@
+import logging
+from unittest import mock
+import _conf
+from controller import db_access, functions, query_log
+from controller.offline_db_access import get_db as mock_get_db
+from app import app
+
+
+"""
+Tests the SQL instrumentation in query_log.py
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def create_licence(db_mock):
+    functions.create_policy('http://example.com/licence/1', {'label': 'Licence'}, [
+        {'TYPE_LABEL': 'Permission', 'ACTIONS': ['Read', 'Distribute']}
+    ])
+
+
+def test_request_queries():
+    queries = query_log.RequestQueries('GET', '/action/')
+    for i in range(query_log.SLOWEST_KEPT + 3):
+        queries.add('SELECT ' + str(i), i / 1000)
+
+    # Should count every query but only keep the slowest, slowest first
+    summary = queries.summary()
+    assert summary['QUERIES'] == query_log.SLOWEST_KEPT + 3
+    assert summary['TOTAL_MS'] == sum(range(query_log.SLOWEST_KEPT + 3))
+    assert [query['STATEMENT'] for query in summary['SLOWEST']] == \
+        ['SELECT ' + str(i) for i in reversed(range(3, query_log.SLOWEST_KEPT + 3))]
+    assert queries.server_timing().startswith('db;desc="{} queries";dur='.format(query_log.SLOWEST_KEPT + 3))
+
+
+def test_disabled():
+    client = app.test_client()
+    with mock.patch.object(_conf, 'SQL_INSTRUMENTATION', False):
+        response = client.get('/action/', query_string={'_format': 'application/json'})
+        assert 'Server-Timing' not in response.headers
+        assert client.get('/_debug/queries').status_code == 404
+
+
+def test_instrumented_requests():
+    create_licence()
+    query_log.clear()
+    client = app.test_client()
+    with mock.patch.object(_conf, 'SQL_INSTRUMENTATION', True), mock.patch.object(_conf, 'SLOW_QUERY_MS', 10000):
+        response = client.get('/licence/', query_string={'uri': 'http://example.com/licence/1',
+                                                         '_format': 'application/json'})
+        assert response.headers['Server-Timing'].startswith('db;desc="')
+        with mock.patch('controller.db_access.query_db', side_effect=db_access.query_db) as query_mock:
+            client.get('/action/', query_string={'_format': 'text/turtle'})
+        requests = client.get('/_debug/queries').get_json()['requests']
+
+    # Should list the most recent requests first, with every query they ran
+    assert [request['PATH'] for request in requests] == \
+        ['/action/?_format=text/turtle', '/licence/?uri=http://example.com/licence/1&_format=application/json']
+    assert requests[0]['QUERIES'] == query_mock.call_count
+    # Each time is rounded to the microsecond
+    slowest_ms = sum(query['MS'] for query in requests[0]['SLOWEST'])
+    assert requests[0]['TOTAL_MS'] >= slowest_ms - 0.001 * query_log.SLOWEST_KEPT
+    assert all(query['STATEMENT'].startswith('SELECT') for query in requests[0]['SLOWEST'])
+
+
+def test_slow_query_log(caplog):
+    create_licence()
+    with mock.patch.object(_conf, 'SQL_INSTRUMENTATION', True), mock.patch.object(_conf, 'SLOW_QUERY_MS', 0), \
+            caplog.at_level(logging.WARNING, logger='slow_queries'):
+        with app.test_request_context('/action/'):
+            db_access.get_policies_for_rule('http://example.com/rule/1')
+
+    # Should log every query over the threshold along with its query plan
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert ' in /action/: SELECT' in message
+    assert 'SEARCH' in message or 'SCAN' in message
+
+
+def test_explain():
+    conn = mock_get_db()
+    plan = query_log.explain(conn, 'SELECT * FROM POLICY WHERE URI = ?', ('http://example.com/licence/1',))
+    assert plan.startswith('SEARCH POLICY USING INDEX')
+    assert query_log.explain(conn, 'SELECT * FROM MISSING').startswith('Query plan not available')
@@ -0,0 +1,72 @@
+import io
+from controller import db_access, json_ld, rdf_reader, rdf_writer
+from unittest import mock
+from controller.offline_db_access import get_db as mock_get_db
+from rdflib import Graph
+from rdflib.compare import isomorphic
+from tests.database import wipe_database
+from tests.test_rdf_writer import create_licences
+
+
+"""
+Tests that licences written by rdf_writer.py and json_ld.py are imported by rdf_reader.py unchanged.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+def policies_graph():
+    # All the policies in the catalogue as one graph, with rules as blank nodes so rule URIs don't matter
+    graph = Graph()
+    for policy in db_access.get_policies_full():
+        graph.parse(data=''.join(rdf_writer.write_ntriples(rdf_writer.policy_statements(policy, policy['RULES']))),
+                    format='nt')
+    return graph
+
+
+def export(rdf_format):
+    # Writes all the policies, and the party register, in the given format
+    policies = db_access.get_policies_full()
+    if rdf_format == 'json-ld':
+        nodes = [node for policy in policies for node in json_ld.policy_nodes(policy, policy['RULES'])]
+        return json_ld.policy_document(json_ld.dumps(nodes)).encode('utf-8')
+    statements = [statement for policy in policies
+                  for statement in rdf_writer.policy_statements(policy, policy['RULES'])]
+    statements.extend(rdf_writer.parties_statements(db_access.get_all_parties(), 'http://localhost/party/'))
+    write = rdf_writer.write_turtle if rdf_format == 'turtle' else rdf_writer.write_ntriples
+    return ''.join(write(statements)).encode('utf-8')
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_round_trip(mock):
+    create_licences()
+    expected = policies_graph()
+    parties = db_access.get_all_parties()
+    for rdf_format in rdf_reader.FORMATS:
+        data = export(rdf_format)
+        wipe_database()
+        assert rdf_reader.import_policies(io.BytesIO(data), rdf_format) == {}
+        assert isomorphic(policies_graph(), expected)
+        if rdf_format != 'json-ld':
+            # Parties should keep their labels and comments when the party register is included
+            assert sorted(db_access.get_all_parties(), key=str) == sorted(parties, key=str)
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_import_errors(db_mock):
+    data = '''
+        <http://example.com/licence/1> <{type}> <{policy}> .
+        <http://example.com/licence/1> <http://www.w3.org/ns/odrl/2/permission> _:rule .
+        _:rule <http://www.w3.org/ns/odrl/2/action> <http://example.com/not-an-action> .
+        <http://example.com/licence/2> <{type}> <{policy}> .
+        _:policy <{type}> <{policy}> .
+    '''.format(type='http://www.w3.org/1999/02/22-rdf-syntax-ns#type', policy='http://www.w3.org/ns/odrl/2/Policy')
+    with mock.patch('controller.rdf_reader.BATCH_SIZE', 1):
+        errors = rdf_reader.import_policies(io.BytesIO(data.encode('utf-8')), 'nt')
+    # Should report the policies which couldn't be imported and still import the rest
+    assert len(errors) == 2
+    assert errors['http://example.com/licence/1'] == \
+        'Action with URI http://example.com/not-an-action is not permitted.'
+    assert [error for uri, error in errors.items() if uri.startswith('_:')] == \
+        ['Cannot create policy - Policy has no URI']
+    assert db_access.get_all_policies() == ['http://example.com/licence/2']
@@ -0,0 +1,107 @@
+from controller import db_access, functions, rdf_writer
+from unittest import mock
+from controller.offline_db_access import get_db as mock_get_db
+from rdflib import Graph
+from rdflib.compare import isomorphic
+from app import app
+
+
+"""
+Tests that rdf_writer.py writes the same RDF as the rdflib graphs built in functions.py. The output of the writer is
+parsed with rdflib and compared with the graph, ignoring blank node labels.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+# Values which need escaping in Turtle and N-Triples
+TRICKY_LABEL = 'A "quoted" licence\\ with a\nnew line, a\rcarriage return, a\ttab and ünicode ✓'
+TRICKY_COMMENT = 'Ends with a quote"'
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def create_licences(mock):
+    functions.create_policy('http://example.com/licence/1', {
+        'type': 'http://creativecommons.org/ns#License',
+        'label': TRICKY_LABEL,
+        'comment': TRICKY_COMMENT,
+        'jurisdiction': 'http://example.com/jurisdiction',
+        'legal_code': 'http://example.com/legal_code',
+        'has_version': '1.0',
+        'language': 'http://example.com/language',
+        'see_also': 'http://example.com/see_also',
+        'same_as': 'http://example.com/same_as',
+        'logo': 'http://example.com/logo.png',
+        'status': 'http://example.com/status',
+        'creator': 'http://example.com/creator'
+    }, [
+        {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/permission', 'ACTIONS': ['Read', 'Distribute'],
+         'ASSIGNORS': [{'URI': 'http://example.com/party/1', 'LABEL': TRICKY_LABEL, 'COMMENT': None}],
+         'ASSIGNEES': [{'URI': 'http://example.com/party/2', 'LABEL': None, 'COMMENT': TRICKY_COMMENT}]},
+        {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/permission', 'ACTIONS': ['Read']},
+        {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/duty', 'ACTIONS': ['Attribution']},
+        {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/prohibition', 'ACTIONS': []}
+    ])
+    functions.create_policy('http://example.com/licence/2', {'label': 'Licence 2'}, [
+        {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/permission', 'ACTIONS': ['Read']}
+    ])
+    functions.create_policy('http://example.com/licence/3')
+
+
+def assert_same_rdf(statements, graph):
+    # Writes the statements in both formats and checks they parse to the same graph
+    statements = list(statements)
+    turtle = ''.join(rdf_writer.write_turtle(statements))
+    assert isomorphic(Graph().parse(data=turtle, format='turtle'), graph)
+    ntriples = ''.join(rdf_writer.write_ntriples(statements))
+    assert isomorphic(Graph().parse(data=ntriples, format='nt'), graph)
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_policy_statements(mock):
+    create_licences()
+    for policy in db_access.get_policies_full():
+        statements = rdf_writer.policy_statements(policy, policy['RULES'])
+        assert_same_rdf(statements, functions.get_policy_rdf(policy, policy['RULES']))
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_register_statements(mock):
+    create_licences()
+    with app.test_request_context():
+        policies = db_access.get_policies_full()
+        register_uri = 'http://localhost/licence/'
+        assert_same_rdf(rdf_writer.policies_statements(policies, register_uri), functions.get_policies_rdf(policies))
+
+        actions = db_access.get_all_actions()
+        register_uri = 'http://localhost/action/'
+        assert_same_rdf(rdf_writer.actions_statements(actions, register_uri), functions.get_actions_rdf(actions))
+
+        parties = db_access.get_all_parties()
+        register_uri = 'http://localhost/party/'
+        assert_same_rdf(rdf_writer.parties_statements(parties, register_uri), functions.get_parties_rdf(parties))
+
+        # Should also match when there is nothing in the register
+        assert_same_rdf(rdf_writer.parties_statements([], register_uri), functions.get_parties_rdf([]))
+
+
+def test_chunks():
+    # Output should be split into chunks but not change
+    statements = [('<http://example.com/{}>'.format(i), '<http://example.com/p>', rdf_writer.literal(i))
+                  for i in range(10000)]
+    chunks = list(rdf_writer.write_ntriples(statements))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == ''.join('{} {} {} .\n'.format(*statement) for statement in statements)
+
+
+def test_streamed_views():
+    create_licences()
+    client = app.test_client()
+    for url in ['/licence/?uri=http://example.com/licence/1&', '/licence/?', '/action/?', '/party/?']:
+        for media_type, rdf_format in [('text/turtle', 'turtle'), ('application/n-triples', 'nt')]:
+            response = client.get(url + '_format=' + media_type)
+            assert response.status_code == 200
+            assert response.mimetype == media_type
+            Graph().parse(data=response.get_data(as_text=True), format=rdf_format)
+
+            # Once streamed, the view should be served from the cache
+            assert client.get(url + '_format=' + media_type).data == response.data
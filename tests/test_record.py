@@ -0,0 +1,68 @@
+import json
+import pickle
+import pytest
+from app import app
+from model.action import Action
+from model.record import json_default
+
+
+def make_action(label='Read'):
+    return Action(URI='http://www.w3.org/ns/odrl/2/read', LABEL=label, DEFINITION='To obtain data from the Asset.')
+
+
+def test_record_immutable():
+    action = make_action()
+    with pytest.raises(AttributeError):
+        action.LABEL = 'Write'
+    with pytest.raises(AttributeError):
+        del action.LABEL
+    assert action.LABEL == 'Read'
+
+    # Should return a changed copy, leaving the original alone
+    changed = action.replace(LABEL='Write')
+    assert changed.LABEL == 'Write'
+    assert changed.URI == action.URI
+    assert action.LABEL == 'Read'
+
+    # Should only have the fields it was made with
+    with pytest.raises(TypeError):
+        Action(URI='http://www.w3.org/ns/odrl/2/read', COMMENT='Not a field')
+
+
+def test_record_mapping():
+    action = make_action()
+    assert action == {
+        'URI': 'http://www.w3.org/ns/odrl/2/read',
+        'LABEL': 'Read',
+        'DEFINITION': 'To obtain data from the Asset.'
+    }
+    assert action['LABEL'] == action.LABEL
+    assert action != make_action('Write')
+    with pytest.raises(KeyError):
+        action['COMMENT']
+
+
+def test_record_intern():
+    values = ('http://www.w3.org/ns/odrl/2/read', 'Read', 'To obtain data from the Asset.')
+    action = Action.intern(*values)
+    assert Action.intern(*values) is action
+    assert Action.intern(values[0], 'Write', values[2]) is not action
+    assert action == make_action()
+
+
+def test_record_pickle():
+    action = make_action()
+    restored = pickle.loads(pickle.dumps(action))
+    assert type(restored) is Action
+    assert restored == action
+
+
+def test_record_json():
+    action = make_action()
+    assert json.loads(json.dumps([action], default=json_default)) == [dict(action)]
+    with pytest.raises(TypeError):
+        json.dumps(object(), default=json_default)
+
+    # Should write records in jsonify() responses
+    with app.app_context():
+        assert json.loads(app.json.dumps({'ACTIONS': [action]})) == {'ACTIONS': [dict(action)]}
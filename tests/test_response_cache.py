@@ -0,0 +1,43 @@
+from controller.response_cache import ResponseCache, ENTRY_OVERHEAD
+
+
+def test_get_and_put():
+    cache = ResponseCache(1024 * 1024)
+    key = ('controller.licence_routes', 'http://localhost/', None, 'text/turtle')
+    assert cache.get(key, 1) is None
+
+    # Should return what was stored for the same version
+    cache.put(key, 1, 'value', 5)
+    assert cache.get(key, 1) == 'value'
+
+    # Should empty the cache once the catalogue version changes
+    assert cache.get(key, 2) is None
+    assert len(cache) == 0
+
+    # Should ignore anything from an older version
+    cache.put(key, 1, 'value', 5)
+    assert cache.get(key, 2) is None
+    assert cache.get(key, 1) is None
+
+
+def test_eviction():
+    cache = ResponseCache(3 * (ENTRY_OVERHEAD + 100))
+    for i in range(3):
+        cache.put(i, 1, str(i), 100)
+    assert len(cache) == 3
+
+    # Should evict the least recently used entry when over budget
+    cache.get(0, 1)
+    cache.put(3, 1, '3', 100)
+    assert cache.get(1, 1) is None
+    assert [cache.get(i, 1) for i in [0, 2, 3]] == ['0', '2', '3']
+    assert cache.size <= cache.max_bytes
+
+    # Should not store anything bigger than the budget
+    cache.put(4, 1, '4', cache.max_bytes)
+    assert cache.get(4, 1) is None
+
+    # Should not store anything if the budget is 0
+    cache = ResponseCache(0)
+    cache.put(0, 1, '0', 1)
+    assert cache.get(0, 1) is None
@@ -0,0 +1,271 @@
+import json
+from controller import db_access, functions, pagination
+from unittest import mock
+from controller.offline_db_access import get_db as mock_get_db
+from app import app
+
+
+"""
+Tests for the views in routes.py, run through the Flask test client.
+Data is set up with the offline version of get_db (see test_db_access.py) and committed before the views are requested.
+
+All tests use the fixtures defined in conftest.py for setup and teardown.
+"""
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def create_licences(start, count, mock):
+    # Creates a number of licences, each with a permission and a duty
+    for i in range(start, start + count):
+        functions.create_policy('http://example.com/licence/' + str(i), {'label': 'Licence ' + str(i)}, [
+            {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/permission', 'ACTIONS': ['Read', 'Distribute']},
+            {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/duty', 'ACTIONS': ['Attribution']}
+        ])
+
+
+def count_queries(url):
+    # Requests the URL and returns the number of database queries made while responding
+    with mock.patch('controller.db_access.query_db', side_effect=db_access.query_db) as query_mock:
+        response = app.test_client().get(url)
+    assert response.status_code == 200
+    return query_mock.call_count
+
+
+def test_action_register():
+    create_licences(0, 1)
+    response = app.test_client().get('/action/')
+    assert response.status_code == 200
+    assert b'Licence 0' in response.data
+
+    # Should make the same number of queries no matter how many licences use each action
+    queries = count_queries('/action/')
+    create_licences(1, 20)
+    assert count_queries('/action/') == queries
+
+
+def test_party_register():
+    create_licences(0, 1)
+    with mock.patch('controller.db_access.get_db', side_effect=mock_get_db):
+        db_access.create_party('http://example.com/party/1', 'Party 1')
+        for rule_uri in db_access.get_rules_for_policy('http://example.com/licence/0'):
+            db_access.add_assignor_to_rule('http://example.com/party/1', rule_uri)
+        db_access.commit_db()
+    response = app.test_client().get('/party/')
+    assert response.status_code == 200
+    # The party is on both rules of the licence but the licence should only be listed once
+    assert response.data.count(b'Licence 0') == 1
+
+    # Should make the same number of queries no matter how many parties and licences there are
+    queries = count_queries('/party/')
+    create_licences(1, 20)
+    with mock.patch('controller.db_access.get_db', side_effect=mock_get_db):
+        db_access.create_party('http://example.com/party/2', 'Party 2')
+        db_access.add_assignee_to_rule('http://example.com/party/2', db_access.get_all_rules()[-1])
+        db_access.commit_db()
+    assert count_queries('/party/') == queries
+
+
+def test_cached_views():
+    create_licences(0, 1)
+    for url in ['/licence/?_format=text/turtle', '/licence/?_format=application/json&uri=http://example.com/licence/0',
+                '/action/?_format=application/json', '/party/?_format=text/turtle']:
+        response = app.test_client().get(url)
+        assert response.status_code == 200
+
+        # Should serve the same view again from the cache, only checking the catalogue version
+        assert count_queries(url) == 1
+        assert app.test_client().get(url).data == response.data
+
+    # Should rebuild views once the catalogue changes
+    url = '/licence/?_format=application/json'
+    assert b'Licence 1' not in app.test_client().get(url).data
+    create_licences(1, 1)
+    assert b'Licence 1' in app.test_client().get(url).data
+
+    # Should not cache missing licences
+    assert app.test_client().get('/licence/?_format=text/turtle&uri=http://example.com/missing').status_code == 404
+
+
+def test_conditional_views():
+    create_licences(0, 1)
+    client = app.test_client()
+    for url in ['/licence/?_format=text/turtle', '/licence/?_format=application/json&uri=http://example.com/licence/0',
+                '/action/?_format=application/ld%2Bjson', '/party/?_format=application/json']:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers['ETag']
+        assert response.headers['Last-Modified']
+
+        # Should respond with 304 Not Modified if the client already has the latest version
+        not_modified = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+        assert not_modified.status_code == 304
+        assert not_modified.data == b''
+        # Views are chosen by the Accept header, so shouldn't be shared between media types by caches
+        assert 'Accept' in response.vary and 'Accept' in not_modified.vary
+        not_modified = client.get(url, headers={'If-Modified-Since': response.headers['Last-Modified']})
+        assert not_modified.status_code == 304
+
+    assert 'Accept' in client.get('/licence/', headers={'Accept': 'text/html'}).vary
+
+    # Should respond in full once the catalogue changes
+    url = '/licence/?_format=application/json'
+    etag = client.get(url).headers['ETag']
+    create_licences(1, 1)
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def get_link(response, rel):
+    # Returns the URL of a link in the Link header, or None if there isn't one
+    for link in response.headers.get('Link', '').split(', '):
+        if link.endswith('; rel="{rel}"'.format(rel=rel)):
+            return link[1:link.index('>')]
+    return None
+
+
+def test_register_pages():
+    create_licences(0, 25)
+    client = app.test_client()
+    for media_type in ['application/json', 'application/ld%2Bjson', 'text/turtle', 'application/n-triples']:
+        # Should follow next links through every licence, a page at a time
+        url = '/licence/?_format={media_type}&per_page=10'.format(media_type=media_type)
+        pages = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            pages.append(response.get_data(as_text=True))
+            url = get_link(response, 'next')
+        assert len(pages) == 3
+        for i in range(25):
+            licence_uri = 'http://example.com/licence/{i}"'.format(i=i) if 'json' in media_type else \
+                'http://example.com/licence/{i}>'.format(i=i)
+            assert [licence_uri in page for page in pages].count(True) == 1
+            assert licence_uri in pages[i // 10]
+
+    # Numbered pages should give the same pages as following cursors
+    response = client.get('/licence/?_format=application/json&per_page=10&page=3')
+    assert len(response.get_json()) == 6
+    assert get_link(response, 'next') is None
+    assert get_link(response, 'prev').endswith('page=2')
+    response = client.get('/licence/?_format=application/json&per_page=10&page=2')
+    assert 'page=3' in get_link(response, 'next')
+    assert 'Licence 10' in response.get_data(as_text=True)
+    assert client.get('/licence/?_format=application/json&per_page=10&page=4').status_code == 404
+    assert client.get('/licence/?_format=application/json&per_page=25&page=2').status_code == 404
+
+    # Other page sizes should start from the page ends of the default size, which are the only ones kept
+    with mock.patch('controller.db_access.get_db', side_effect=mock_get_db):
+        licence_uris = [licence['URI'] for licence in db_access.get_page('POLICY')]
+    pagination.clear()
+    with mock.patch('_conf.PAGE_SIZE_DEFAULT', 10):
+        for per_page, number in [(1, 2), (1, 12), (3, 4), (7, 3), (7, 4)]:
+            response = client.get('/licence/?_format=application/json&per_page={}&page={}'.format(per_page, number))
+            assert set(response.get_json()) - {'http://localhost/licence/'} == \
+                set(licence_uris[per_page * (number - 1):per_page * number])
+        assert client.get('/licence/?_format=application/json&per_page=7&page=5').status_code == 404
+        assert list(pagination._page_ends) == [('POLICY', 10, 'rowid')]
+
+    # Should reject invalid pages
+    for args in ['per_page=0', 'page=0', 'page=x', 'cursor=x']:
+        assert client.get('/licence/?_format=application/json&' + args).status_code == 400
+
+
+def test_register_html_pages():
+    client = app.test_client()
+    response = client.get('/action/?per_page=10')
+    assert response.status_code == 200
+    assert 'page=2' in get_link(response, 'next')
+    assert b'Next &gt;' in response.data
+    response = client.get('/action/?per_page=10&page=2')
+    assert b'&lt; Previous' in response.data
+
+    # Links to an action should go to the page it is on
+    with mock.patch('_conf.PAGE_SIZE_DEFAULT', 10):
+        response = client.get('/action/?uri=http://www.w3.org/ns/odrl/2/watermark')
+        assert response.status_code == 302
+        assert 'page=' in response.headers['Location']
+        assert client.get(response.headers['Location']).data.count(b'id="http://www.w3.org/ns/odrl/2/watermark"') == 1
+        response = client.get('/action/?uri=http://www.w3.org/ns/odrl/2/acceptTracking')
+        assert response.headers['Location'].endswith('/action/#http://www.w3.org/ns/odrl/2/acceptTracking')
+
+    # Should list parties alphabetically across pages, not just within each page
+    with mock.patch('controller.db_access.get_db', side_effect=mock_get_db):
+        for i, label in enumerate(['delta', 'Bravo', 'echo', 'alpha', 'Charlie']):
+            db_access.create_party('http://example.com/party/' + str(i), label)
+        db_access.commit_db()
+    pages = []
+    url = '/party/?per_page=2'
+    while url:
+        response = client.get(url)
+        pages.append({label for label in ['alpha', 'Bravo', 'Charlie', 'delta', 'echo']
+                      if '<h2>' + label + '</h2>' in response.get_data(as_text=True)})
+        url = get_link(response, 'next')
+    assert pages == [{'alpha', 'Bravo'}, {'Charlie', 'delta'}, {'echo'}]
+    response = client.get('/party/?per_page=2&page=2')
+    assert 'Charlie' in response.get_data(as_text=True) and 'alpha' not in response.get_data(as_text=True)
+
+
+def test_search_results():
+    create_licences(0, 12)
+    client = app.test_client()
+
+    # Should filter by rules, by text or by both, returning up to 10 licences
+    rules = json.dumps([{'TYPE_URI': 'http://www.w3.org/ns/odrl/2/duty',
+                         'ACTIONS': [{'URI': 'http://creativecommons.org/ns#Attribution'}]}])
+    assert len(client.get('/_search_results', query_string={'rules': rules}).get_json()['results']) == 10
+    results = client.get('/_search_results', query_string={'q': 'licence 11'}).get_json()['results']
+    assert [result['LABEL'] for result in results] == ['Licence 11']
+    results = client.get('/_search_results', query_string={'q': 'licence 1', 'rules': rules}).get_json()['results']
+    assert [result['LABEL'] for result in results] == ['Licence 1', 'Licence 10', 'Licence 11']
+
+    # Should return the total number of matches and a cursor for the next page of them
+    response = client.get('/_search_results', query_string={'rules': rules}).get_json()
+    assert response['total'] == 12
+    next_page = client.get('/_search_results', query_string={'rules': rules, 'cursor': response['next']}).get_json()
+    first_labels = {result['LABEL'] for result in response['results']}
+    assert first_labels.isdisjoint(result['LABEL'] for result in next_page['results'])
+    assert len(next_page['results']) == 2
+    assert next_page['total'] == 12 and next_page['next'] is None
+    response = client.get('/_search_results', query_string={'q': 'licence', 'cursor': response['next']}).get_json()
+    assert len(response['results']) == 2 and response['total'] == 12
+    assert client.get('/_search_results', query_string={'cursor': 'not a cursor'}).status_code == 400
+
+
+def test_similar_licences():
+    create_licences(0, 3)
+    with mock.patch('controller.db_access.get_db', side_effect=mock_get_db):
+        functions.create_policy('http://example.com/licence/read', {'label': 'Read Only'}, [
+            {'TYPE_URI': 'http://www.w3.org/ns/odrl/2/permission', 'ACTIONS': ['Read']}
+        ])
+    client = app.test_client()
+
+    # Should rank licences by similarity, including ones which don't have every rule
+    rules = json.dumps([{'TYPE_URI': 'http://www.w3.org/ns/odrl/2/permission',
+                         'ACTIONS': [{'URI': 'http://www.w3.org/ns/odrl/2/read'}]}])
+    results = client.get('/_similar_licences', query_string={'rules': rules}).get_json()['results']
+    assert [result['LABEL'] for result in results] == ['Read Only', 'Licence 0', 'Licence 1', 'Licence 2']
+    assert results[0]['SIMILARITY'] == 1
+    assert 0 < results[1]['SIMILARITY'] < 1
+    assert len(client.get('/_similar_licences', query_string={'rules': rules, 'k': 2}).get_json()['results']) == 2
+
+    # Should page through the licences with the cursor
+    response = client.get('/_similar_licences', query_string={'rules': rules, 'k': 2}).get_json()
+    next_response = client.get('/_similar_licences', query_string={'rules': rules, 'k': 2,
+                                                                   'cursor': response['next']}).get_json()
+    assert [result['LABEL'] for result in next_response['results']] == ['Licence 1', 'Licence 2']
+    assert next_response['next'] is None
+    assert client.get('/_similar_licences', query_string={'rules': rules, 'cursor': 'x'}).status_code == 400
+
+    # Should return at least one licence, so the next page never points back to the same one
+    for rules_arg in [rules, '[]']:
+        response = client.get('/_similar_licences', query_string={'rules': rules_arg, 'k': 0}).get_json()
+        assert len(response['results']) == 1
+        assert response['next'] != pagination.encode_cursor(0)
+
+    # Should list every licence until rules are chosen
+    response = client.get('/_similar_licences', query_string={'rules': '[]', 'k': 3}).get_json()
+    assert len(response['results']) == 3
+    assert response['total'] == 4
+    next_response = client.get('/_similar_licences', query_string={'rules': '[]', 'cursor': response['next']})
+    assert len(next_response.get_json()['results']) == 1
@@ -0,0 +1,65 @@
+import random
+from controller.similarity import SimilarityIndex
+
+PERMISSION = 'http://www.w3.org/ns/odrl/2/permission'
+DUTY = 'http://www.w3.org/ns/odrl/2/duty'
+
+
+def rows(policies):
+    # Turns a Dictionary of Policy URI to (rule type, action) pairs into rows like those of get_all_policy_actions()
+    return [{'POLICY_URI': policy_uri, 'TYPE_URI': type_uri, 'ACTION_URI': action_uri}
+            for policy_uri, pairs in policies.items() for type_uri, action_uri in pairs]
+
+
+def rules(pairs):
+    return [{'TYPE_URI': type_uri, 'ACTIONS': [{'URI': action_uri}]} for type_uri, action_uri in pairs]
+
+
+def test_similar():
+    policies = {
+        'read-only': [(PERMISSION, 'read')],
+        'attribution': [(PERMISSION, 'read'), (PERMISSION, 'distribute'), (DUTY, 'attribution')],
+        'watermark': [(PERMISSION, 'read'), (DUTY, 'watermark')],
+        'unrelated': [(PERMISSION, 'modify')]
+    }
+    index = SimilarityIndex(1, list(policies), rows(policies))
+
+    # Should rank an exact match first, leaving out policies which share nothing
+    results = index.similar(rules([(PERMISSION, 'read'), (PERMISSION, 'distribute'), (DUTY, 'attribution')]))
+    assert [policy_uri for policy_uri, similarity in results] == ['attribution', 'read-only', 'watermark']
+    assert results[0][1] == 1
+
+    # Should give more weight to sharing a rare pair than a common one
+    results = index.similar(rules([(PERMISSION, 'read'), (DUTY, 'watermark')]), 2)
+    assert [policy_uri for policy_uri, similarity in results] == ['watermark', 'read-only']
+
+    # Should count pairs no policy has against every policy
+    results = index.similar(rules([(PERMISSION, 'modify'), (PERMISSION, 'sell')]))
+    assert results[0][0] == 'unrelated' and 0 < results[0][1] < 1
+
+    assert index.similar([]) == []
+    assert index.similar(rules([(DUTY, 'read')])) == []
+    assert SimilarityIndex(1, [], []).similar(rules([(DUTY, 'read')])) == []
+
+
+def test_similar_matches_exact_ranking():
+    # The packed integers and threshold search should give the same results as working out every similarity one by one
+    generator = random.Random(0)
+    pairs = [(rule_type, 'action-{}'.format(i)) for rule_type in (PERMISSION, DUTY) for i in range(20)]
+    for _ in range(50):
+        policies = {'policy-{}'.format(i): generator.sample(pairs, generator.randint(0, 6))
+                    for i in range(generator.randint(1, 300))}
+        index = SimilarityIndex(1, list(policies), rows(policies))
+        desired = set(generator.sample(pairs, generator.randint(1, 4)))
+        k = generator.randint(1, 20)
+
+        def weight(pair):
+            return index.weights.get(pair, index.weight(0))
+        expected = []
+        for position, (policy_uri, policy_pairs) in enumerate(policies.items()):
+            shared = sum(weight(pair) for pair in desired.intersection(policy_pairs))
+            if shared:
+                expected.append((-shared / sum(weight(pair) for pair in desired.union(policy_pairs)), position,
+                                 policy_uri))
+        expected = [(policy_uri, -similarity) for similarity, position, policy_uri in sorted(expected)[:k]]
+        assert index.similar(rules(desired), k) == expected
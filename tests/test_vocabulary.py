@@ -0,0 +1,28 @@
+from controller import db_access, vocabulary
+from unittest import mock
+from controller.offline_db_access import get_db as mock_get_db
+
+
+@mock.patch('controller.db_access.get_db', side_effect=mock_get_db)
+def test_get_vocabulary(mock):
+    permitted = vocabulary.get_vocabulary()
+    assert permitted.rule_type_uris['Duty'] == 'http://www.w3.org/ns/odrl/2/duty'
+    assert permitted.rule_type_labels['http://www.w3.org/ns/odrl/2/duty'] == 'Duty'
+    assert permitted.action_uris['Read'] == 'http://www.w3.org/ns/odrl/2/read'
+    assert permitted.action_labels['http://www.w3.org/ns/odrl/2/read'] == 'Read'
+    assert list(permitted.actions) == db_access.get_all_actions()
+
+    # Should keep the same vocabulary when only the catalogue changes
+    db_access.create_policy('https://example.com#policy')
+    db_access.commit_db()
+    assert vocabulary.get_vocabulary() is permitted
+
+    # Should reload the vocabulary when an Action is added or removed
+    action_uri = 'https://example.com#action'
+    db_access.update_db('INSERT INTO ACTION (URI, LABEL, DEFINITION) VALUES (?, ?, ?)',
+                        (action_uri, 'Example', 'An example action.'))
+    db_access.commit_db()
+    assert vocabulary.get_vocabulary().action_uris['Example'] == action_uri
+    db_access.update_db('DELETE FROM ACTION WHERE URI = ?', (action_uri,))
+    db_access.commit_db()
+    assert 'Example' not in vocabulary.get_vocabulary().action_uris
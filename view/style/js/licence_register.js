@@ -148,8 +148,15 @@ jQuery(document).ready(function($){
         search()
     })
 
+    // Search when Enter is pressed in the search text box
+    $('body').on('keyup', '#search-text', function(event) {
+        if (event.key == 'Enter')
+            search()
+    })
+
     // AJAX request to get search results
-    var search = function(){
+    // If a cursor from the previous results is given, the next results are added to the end of the list
+    var search = function(cursor){
         search_url = $('#search-url').attr('data-url')
         if (search_url == undefined)
             throw 'Search URL not found'
@@ -158,13 +165,35 @@ jQuery(document).ready(function($){
             url: search_url,
             data: {
                 rules: JSON.stringify(rules),
+                q: $('#search-text').val(),
+                cursor: cursor || '',
             },
             success: function(data) {
-                updateSearchResults(data['results'])
+                updateSearchResults(data['results'], cursor != undefined)
+                updateMoreResults(data)
             }
         })
     }
 
+    // Show the next search results when the show more button is pressed
+    $('body').on('click', '.more-licences', function() {
+        search($(this).attr('data-cursor'))
+    })
+
+    // Update the count of search results, and unhide #licences-more if there are more to show
+    // Similar licences have no total, so only the number shown is given
+    var updateMoreResults = function(data) {
+        var more = $('#licences-more')
+        if (data['next']) {
+            var count = $('#licence-list').children().length
+            more.find('.licences-count').text('Showing ' + count + (data['total'] == null ? '' : ' of ' + data['total']) + ' licences')
+            more.find('.more-licences').attr('data-cursor', data['next'])
+            more.prop('hidden', false)
+        }
+        else
+            more.prop('hidden', true)
+    }
+
     // Clear search filter
     // Also updates rule and action displays, and updates the search results
     $('body').on('click', '.clear-filter', function() {
@@ -175,12 +204,12 @@ jQuery(document).ready(function($){
     })
 
     // Update the search results display
-    // Populates #licence-list with the results
+    // Populates #licence-list with the results, or adds them to the end of it if append is true
     // Unhides #licences-not-found if search results are empty. Otherwise, unhides #licences-found
     // Uses template #licence-item-template for each result entry
-    var updateSearchResults = function(results) {
-        var licenceList = $('#licence-list').empty()
-        if (results.length > 0) {
+    var updateSearchResults = function(results, append) {
+        var licenceList = append ? $('#licence-list') : $('#licence-list').empty()
+        if (results.length > 0 || append) {
             $('#licences-not-found').prop('hidden', true)
             $('#licences-found').prop('hidden', false)
             for (var i = 0; i < results.length; i++){
@@ -274,8 +303,12 @@ jQuery(document).ready(function($){
     // Update search results with initial data
     if ($('#licences-json').length > 0) {
         var licences_json = JSON.parse($('#licences-json').html())
-        updateSearchResults(licences_json)
+        updateSearchResults(licences_json['results'])
+        updateMoreResults(licences_json)
     }
+    // Pages without initial data (i.e. create licence) load it instead
+    else if ($('#search-url').length > 0)
+        search()
 
 
     // Enable all bootstrap tooltips on page